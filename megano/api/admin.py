@@ -1,6 +1,7 @@
 from api.models import (
     Category,
     CategoryImage,
+    PopularProduct,
     Product,
     ProductImage,
     ProductTag,
@@ -12,6 +13,9 @@ from api.models import (
     Tag,
     Basket,
     BasketItem,
+    Order,
+    OrderItem,
+    Task,
 )
 from django.contrib import admin
 from django_mptt_admin.admin import DjangoMpttAdmin
@@ -36,6 +40,11 @@ class BasketItemInline(admin.StackedInline):
     classes = ["wide", "collapse"]
 
 
+class OrderItemInline(admin.TabularInline):
+    model = OrderItem
+    raw_id_fields = ("product",)
+
+
 class ProfileAvatarInLine(admin.TabularInline):
     model = ProfileAvatar
 
@@ -57,6 +66,12 @@ class ReviewAdmin(admin.ModelAdmin):
     list_display = "pk", "product", "author", "email", "text", "rate", "date"
 
 
+@admin.register(PopularProduct)
+class PopularProductAdmin(admin.ModelAdmin):
+    list_display = "position", "product", "score", "updated"
+    list_select_related = ("product",)
+
+
 @admin.register(Sale)
 class SaleAdmin(admin.ModelAdmin):
     list_display = "pk", "product", "salePrice", "dateFrom", "dateTo"
@@ -81,12 +96,13 @@ class ProductAdmin(admin.ModelAdmin):
     )
     list_display_links = "pk", "title"
     ordering = "-title", "pk"
-    search_fields = "title", "description"
+    search_fields = "sku", "title", "description"
     fieldsets = [
         (
             None,
             {
                 "fields": (
+                    "sku",
                     "title",
                     "description",
                     "price",
@@ -95,6 +111,7 @@ class ProductAdmin(admin.ModelAdmin):
                     "fullDescription",
                     "freeDelivery",
                     "limited_edition",
+                    "banner_weight",
                 ),
             },
         ),
@@ -132,3 +149,20 @@ class BasketAdmin(admin.ModelAdmin):
         BasketItemInline,
     ]
     list_display = "pk", "user"
+
+
+@admin.register(Order)
+class OrderAdmin(admin.ModelAdmin):
+    inlines = [
+        OrderItemInline,
+    ]
+    list_display = "pk", "user", "createdAt", "status", "totalCost"
+    list_filter = ("status",)
+    list_select_related = ("user",)
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = "pk", "name", "status", "attempts", "run_at", "locked_until"
+    list_filter = "status", "name"
+    readonly_fields = ("last_error",)
@@ -1,6 +1,17 @@
+from pathlib import Path
+
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class ApiConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "api"
+
+    def ready(self):
+        from api import signals  # noqa: F401
+
+        # SQLite не создает каталог файла базы данных
+        for database in settings.DATABASES.values():
+            if database["ENGINE"] == "django.db.backends.sqlite3":
+                Path(database["NAME"]).parent.mkdir(parents=True, exist_ok=True)
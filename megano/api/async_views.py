@@ -0,0 +1,170 @@
+from api.banners import banner_pool
+from api.catalog import get_catalog_queryset
+from api.category_tree import aget_category_tree_json
+from api.models import Product, Sale, Tag
+from api.pagination import CustomPagination
+from api.product_cards import aserialize_product_cards, get_card_rows
+from api.renderers import FastJSONRenderer
+from api.response_cache import (
+    build_response_cache_key,
+    count_response_cache,
+    get_response_cache,
+)
+from api.serializers import ProductSerializer, SaleSerializer, TagSerializer
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views import View
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+
+
+class AsyncReadView(View):
+    """
+    Асинхронное представление только для чтения для запуска под ASGI.
+    Ответы совпадают с одноименными представлениями из api.views,
+    поэтому обе версии используют общие записи кэша ответов и счетчики.
+    Данные из get_data рендерятся FastJSONRenderer, ответы анонимным
+    пользователям кэшируются, если задан cache_tags или get_cache_tags
+    """
+
+    http_method_names = ["get", "head", "options"]
+    cache_tags = None
+    renderer = FastJSONRenderer()
+
+    def get_cache_tags(self) -> list | None:
+        return None if self.cache_tags is None else list(self.cache_tags)
+
+    def get_cached_response(self, request) -> tuple[str | None, tuple | None]:
+        """
+        Ключ и запись кэша ответов. Выполняется в потоке через sync_to_async:
+        пользователь загружается из сессии синхронным ORM
+        """
+        tags = self.get_cache_tags()
+        if tags is None or request.user.is_authenticated:
+            return None, None
+        key = build_response_cache_key(
+            type(self).__name__,
+            self.kwargs,
+            request.GET,
+            self.renderer.format,
+            tags,
+        )
+        cached = get_response_cache().get(key)
+        count_response_cache(type(self).__name__, "miss" if cached is None else "hit")
+        return key, cached
+
+    def render(self, data, status=200) -> HttpResponse:
+        return HttpResponse(
+            self.renderer.render(data),
+            content_type=self.renderer.media_type,
+            status=status,
+        )
+
+    async def get(self, request, *args, **kwargs):
+        key, cached = await sync_to_async(self.get_cached_response)(request)
+        if cached is not None:
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+            response["X-Cache"] = "HIT"
+            return response
+        try:
+            data = await self.get_data(Request(request))
+        except NotFound as exc:
+            return self.render({"detail": exc.detail}, status=exc.status_code)
+        response = self.render(data)
+        if key is not None:
+            await get_response_cache().aset(
+                key,
+                (response.content, response["Content-Type"]),
+                timeout=settings.RESPONSE_CACHE_TIMEOUT,
+            )
+            response["X-Cache"] = "MISS"
+        return response
+
+    async def get_data(self, request):
+        raise NotImplementedError
+
+
+class ProductDetailView(AsyncReadView):
+    def get_cache_tags(self):
+        return ["product", f"product:{self.kwargs['pk']}"]
+
+    async def get_data(self, request):
+        try:
+            product = await Product.objects.prefetch_related(
+                "tags", "images", "specifications"
+            ).aget(pk=self.kwargs["pk"])
+        except Product.DoesNotExist:
+            raise NotFound()
+        product.latest_reviews = [
+            review
+            async for review in product.reviews.order_by("-pk")[
+                : settings.PRODUCT_LATEST_REVIEWS
+            ]
+        ]
+        return ProductSerializer(product).data
+
+
+class CatalogListView(AsyncReadView):
+    cache_tags = ["catalog"]
+
+    async def get_data(self, request):
+        queryset = await sync_to_async(get_catalog_queryset)(request.query_params)
+        paginator = CustomPagination()
+        page = await paginator.apaginate_queryset(
+            get_card_rows(queryset), request, self
+        )
+        cards = await aserialize_product_cards(page)
+        return paginator.get_paginated_response(cards).data
+
+
+class SaleListView(AsyncReadView):
+    cache_tags = ["sales"]
+
+    async def get_data(self, request):
+        now = timezone.now()
+        queryset = (
+            Sale.objects.select_related("product")
+            .prefetch_related("product__images")
+            .filter(dateFrom__lte=now, dateTo__gte=now)
+            .order_by("pk")
+        )
+        paginator = CustomPagination()
+        page = await paginator.apaginate_queryset(queryset, request, self)
+        return paginator.get_paginated_response(
+            SaleSerializer(page, many=True).data
+        ).data
+
+
+class TagListView(AsyncReadView):
+    cache_tags = ["tags"]
+
+    async def get_data(self, request):
+        tags = [tag async for tag in Tag.objects.all()]
+        return TagSerializer(tags, many=True).data
+
+
+class BannerListView(AsyncReadView):
+    async def get_data(self, request):
+        random_product_ids = await sync_to_async(banner_pool.sample)(
+            settings.BANNERS_COUNT
+        )
+        rows = get_card_rows(Product.objects.filter(id__in=random_product_ids))
+        return await aserialize_product_cards([row async for row in rows])
+
+
+class CategoryListView(AsyncReadView):
+    async def get(self, request, *args, **kwargs):
+        content, etag, last_modified = await aget_category_tree_json()
+        response = get_conditional_response(
+            request, etag=etag, last_modified=int(last_modified)
+        )
+        if response is None:
+            response = HttpResponse(content, content_type="application/json")
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        return response
@@ -0,0 +1,67 @@
+import random
+import threading
+import time
+from array import array
+from bisect import bisect_right
+
+from api.models import Product
+from django.conf import settings
+
+
+class BannerPool:
+    """
+    Пул товаров для баннеров.
+    Хранит id товаров и накопленные веса в памяти процесса и обновляется
+    раз в BANNER_POOL_REFRESH_INTERVAL секунд, поэтому выборка стоит
+    O(k log n) и не обращается к базе данных
+    """
+
+    def __init__(self):
+        self._ids = array("q")
+        self._cumulative_weights = array("q")
+        self._expires = 0.0
+        self._lock = threading.Lock()
+
+    def refresh(self) -> None:
+        """Загружает id и веса товаров, доступных для баннеров"""
+        ids = array("q")
+        cumulative_weights = array("q")
+        total = 0
+        products = (
+            Product.objects.filter(archived=False, count__gt=0, banner_weight__gt=0)
+            .order_by()
+            .values_list("pk", "banner_weight")
+        )
+        for pk, weight in products.iterator(chunk_size=10000):
+            total += weight
+            ids.append(pk)
+            cumulative_weights.append(total)
+        self._ids, self._cumulative_weights = ids, cumulative_weights
+        self._expires = time.monotonic() + settings.BANNER_POOL_REFRESH_INTERVAL
+
+    def invalidate(self) -> None:
+        self._expires = 0.0
+
+    def sample(self, k: int) -> list[int]:
+        """Возвращает до k различных id товаров с учетом их весов"""
+        if time.monotonic() >= self._expires:
+            with self._lock:
+                if time.monotonic() >= self._expires:
+                    self.refresh()
+        ids, cumulative_weights = self._ids, self._cumulative_weights
+        k = min(k, len(ids))
+        if not k:
+            return []
+        total = cumulative_weights[-1]
+        sample = set()
+        # Повторные попадания в один товар отбрасываются, число попыток
+        # ограничено, чтобы тяжелые по весу товары не зацикливали выборку
+        for _ in range(k * 10):
+            index = bisect_right(cumulative_weights, random.randrange(total))
+            sample.add(ids[index])
+            if len(sample) == k:
+                break
+        return list(sample)
+
+
+banner_pool = BannerPool()
@@ -0,0 +1,117 @@
+from api.models import Basket, BasketItem, Product
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.base import SessionBase
+from django.db import connection
+from django.db.models import F, QuerySet
+
+SESSION_BASKET_KEY = "basket"
+
+
+def get_basket_items(basket: Basket) -> QuerySet:
+    """
+    Возвращает позиции корзины вместе с товарами.
+    Для сериализации нужно три запроса независимо от размера корзины
+    """
+    return (
+        basket.basket_items.select_related("product")
+        .prefetch_related("product__tags", "product__images")
+        .order_by("pk")
+    )
+
+
+def get_upsert_sql() -> str:
+    """
+    Запрос добавления товара в корзину: новая позиция создается,
+    у существующей количество увеличивается.
+    Товар берется из таблицы товаров, поэтому несуществующий не добавится
+    """
+    item_table = connection.ops.quote_name(BasketItem._meta.db_table)
+    product_table = connection.ops.quote_name(Product._meta.db_table)
+    return (
+        f"INSERT INTO {item_table} (basket_id, product_id, count) "
+        f"SELECT %s, id, %s FROM {product_table} WHERE id = %s "
+        "ON CONFLICT (basket_id, product_id) "
+        f"DO UPDATE SET count = {item_table}.count + excluded.count"
+    )
+
+
+def add_to_basket(basket: Basket, product_id: int, count: int) -> bool:
+    """
+    Добавляет товар в корзину одним запросом INSERT ... ON CONFLICT.
+    Возвращает False, если товара не существует
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(get_upsert_sql(), [basket.pk, count, product_id])
+        return cursor.rowcount > 0
+
+
+def remove_from_basket(basket: Basket, product_id: int, count: int) -> None:
+    """
+    Уменьшает количество товара в корзине.
+    Позиция удаляется, когда количество доходит до нуля
+    """
+    items = basket.basket_items.filter(product_id=product_id)
+    if not items.filter(count__gt=count).update(count=F("count") - count):
+        items.delete()
+
+
+def get_session_basket(session: SessionBase) -> dict[str, int]:
+    """Корзина анонимного пользователя: id товара -> количество"""
+    return session.get(SESSION_BASKET_KEY, {})
+
+
+def add_to_session_basket(session: SessionBase, product_id: int, count: int) -> None:
+    items = get_session_basket(session)
+    items[str(product_id)] = items.get(str(product_id), 0) + count
+    session[SESSION_BASKET_KEY] = items
+
+
+def remove_from_session_basket(
+    session: SessionBase, product_id: int, count: int
+) -> None:
+    items = get_session_basket(session)
+    remaining = items.get(str(product_id), 0) - count
+    if remaining > 0:
+        items[str(product_id)] = remaining
+    else:
+        items.pop(str(product_id), None)
+    session[SESSION_BASKET_KEY] = items
+
+
+def get_session_basket_items(session: SessionBase) -> list[BasketItem]:
+    """
+    Возвращает несохраненные позиции корзины из сессии, чтобы их можно было
+    сериализовать BasketSerializer. Пустая корзина не требует запросов.
+    Товары, удаленные из каталога, убираются из сессии
+    """
+    items = get_session_basket(session)
+    if not items:
+        return []
+    products = Product.objects.prefetch_related("tags", "images").in_bulk(
+        [int(pk) for pk in items]
+    )
+    if len(products) < len(items):
+        session[SESSION_BASKET_KEY] = {
+            pk: count for pk, count in items.items() if int(pk) in products
+        }
+    return [
+        BasketItem(product=products[int(pk)], count=count)
+        for pk, count in items.items()
+        if int(pk) in products
+    ]
+
+
+def merge_session_basket(session: SessionBase, user: User) -> None:
+    """
+    Переносит корзину из сессии в корзину пользователя после входа.
+    Все позиции записываются одним executemany
+    """
+    items = session.pop(SESSION_BASKET_KEY, None)
+    if not items:
+        return
+    basket, _ = Basket.objects.get_or_create(user=user)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            get_upsert_sql(),
+            [(basket.pk, count, int(pk)) for pk, count in items.items()],
+        )
@@ -0,0 +1,147 @@
+import hashlib
+import json
+
+from api.category_tree import category_tree
+from api.models import Product, ProductTag
+from api.response_cache import (
+    count_response_cache,
+    get_response_cache,
+    get_tag_versions,
+    normalize_query_params,
+)
+from api.search import get_search_backend
+from django.conf import settings
+from django.db.models import Count, Max, Min, Q, QuerySet
+
+CATALOG_FACETS_KEY = "catalog_facets:{digest}"
+# Параметры сортировки и страниц, не влияющие на набор товаров
+CATALOG_PAGE_PARAMS = {"currentPage", "cursor", "sort", "sortType", "limit"}
+# Поля сортировки каталога из фронтенда и соответствующие им поля модели
+CATALOG_SORT_FIELDS = {"reviews": "reviews_count"}
+
+
+def filter_catalog(
+    queryset: QuerySet, query_params, exclude=(), ranked: bool = False
+) -> QuerySet:
+    """
+    Применяет фильтры каталога из параметров запроса.
+    Фильтры category, tags, freeDelivery, available, search и price
+    из exclude пропускаются, так считаются фасеты по остальным фильтрам
+    """
+    if "category" not in exclude and query_params.get("category") is not None:
+        categories = category_tree.get_descendant_ids(int(query_params.get("category")))
+        queryset = queryset.filter(category__in=categories)
+    if "tags" not in exclude and query_params.get("tags[]") is not None:
+        queryset = queryset.filter(tags__in=map(int, query_params.getlist("tags[]")))
+    if (
+        "freeDelivery" not in exclude
+        and query_params.get("filter[freeDelivery]") == "true"
+    ):
+        queryset = queryset.filter(freeDelivery=True)
+    if "available" not in exclude and query_params.get("filter[available]") == "true":
+        queryset = queryset.exclude(count=0)
+    search = query_params.get("search") or query_params.get("filter[name]")
+    if "search" not in exclude and search:
+        queryset = get_search_backend().filter(queryset, search, ranked=ranked)
+    if "price" not in exclude:
+        if query_params.get("filter[minPrice]") is not None:
+            queryset = queryset.filter(
+                price__gte=int(query_params.get("filter[minPrice]"))
+            )
+        if query_params.get("filter[maxPrice]") is not None:
+            queryset = queryset.filter(
+                price__lte=int(query_params.get("filter[maxPrice]"))
+            )
+    return queryset
+
+
+def get_catalog_queryset(query_params) -> QuerySet:
+    """Товары каталога с фильтрами и сортировкой из параметров запроса"""
+    search = query_params.get("search") or query_params.get("filter[name]")
+    sort = query_params.get("sort")
+    queryset = filter_catalog(
+        Product.objects.prefetch_related("tags", "images"),
+        query_params,
+        ranked=sort is None,
+    )
+    if sort is None:
+        sort = "search_rank" if search else "pk"
+    else:
+        sort = CATALOG_SORT_FIELDS.get(sort, sort)
+    if query_params.get("sortType") == "dec":
+        sort = "-" + sort
+    if sort.lstrip("-") == "search_rank":
+        # Ранг одинаков у товаров за пределами SEARCH_MAX_RESULTS
+        return queryset.order_by(sort, "pk")
+    return queryset.order_by(sort)
+
+
+def count_catalog_facets(query_params) -> dict:
+    """
+    Считает фасеты каталога одним запросом на фасет.
+    Фасет не учитывает собственный фильтр: диапазон цен считается
+    без фильтра цены, счетчики тэгов — без фильтра тэгов и т. д.,
+    поэтому клиент видит, что изменится при выборе значения
+    """
+    products = Product.objects.order_by()
+
+    prices = filter_catalog(products, query_params, exclude=["price"]).aggregate(
+        min=Min("price"), max=Max("price")
+    )
+
+    tagged = filter_catalog(products, query_params, exclude=["tags"])
+    tags = (
+        ProductTag.objects.filter(product__in=tagged.values("pk"))
+        .values("tag_id", "tag__name")
+        .annotate(count=Count("product_id", distinct=True))
+        .order_by("tag_id")
+    )
+
+    free_delivery_only = query_params.get("filter[freeDelivery]") == "true"
+    delivery = filter_catalog(
+        products, query_params, exclude=["freeDelivery"]
+    ).aggregate(
+        total=Count("pk", distinct=True),
+        freeDelivery=Count("pk", filter=Q(freeDelivery=True), distinct=True),
+    )
+
+    available = filter_catalog(products, query_params, exclude=["available"]).aggregate(
+        available=Count("pk", filter=~Q(count=0), distinct=True)
+    )
+
+    return {
+        "total": delivery["freeDelivery" if free_delivery_only else "total"],
+        "price": {
+            "min": None if prices["min"] is None else f"{prices['min']:.2f}",
+            "max": None if prices["max"] is None else f"{prices['max']:.2f}",
+        },
+        "tags": [
+            {"id": tag["tag_id"], "name": tag["tag__name"], "count": tag["count"]}
+            for tag in tags
+        ],
+        "freeDelivery": delivery["freeDelivery"],
+        "available": available["available"],
+    }
+
+
+def get_catalog_facets(query_params) -> dict:
+    """
+    Возвращает фасеты из кэша ответов.
+    Ключ строится из нормализованных фильтров без параметров сортировки
+    и страниц, записи сбрасываются сигналами вместе с тэгами catalog и tags
+    """
+    data = [
+        normalize_query_params(query_params, CATALOG_PAGE_PARAMS),
+        get_tag_versions(["catalog", "tags"]),
+    ]
+    digest = hashlib.md5(json.dumps(data).encode("utf-8")).hexdigest()
+    key = CATALOG_FACETS_KEY.format(digest=digest)
+    cache = get_response_cache()
+    facets = cache.get(key)
+    if facets is not None:
+        count_response_cache("CatalogFacetsView", "hit")
+        return facets
+    count_response_cache("CatalogFacetsView", "miss")
+    facets = count_catalog_facets(query_params)
+    cache.set(key, facets, timeout=settings.RESPONSE_CACHE_TIMEOUT)
+    return facets
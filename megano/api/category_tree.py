@@ -0,0 +1,157 @@
+import hashlib
+import threading
+import time
+from bisect import bisect_left
+
+from api.models import Category, CategoryImage
+from api.response_cache import get_response_cache
+from api.serializers import CategoryImageSerializer
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.renderers import JSONRenderer
+
+CATEGORY_TREE_VERSION_KEY = "category_tree_version"
+CATEGORY_TREE_JSON_KEY = "category_tree_json:{version}"
+
+
+def get_category_tree_version() -> float:
+    """
+    Версия дерева категорий, общая для процессов: хранится в кэше ответов.
+    Версией служит время последнего изменения категорий
+    """
+    return get_response_cache().get_or_set(
+        CATEGORY_TREE_VERSION_KEY, time.time, timeout=None
+    )
+
+
+def invalidate_category_tree() -> None:
+    """Помечает закэшированное дерево категорий устаревшим во всех процессах"""
+    get_response_cache().set(CATEGORY_TREE_VERSION_KEY, time.time(), timeout=None)
+    category_tree.invalidate()
+
+
+def get_category_tree_queryset():
+    return (
+        Category.objects.select_related("image")
+        .order_by("tree_id", "lft")
+        .only(
+            "pk", "title", "parent_id", "image__src", "image__alt", "image__renditions"
+        )
+    )
+
+
+def render_category_tree(categories=None) -> bytes:
+    """
+    Строит дерево категорий с изображениями одним запросом,
+    опираясь на порядок обхода MPTT, и сериализует его в JSON
+    """
+    if categories is None:
+        categories = get_category_tree_queryset()
+    roots = []
+    nodes = {}
+    for category in categories:
+        try:
+            image = CategoryImageSerializer(category.image).data
+        except CategoryImage.DoesNotExist:
+            image = None
+        node = {
+            "id": category.pk,
+            "title": category.title,
+            "image": image,
+            "subcategories": [],
+        }
+        nodes[category.pk] = node
+        if category.parent_id is None:
+            roots.append(node)
+        else:
+            nodes[category.parent_id]["subcategories"].append(node)
+    return JSONRenderer().render(roots)
+
+
+def get_category_tree_json() -> tuple[bytes, str, float]:
+    """
+    Возвращает сериализованное дерево категорий, его ETag и время изменения.
+    Результат хранится в кэше до следующего изменения категорий
+    """
+    version = get_category_tree_version()
+    key = CATEGORY_TREE_JSON_KEY.format(version=version)
+    cached = cache.get(key)
+    if cached is None:
+        content = render_category_tree()
+        cached = content, f'"{hashlib.md5(content).hexdigest()}"'
+        cache.set(key, cached, timeout=settings.CATEGORY_TREE_CACHE_TIMEOUT)
+    content, etag = cached
+    return content, etag, version
+
+
+async def aget_category_tree_json() -> tuple[bytes, str, float]:
+    """get_category_tree_json для асинхронных представлений"""
+    version = await get_response_cache().aget_or_set(
+        CATEGORY_TREE_VERSION_KEY, time.time, timeout=None
+    )
+    key = CATEGORY_TREE_JSON_KEY.format(version=version)
+    cached = await cache.aget(key)
+    if cached is None:
+        categories = [category async for category in get_category_tree_queryset()]
+        content = render_category_tree(categories)
+        cached = content, f'"{hashlib.md5(content).hexdigest()}"'
+        await cache.aset(key, cached, timeout=settings.CATEGORY_TREE_CACHE_TIMEOUT)
+    content, etag = cached
+    return content, etag, version
+
+
+class CategoryTree:
+    """
+    Кэш дерева категорий в памяти процесса.
+    Узлы хранятся в порядке обхода MPTT (tree_id, lft), поэтому потомки
+    категории занимают непрерывный отрезок списка и находятся бинарным
+    поиском без запросов к базе данных
+    """
+
+    def __init__(self):
+        self._nodes = {}
+        self._keys = []
+        self._ids = []
+        self._version = None
+        self._expires = 0.0
+        self._lock = threading.Lock()
+
+    def _load(self, version: int) -> None:
+        nodes = {}
+        keys = []
+        ids = []
+        categories = Category.objects.order_by("tree_id", "lft").values_list(
+            "pk", "tree_id", "lft", "rght"
+        )
+        for pk, tree_id, lft, rght in categories:
+            nodes[pk] = (tree_id, lft, rght)
+            keys.append((tree_id, lft))
+            ids.append(pk)
+        self._nodes, self._keys, self._ids = nodes, keys, ids
+        self._version = version
+        self._expires = time.monotonic() + settings.CATEGORY_TREE_CACHE_TIMEOUT
+
+    def _ensure_loaded(self) -> None:
+        version = get_category_tree_version()
+        if self._version == version and time.monotonic() < self._expires:
+            return
+        with self._lock:
+            if self._version != version or time.monotonic() >= self._expires:
+                self._load(version)
+
+    def invalidate(self) -> None:
+        self._version = None
+
+    def get_descendant_ids(self, category_id: int) -> list[int]:
+        """Возвращает id категории и всех ее подкатегорий"""
+        self._ensure_loaded()
+        node = self._nodes.get(category_id)
+        if node is None:
+            return []
+        tree_id, lft, rght = node
+        start = bisect_left(self._keys, (tree_id, lft))
+        end = bisect_left(self._keys, (tree_id, rght))
+        return self._ids[start:end]
+
+
+category_tree = CategoryTree()
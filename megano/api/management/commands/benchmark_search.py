@@ -0,0 +1,46 @@
+import time
+
+from api.models import Product
+from api.search import get_search_backend
+from django.core.management import BaseCommand
+
+
+class Command(BaseCommand):
+    """
+    Compares search backend with title__icontains filtering
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("queries", nargs="*", default=["ноут", "телевизор", "a"])
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def measure(self, queryset, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            count = len(list(queryset.values_list("pk", flat=True)[:20]))
+        return (time.perf_counter() - started) / repeat * 1000, count
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        repeat = options["repeat"]
+        self.stdout.write(
+            f"{Product.objects.count()} products, "
+            f"backend {type(backend).__name__}, {repeat} runs per query"
+        )
+        self.stdout.write(
+            f"{'query':<20}{'icontains, ms':>15}{'rows':>6}{'search, ms':>15}{'rows':>6}"
+        )
+        for query in options["queries"]:
+            icontains_ms, icontains_rows = self.measure(
+                Product.objects.filter(title__icontains=query).order_by("pk"), repeat
+            )
+            search_ms, search_rows = self.measure(
+                backend.filter(Product.objects.all(), query, ranked=True).order_by(
+                    "search_rank"
+                ),
+                repeat,
+            )
+            self.stdout.write(
+                f"{query:<20}{icontains_ms:>15.2f}{icontains_rows:>6}"
+                f"{search_ms:>15.2f}{search_rows:>6}"
+            )
@@ -0,0 +1,60 @@
+import time
+
+from api.models import Product
+from api.product_cards import get_card_rows, serialize_product_cards
+from api.renderers import FastJSONRenderer
+from api.serializers import CatalogSerializer
+from django.core.management import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+
+class Command(BaseCommand):
+    """
+    Compares CatalogSerializer with JSONRenderer against the product card
+    fast path with FastJSONRenderer on catalog pages
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("--page-size", type=int, default=20)
+        parser.add_argument("--pages", type=int, default=10)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def serializer(self, queryset):
+        return JSONRenderer().render(CatalogSerializer(queryset, many=True).data)
+
+    def cards(self, queryset):
+        rows = list(get_card_rows(queryset))
+        return FastJSONRenderer().render(serialize_product_cards(rows))
+
+    def measure(self, render, pages, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for page in pages:
+                render(page)
+        return (time.perf_counter() - started) / repeat / len(pages) * 1000
+
+    def handle(self, *args, **options):
+        page_size = options["page_size"]
+        queryset = Product.objects.prefetch_related("tags", "images").order_by("pk")
+        pages = [
+            queryset[start : start + page_size]
+            for start in range(0, page_size * options["pages"], page_size)
+        ]
+        pages = [page for page in pages if page.exists()]
+        if not pages:
+            raise CommandError("No products, run generate_catalog first")
+        for page in pages:
+            if self.serializer(page) != self.cards(page):
+                raise CommandError("Fast path output differs from CatalogSerializer")
+
+        repeat = options["repeat"]
+        serializer_ms = self.measure(self.serializer, pages, repeat)
+        cards_ms = self.measure(self.cards, pages, repeat)
+        self.stdout.write(
+            f"{len(pages)} pages of {page_size} products, {repeat} runs, "
+            "output is identical"
+        )
+        self.stdout.write(f"{'':<30}{'ms per page':>12}")
+        self.stdout.write(f"{'CatalogSerializer':<30}{serializer_ms:>12.2f}")
+        self.stdout.write(f"{'product cards':<30}{cards_ms:>12.2f}")
+        self.stdout.write(f"Speedup {serializer_ms / cards_ms:.1f}x")
@@ -0,0 +1,102 @@
+import http.client
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from statistics import quantiles
+from urllib.parse import urlsplit
+
+from api.models import Product
+from django.core.management import BaseCommand
+
+DEFAULT_PATHS = [
+    "/api/catalog",
+    "/api/catalog?sort=price&sortType=dec",
+    "/api/categories",
+    "/api/tags",
+    "/api/sales",
+    "/api/banners",
+]
+
+
+class Command(BaseCommand):
+    """
+    Compares throughput and latency of running deployments, e.g. gunicorn
+    with sync workers against gunicorn with uvicorn workers, both started
+    with the same number of workers:
+
+        compare_load sync=http://127.0.0.1:8000 asgi=http://127.0.0.1:8001
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("targets", nargs="+", help="name=base URL")
+        parser.add_argument("--path", action="append", dest="paths")
+        parser.add_argument("--concurrency", type=int, default=16)
+        parser.add_argument("--duration", type=float, default=10)
+        parser.add_argument("--warmup", type=float, default=2)
+
+    def run_client(self, base_url, paths, deadline, latencies, errors, lock):
+        url = urlsplit(base_url)
+        connection = http.client.HTTPConnection(url.hostname, url.port, timeout=30)
+        measured, failed = [], 0
+        index = 0
+        while time.monotonic() < deadline:
+            path = url.path.rstrip("/") + paths[index % len(paths)]
+            index += 1
+            started = time.perf_counter()
+            try:
+                connection.request("GET", path)
+                response = connection.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                failed += 1
+                continue
+            measured.append(time.perf_counter() - started)
+            if response.status >= 400:
+                failed += 1
+        connection.close()
+        with lock:
+            latencies.extend(measured)
+            errors[0] += failed
+
+    def run(self, base_url, paths, concurrency, duration):
+        latencies, errors, lock = [], [0], threading.Lock()
+        deadline = time.monotonic() + duration
+        with ThreadPoolExecutor(concurrency) as executor:
+            for _ in range(concurrency):
+                executor.submit(
+                    self.run_client, base_url, paths, deadline, latencies, errors, lock
+                )
+        return latencies, errors[0]
+
+    def handle(self, *args, **options):
+        paths = options["paths"]
+        if not paths:
+            # Детали товара запрашиваются по первым товарам из локальной базы,
+            # с которой работают сравниваемые серверы
+            product_ids = Product.objects.order_by("pk").values_list("pk", flat=True)
+            paths = DEFAULT_PATHS + [f"/api/product/{pk}" for pk in product_ids[:5]]
+        concurrency, duration = options["concurrency"], options["duration"]
+        self.stdout.write(
+            f"{len(paths)} paths, {concurrency} clients, {duration:g} s per target"
+        )
+        self.stdout.write(
+            f"{'target':<12}{'requests':>10}{'rps':>10}"
+            f"{'p50, ms':>10}{'p99, ms':>10}{'errors':>8}"
+        )
+        for target in options["targets"]:
+            name, separator, base_url = target.partition("=")
+            if not separator:
+                name = base_url = target
+            if options["warmup"]:
+                self.run(base_url, paths, concurrency, options["warmup"])
+            latencies, errors = self.run(base_url, paths, concurrency, duration)
+            if len(latencies) < 2:
+                self.stdout.write(f"{name:<12}{len(latencies):>10}{'-':>30}{errors:>8}")
+                continue
+            percentiles = quantiles(latencies, n=100)
+            self.stdout.write(
+                f"{name:<12}{len(latencies):>10}{len(latencies) / duration:>10.1f}"
+                f"{percentiles[49] * 1000:>10.1f}{percentiles[98] * 1000:>10.1f}"
+                f"{errors:>8}"
+            )
@@ -1,62 +1,277 @@
+import itertools
 import json
 import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from decimal import Decimal
 from pathlib import Path, PurePath
 
 from api.models import Category, Product, ProductImage, Specification
-from django.core.management import BaseCommand
+from api.renditions import get_rendition_names
+from api.response_cache import invalidate_response_cache
+from api.search import get_search_backend
+from api.tasks import enqueue, generate_renditions
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
 
-from megano.settings import MEDIA_ROOT
+PRODUCT_FIELDS = [
+    "title",
+    "price",
+    "count",
+    "description",
+    "fullDescription",
+    "freeDelivery",
+    "category",
+    "date",
+]
+
+
+def iter_items(file, chunk_size=1 << 16):
+    """
+    Читает товары из JSON-массива или JSONL по одному,
+    не загружая файл в память целиком
+    """
+    buffer = file.read(chunk_size).lstrip()
+    if not buffer.startswith("["):
+        lines = itertools.chain((buffer + file.readline()).splitlines(), file)
+        yield from (json.loads(line) for line in lines if line.strip())
+        return
+    decoder = json.JSONDecoder()
+    buffer = buffer[1:]
+    while True:
+        buffer = buffer.lstrip().lstrip(",").lstrip()
+        if buffer.startswith("]"):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                raise
+            buffer += chunk
+            continue
+        yield item
+        buffer = buffer[end:]
+
+
+def get_item_key(item) -> tuple[str, str]:
+    """
+    Ключ товара в фиде: SKU, а для фидов без SKU — название.
+    Товары без SKU сопоставляются с ранее импортированными товарами
+    без SKU с тем же названием
+    """
+    if item.get("sku") is not None:
+        return "sku", str(item["sku"])
+    if not item.get("title"):
+        raise CommandError(f"Item without sku and title: {item}")
+    return "title", item["title"]
+
+
+def get_item_date(item) -> datetime | None:
+    """Дата создания товара из фида, Unix timestamp"""
+    if item.get("date") is None:
+        return None
+    return datetime.fromtimestamp(item["date"], tz=timezone.utc)
+
+
+def copy_image(source: Path, destination: Path) -> bool:
+    """Копирует изображение, если в хранилище нет файла того же размера"""
+    if destination.exists() and destination.stat().st_size == source.stat().st_size:
+        return False
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    shutil.copyfile(source, destination)
+    return True
 
 
 class Command(BaseCommand):
     """
-    Creates products
+    Creates and updates products from a JSON or JSONL feed
     """
 
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="JSON array or JSONL file with products")
+        parser.add_argument(
+            "--images-dir",
+            help="Directory with product images, defaults to the feed directory",
+        )
+        parser.add_argument(
+            "--category",
+            default="Laptops",
+            help="Category title for items without a category",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--workers", type=int, default=8, help="Threads copying images"
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Skip items imported before a previous run stopped",
+        )
+
     def handle(self, *args, **options):
-        self.stdout.write("Create products")
-        path = Path("/Users/MacAlex/WorkFolder/Python/Projects/MV-parser")
-        data = PurePath(path, "laptops.json")
-        with open(data, "r") as file:
-            items = json.load(file)
-
-        for item in items:
-            product, created = Product.objects.get_or_create(
-                category=Category.objects.get(title="Laptops"),
-                price=item["price"],
-                count=item["count"],
-                date=datetime.fromtimestamp(item["date"]),
-                title=item["title"],
-                description=item["description"],
-                fullDescription=item["fullDescription"],
-                freeDelivery=item["freeDelivery"],
-            )
-            product_images = []
-            for image in item["images"]:
-                source_path = Path(PurePath(path, image["src"]))
-                item_image_path = "products/product_{pk}/images/".format(
-                    pk=product.pk,
-                    filename=image["src"],
-                )
-                image_path = f"{item_image_path}/{image['src']}"
-                destination_path = Path(PurePath(MEDIA_ROOT, item_image_path))
-                destination_path.mkdir(parents=True, exist_ok=True)
-                product_images.append(
-                    ProductImage(product=product, src=image_path, alt=image["alt"])
+        path = Path(options["path"])
+        self.images_dir = Path(options["images_dir"] or path.parent)
+        self.categories = dict(Category.objects.values_list("title", "pk"))
+        if options["category"] not in self.categories:
+            raise CommandError(f"Category {options['category']} does not exist")
+        self.default_category = self.categories[options["category"]]
+        checkpoint = path.with_name(path.name + ".checkpoint")
+        skip = (
+            int(checkpoint.read_text())
+            if options["resume"] and checkpoint.exists()
+            else 0
+        )
+
+        self.stdout.write(f"Import products from {path}")
+        started = time.perf_counter()
+        processed = skip
+        created_total = updated_total = 0
+        with open(path, "r") as file, ThreadPoolExecutor(options["workers"]) as pool:
+            self.pool = pool
+            items = itertools.islice(iter_items(file), skip, None)
+            while batch := list(itertools.islice(items, options["batch_size"])):
+                created, updated = self.import_batch(batch)
+                processed += len(batch)
+                created_total += created
+                updated_total += updated
+                checkpoint.write_text(str(processed))
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f"Processed {processed} items: {created_total} created, "
+                    f"{updated_total} updated, "
+                    f"{(processed - skip) / elapsed:.0f} items/sec"
                 )
-                shutil.copy(source_path, destination_path)
-            ProductImage.objects.bulk_create(product_images)
+        checkpoint.unlink(missing_ok=True)
+        self.stdout.write(self.style.SUCCESS("Products imported"))
+
+    def build_product(self, item, product=None):
+        product = product or Product(
+            sku=None if item.get("sku") is None else str(item["sku"])
+        )
+        product.date = get_item_date(item) or product.date
+        product.title = item["title"]
+        product.price = Decimal(str(item["price"]))
+        product.count = item["count"]
+        product.description = item.get("description", "")
+        product.fullDescription = item.get("fullDescription", "")
+        product.freeDelivery = item.get("freeDelivery", False)
+        category = item.get("category")
+        product.category_id = self.categories.get(category, self.default_category)
+        return product
+
+    def import_batch(self, items):
+        """
+        Записывает пачку товаров: новые создаются bulk_create, существующие
+        с тем же SKU обновляются bulk_update. Изображения копируются пулом
+        потоков, пачка считается импортированной после копирования всех файлов,
+        после чего для новых и измененных файлов ставится в очередь создание
+        уменьшенных копий.
+        Характеристики и изображения удаляются без сигналов post_delete,
+        поэтому поисковый индекс и кэш ответов обновляются один раз на пачку
+        """
+        items = {get_item_key(item): item for item in items}
+        skus = [value for kind, value in items if kind == "sku"]
+        titles = [value for kind, value in items if kind == "title"]
+        with transaction.atomic():
+            existing = {
+                ("sku", sku): product
+                for sku, product in Product.objects.in_bulk(
+                    skus, field_name="sku"
+                ).items()
+            }
+            existing.update(
+                (("title", product.title), product)
+                for product in Product.objects.filter(
+                    sku__isnull=True, title__in=titles
+                ).order_by("pk")
+            )
+            new_products = {
+                key: self.build_product(item)
+                for key, item in items.items()
+                if key not in existing
+            }
+            updated_products = {
+                key: self.build_product(items[key], product)
+                for key, product in existing.items()
+            }
+            Product.objects.bulk_create(new_products.values())
+            # bulk_create заменяет дату новых товаров текущей (auto_now_add)
+            dated_products = []
+            for key, product in new_products.items():
+                product.date = get_item_date(items[key])
+                if product.date is not None:
+                    dated_products.append(product)
+            Product.objects.bulk_update(dated_products, ["date"])
+            Product.objects.bulk_update(updated_products.values(), PRODUCT_FIELDS)
+            products = {**new_products, **updated_products}
+
+            specifications = Specification.objects.filter(
+                product__in=updated_products.values()
+            )
+            specifications._raw_delete(specifications.db)
             Specification.objects.bulk_create(
                 [
                     Specification(
-                        product=product,
+                        product=products[key],
                         name=parameter["name"],
                         value=parameter["value"],
                     )
-                    for parameter in item["specifications"]
+                    for key, item in items.items()
+                    for parameter in item.get("specifications", [])
                 ]
             )
-            self.stdout.write(f"Created product {product.title}")
+            copies = self.sync_images(items, products, updated_products.values())
+            get_search_backend().index_products(
+                [product.pk for product in products.values()]
+            )
+        # ProductImage создаются bulk_create без сигнала post_save,
+        # поэтому копии ставятся в очередь здесь, когда файлы уже на месте
+        for image, created, copy in copies:
+            if copy.result() or created:
+                enqueue(generate_renditions, ProductImage._meta.label, image.pk)
+        invalidate_response_cache("catalog", "sales", "product")
+        return len(new_products), len(updated_products)
 
-        self.stdout.write(self.style.SUCCESS("Products created"))
+    def sync_images(self, items, products, updated_products):
+        """Добавляет новые изображения товаров и удаляет отсутствующие в фиде"""
+        existing = {}
+        for image in ProductImage.objects.filter(product__in=updated_products):
+            existing[(image.product_id, image.src.name)] = image
+        images = []
+        copies = []
+        for key, item in items.items():
+            product = products[key]
+            directory = "products/product_{pk}/images".format(pk=product.pk)
+            for image in item.get("images", []):
+                name = f"{directory}/{PurePath(image['src']).name}"
+                product_image = existing.pop((product.pk, name), None)
+                created = product_image is None
+                if created:
+                    product_image = ProductImage(
+                        product=product, src=name, alt=image.get("alt", "")
+                    )
+                    images.append(product_image)
+                copy = self.pool.submit(
+                    copy_image,
+                    Path(self.images_dir, image["src"]),
+                    Path(settings.MEDIA_ROOT, name),
+                )
+                copies.append((product_image, created, copy))
+        ProductImage.objects.bulk_create(images)
+        removed = ProductImage.objects.filter(
+            pk__in=[image.pk for image in existing.values()]
+        )
+        removed._raw_delete(removed.db)
+        # Без сигналов post_delete файлы удаляются здесь, как это делают
+        # django_cleanup и api.signals.delete_renditions
+        for image in existing.values():
+            default_storage.delete(image.src.name)
+            if image.renditions.get("src"):
+                for name in get_rendition_names(image.renditions["src"]):
+                    default_storage.delete(name)
+        return copies
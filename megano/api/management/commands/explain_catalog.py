@@ -0,0 +1,74 @@
+import re
+
+from api.models import Category, Tag
+from api.views import CatalogListView
+from django.core.management import BaseCommand
+from django.db import connection
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+FULL_SCAN_REGEX = re.compile(
+    r"\bSCAN (api_product|api_product_tags|api_producttag)\b(?! USING)"
+)
+
+BASE_PARAMS = {
+    "filter[name]": "",
+    "filter[minPrice]": "0",
+    "filter[maxPrice]": "50000",
+    "currentPage": "1",
+    "sort": "price",
+    "sortType": "inc",
+}
+
+
+class Command(BaseCommand):
+    """
+    Runs EXPLAIN for typical catalog queries and reports full table scans
+    """
+
+    def get_cases(self):
+        category = Category.objects.filter(parent=None).values_list("pk", flat=True)
+        tag = Tag.objects.values_list("pk", flat=True)
+        category_id = str(category.first() or 1)
+        tag_id = str(tag.first() or 1)
+        return [
+            ("price range", {}),
+            ("sort by date", {"sort": "date", "sortType": "dec"}),
+            ("sort by rating", {"sort": "rating", "sortType": "dec"}),
+            ("sort by reviews", {"sort": "reviews", "sortType": "dec"}),
+            ("category", {"category": category_id}),
+            ("free delivery", {"filter[freeDelivery]": "true"}),
+            ("available", {"filter[available]": "true"}),
+            (
+                "category, free delivery",
+                {"category": category_id, "filter[freeDelivery]": "true"},
+            ),
+            ("tags", {"tags[]": tag_id}),
+            ("search", {"search": "ноут", "sort": None}),
+        ]
+
+    def get_queryset(self, params):
+        params = {k: v for k, v in {**BASE_PARAMS, **params}.items() if v is not None}
+        view = CatalogListView()
+        view.request = Request(APIRequestFactory().get("/api/catalog", params))
+        view.kwargs = {}
+        return view.get_queryset()
+
+    def handle(self, *args, **options):
+        full_scans = 0
+        for name, params in self.get_cases():
+            plan = self.get_queryset(params).explain()
+            scans = [line for line in plan.splitlines() if FULL_SCAN_REGEX.search(line)]
+            if scans:
+                full_scans += 1
+                self.stdout.write(self.style.WARNING(f"FULL SCAN  {name}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"INDEXED    {name}"))
+            if scans or options["verbosity"] > 1:
+                for line in plan.splitlines():
+                    self.stdout.write(f"    {line}")
+
+        self.stdout.write(
+            f"{full_scans} of {len(self.get_cases())} catalog queries "
+            f"use a full scan on {connection.vendor}"
+        )
@@ -0,0 +1,317 @@
+import random
+import time
+from array import array
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+
+from api.category_tree import invalidate_category_tree
+from api.models import (
+    Basket,
+    BasketItem,
+    Category,
+    Product,
+    ProductImage,
+    ProductTag,
+    RATING_HISTOGRAM_RATES,
+    Review,
+    Sale,
+    Specification,
+    Tag,
+)
+from api.popularity import refresh_popular_products
+from api.search import get_search_backend
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image
+
+PLACEHOLDER_IMAGE = "products/placeholder.jpg"
+
+ADJECTIVES = ["Smart", "Compact", "Pro", "Ultra", "Classic", "Mini", "Max", "Lite"]
+NOUNS = ["Laptop", "Phone", "Monitor", "Speaker", "Camera", "Watch", "Tablet", "TV"]
+SPECIFICATIONS = {
+    "Weight": ["0.5 kg", "1 kg", "1.5 kg", "2 kg", "5 kg"],
+    "Color": ["Black", "White", "Silver", "Gray", "Blue"],
+    "Warranty": ["1 year", "2 years", "3 years"],
+}
+
+
+def insert_rows(model, fields, rows):
+    """Вставляет строки в таблицу модели одним executemany"""
+    if not rows:
+        return
+    quote_name = connection.ops.quote_name
+    columns = ", ".join(
+        quote_name(model._meta.get_field(name).column) for name in fields
+    )
+    placeholders = ", ".join(["%s"] * len(fields))
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {quote_name(model._meta.db_table)} ({columns}) "
+            f"VALUES ({placeholders})",
+            rows,
+        )
+
+
+class Command(BaseCommand):
+    """
+    Generates synthetic catalog for benchmarks
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("--categories", type=int, default=50)
+        parser.add_argument("--products", type=int, default=10000)
+        parser.add_argument("--tags", type=int, default=50)
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument(
+            "--reviews", type=int, default=5, help="Maximum reviews per product"
+        )
+        parser.add_argument("--images", type=int, default=2, help="Images per product")
+        parser.add_argument(
+            "--sales", type=float, default=0.05, help="Share of products on sale"
+        )
+        parser.add_argument(
+            "--baskets", type=float, default=0.5, help="Share of users with a basket"
+        )
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--skip-index",
+            action="store_true",
+            help="Do not rebuild search index and popular products",
+        )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        started = time.perf_counter()
+
+        self.create_placeholder_image()
+        categories = self.create_categories(options["categories"])
+        tags = self.create_tags(options["tags"])
+        users = self.create_users(options["users"])
+        self.product_ids = array("q")
+        product_count = 0
+        products = self.create_products(options["products"], categories, users, options)
+        while True:
+            with transaction.atomic():
+                batch = next(products, None)
+                if batch is None:
+                    break
+                self.create_product_relations(batch, tags, users, options)
+            product_count += len(batch)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"Created {product_count} products, "
+                f"{product_count / elapsed:.0f} products/sec"
+            )
+        self.create_baskets(users, options["baskets"])
+
+        if not options["skip_index"]:
+            self.stdout.write("Rebuild search index and popular products")
+            with transaction.atomic():
+                get_search_backend().rebuild()
+            refresh_popular_products()
+        invalidate_category_tree()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(f"Catalog generated in {elapsed:.1f} seconds")
+        )
+
+    def create_placeholder_image(self):
+        path = Path(settings.MEDIA_ROOT, PLACEHOLDER_IMAGE)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            Image.new("RGB", (800, 800), (230, 230, 230)).save(path, "JPEG")
+
+    def create_categories(self, count):
+        """Создает дерево категорий уровнями и перестраивает индексы MPTT"""
+        self.stdout.write(f"Create {count} categories")
+        mptt_fields = {"lft": 0, "rght": 0, "tree_id": 0, "level": 0}
+        # Повторный запуск добавляет категории с новыми номерами, как тэги
+        offset = Category.objects.count()
+        roots = Category.objects.bulk_create(
+            [
+                Category(
+                    title=f"Category {offset + index}",
+                    slug=f"category-{offset + index}",
+                    **mptt_fields,
+                )
+                for index in range(max(1, count // 10))
+            ]
+        )
+        categories = list(roots)
+        parents = roots
+        while len(categories) < count:
+            children = []
+            for parent in parents:
+                for _ in range(self.random.randint(1, 4)):
+                    index = len(categories) + len(children)
+                    if index >= count:
+                        break
+                    children.append(
+                        Category(
+                            title=f"Category {offset + index}",
+                            slug=f"category-{offset + index}",
+                            parent=parent,
+                            **mptt_fields,
+                        )
+                    )
+            parents = Category.objects.bulk_create(children)
+            categories.extend(parents)
+        Category.objects.rebuild()
+        return [category.pk for category in categories]
+
+    def create_tags(self, count):
+        self.stdout.write(f"Create {count} tags")
+        offset = Tag.objects.count()
+        return [
+            tag.pk
+            for tag in Tag.objects.bulk_create(
+                [Tag(name=f"tag-{offset + index}") for index in range(count)]
+            )
+        ]
+
+    def create_users(self, count):
+        self.stdout.write(f"Create {count} users")
+        password = make_password("password")
+        offset = User.objects.count()
+        users = User.objects.bulk_create(
+            [
+                User(
+                    username=f"user-{offset + index}",
+                    first_name=f"User {offset + index}",
+                    email=f"user-{offset + index}@example.com",
+                    password=password,
+                )
+                for index in range(count)
+            ],
+            batch_size=self.batch_size,
+        )
+        return [user.pk for user in users]
+
+    def create_products(self, count, categories, users, options):
+        """
+        Создает товары пачками и возвращает каждую пачку.
+        Оценки будущих отзывов выбираются заранее, чтобы сразу сохранить
+        денормализованный рейтинг товара
+        """
+        self.stdout.write(f"Create {count} products")
+        now = timezone.now()
+        for start in range(0, count, self.batch_size):
+            products = []
+            for index in range(start, min(start + self.batch_size, count)):
+                rates = []
+                if users:
+                    rates = [
+                        self.random.randint(1, 5)
+                        for _ in range(self.random.randint(0, options["reviews"]))
+                    ]
+                product = Product(
+                    title=(
+                        f"{self.random.choice(ADJECTIVES)} "
+                        f"{self.random.choice(NOUNS)} {index}"
+                    ),
+                    price=Decimal(self.random.randint(100, 300000)),
+                    count=self.random.choice([0, 1, 5, 10, 50, 100]),
+                    date=now - timedelta(minutes=index),
+                    description=f"Description of product {index}",
+                    fullDescription=f"Full description of product {index}",
+                    category_id=self.random.choice(categories),
+                    freeDelivery=self.random.random() < 0.3,
+                    limited_edition=self.random.random() < 0.01,
+                    rating=sum(rates) / len(rates) if rates else None,
+                    rating_sum=sum(rates),
+                    reviews_count=len(rates),
+                    **{
+                        f"rating_count_{rate}": rates.count(rate)
+                        for rate in RATING_HISTOGRAM_RATES
+                    },
+                )
+                product.rates = rates
+                products.append(product)
+            Product.objects.bulk_create(products)
+            yield products
+
+    def create_product_relations(self, products, tags, users, options):
+        """
+        Создает изображения, тэги, характеристики, отзывы и распродажи товаров.
+        Массовые связанные строки вставляются без создания экземпляров моделей
+        """
+        images = []
+        product_tags = []
+        specifications = []
+        reviews = []
+        sales = []
+        now = timezone.now()
+        review_date = connection.ops.adapt_datetimefield_value(now)
+        for product in products:
+            pk = product.pk
+            self.product_ids.append(pk)
+            images.extend(
+                (pk, PLACEHOLDER_IMAGE, "placeholder", "{}")
+                for _ in range(options["images"])
+            )
+            product_tags.extend(
+                (pk, tag) for tag in self.random.sample(tags, min(len(tags), 2))
+            )
+            specifications.extend(
+                (pk, name, self.random.choice(values))
+                for name, values in SPECIFICATIONS.items()
+            )
+            reviews.extend(
+                (
+                    self.random.choice(users),
+                    pk,
+                    "Customer",
+                    "customer@example.com",
+                    "Synthetic review",
+                    rate,
+                    review_date,
+                )
+                for rate in product.rates
+            )
+            if self.random.random() < options["sales"]:
+                sales.append(
+                    Sale(
+                        product_id=pk,
+                        salePrice=Decimal(self.random.randint(50, 1000)),
+                        dateFrom=now - timedelta(days=self.random.randint(0, 10)),
+                        dateTo=now + timedelta(days=self.random.randint(1, 30)),
+                    )
+                )
+        insert_rows(ProductImage, ["product", "src", "alt", "renditions"], images)
+        insert_rows(ProductTag, ["product", "tag"], product_tags)
+        insert_rows(Specification, ["product", "name", "value"], specifications)
+        insert_rows(
+            Review,
+            ["user", "product", "author", "email", "text", "rate", "date"],
+            reviews,
+        )
+        Sale.objects.bulk_create(sales, batch_size=self.batch_size)
+
+    def create_baskets(self, users, share):
+        baskets = Basket.objects.bulk_create(
+            [Basket(user_id=pk) for pk in users if self.random.random() < share]
+        )
+        self.stdout.write(f"Create {len(baskets)} baskets")
+        if not self.product_ids:
+            return
+        items = []
+        for basket in baskets:
+            product_ids = {
+                self.random.choice(self.product_ids)
+                for _ in range(self.random.randint(1, 5))
+            }
+            items.extend(
+                BasketItem(
+                    basket=basket, product_id=pk, count=self.random.randint(1, 3)
+                )
+                for pk in product_ids
+            )
+        BasketItem.objects.bulk_create(items, batch_size=self.batch_size)
@@ -0,0 +1,87 @@
+import itertools
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from api.category_tree import invalidate_category_tree
+from api.models import CategoryImage, ProductImage
+from api.renditions import has_renditions, render_image
+from api.response_cache import invalidate_response_cache
+from django.core.management import BaseCommand
+from django.db import connections
+
+
+def try_render_image(name: str) -> dict | str:
+    """Возвращает renditions или текст ошибки, чтобы один файл не прерывал пакет"""
+    try:
+        return render_image(name)
+    except Exception as error:
+        return f"{name}: {error!r}"
+
+
+class Command(BaseCommand):
+    """
+    Generates thumbnail, medium and large renditions of product and category images
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes", type=int, default=None, help="Worker processes"
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Regenerate renditions that already exist",
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        total = 0
+        batch_size = options["batch_size"]
+        # Дочерние процессы работают только с файлами и не используют соединения
+        connections.close_all()
+        with ProcessPoolExecutor(options["processes"]) as pool:
+            for model in (ProductImage, CategoryImage):
+                images = (
+                    image
+                    for image in model.objects.only("pk", "src", "renditions")
+                    .order_by("pk")
+                    .iterator(chunk_size=batch_size)
+                    if image.src.name
+                    and (options["force"] or not has_renditions(image))
+                )
+                found = rendered = 0
+                while batch := list(itertools.islice(images, batch_size)):
+                    found += len(batch)
+                    rendered += self.render_batch(pool, model, batch)
+                total += rendered
+                self.stdout.write(
+                    f"{model._meta.verbose_name_plural}: {rendered} of {found}"
+                )
+        invalidate_category_tree()
+        invalidate_response_cache("catalog", "sales", "product")
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Generated renditions for {total} images in {elapsed:.1f} s"
+            )
+        )
+
+    def render_batch(self, pool, model, images) -> int:
+        """
+        Создает копии пачки изображений в процессах пула и сохраняет
+        поле renditions одним bulk_update, поэтому в памяти не больше
+        одной пачки, а прерванный запуск сохраняет готовые пачки
+        """
+        results = pool.map(
+            try_render_image, [image.src.name for image in images], chunksize=16
+        )
+        rendered = []
+        for image, result in zip(images, results):
+            if isinstance(result, str):
+                self.stderr.write(result)
+                continue
+            image.renditions = result
+            rendered.append(image)
+        model.objects.bulk_update(rendered, ["renditions"])
+        return len(rendered)
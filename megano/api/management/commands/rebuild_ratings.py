@@ -0,0 +1,67 @@
+from api.models import RATING_HISTOGRAM_RATES, Product, Review
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.db.models import Avg, Count, IntegerField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def review_aggregate(aggregate):
+    """Подзапрос с агрегатом по отзывам текущего товара"""
+    reviews = (
+        Review.objects.filter(product=OuterRef("pk"))
+        .order_by()
+        .values("product")
+        .annotate(value=aggregate)
+        .values("value")
+    )
+    return Subquery(reviews)
+
+
+class Command(BaseCommand):
+    """
+    Rebuilds denormalized product ratings from reviews
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10000,
+            help="Number of products updated per statement",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("Rebuild product ratings")
+        batch_size = options["batch_size"]
+        histogram = {
+            f"rating_count_{rate}": Coalesce(
+                review_aggregate(Count("pk", filter=Q(rate=rate))),
+                0,
+                output_field=IntegerField(),
+            )
+            for rate in RATING_HISTOGRAM_RATES
+        }
+        product_ids = Product.objects.order_by("pk").values_list("pk", flat=True)
+        last_id = 0
+        updated = 0
+        while True:
+            batch = list(product_ids.filter(pk__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            with transaction.atomic():
+                updated += Product.objects.filter(
+                    pk__gte=batch[0], pk__lte=batch[-1]
+                ).update(
+                    reviews_count=Coalesce(
+                        review_aggregate(Count("pk")), 0, output_field=IntegerField()
+                    ),
+                    rating_sum=Coalesce(
+                        review_aggregate(Sum("rate")), 0, output_field=IntegerField()
+                    ),
+                    rating=review_aggregate(Avg("rate")),
+                    **histogram,
+                )
+            last_id = batch[-1]
+            self.stdout.write(f"Updated {updated} products")
+
+        self.stdout.write(self.style.SUCCESS("Product ratings rebuilt"))
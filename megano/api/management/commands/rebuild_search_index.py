@@ -0,0 +1,15 @@
+from api.search import get_search_backend
+from django.core.management import BaseCommand
+from django.db import transaction
+
+
+class Command(BaseCommand):
+    """
+    Rebuilds products search index
+    """
+
+    def handle(self, *args, **options):
+        self.stdout.write("Rebuild search index")
+        with transaction.atomic():
+            count = get_search_backend().rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} products"))
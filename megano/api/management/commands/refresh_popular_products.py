@@ -0,0 +1,34 @@
+import time
+
+from api.popularity import refresh_popular_products
+from django.conf import settings
+from django.core.management import BaseCommand
+
+
+class Command(BaseCommand):
+    """
+    Recalculates popular products ranking
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep running and refresh the ranking every interval",
+        )
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=settings.POPULAR_PRODUCTS_REFRESH_INTERVAL,
+            help="Refresh interval in seconds for --loop",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            ranking = refresh_popular_products()
+            self.stdout.write(
+                self.style.SUCCESS(f"Popular products ranking: {len(ranking)} items")
+            )
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,38 @@
+from datetime import timedelta
+
+from api.models import Order
+from api.tasks import recover_payment, release_order
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    """
+    Reconciles payments left in progress for longer than ORDER_PAYMENT_TIMEOUT,
+    then cancels orders left unpaid for longer than ORDER_RESERVATION_TIMEOUT
+    and returns their products to stock. New orders and payments are handled
+    by queued recover_payment and release_order tasks, the command covers
+    orders whose task was lost
+    """
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        paying_before = now - timedelta(seconds=settings.ORDER_PAYMENT_TIMEOUT)
+        order_ids = (
+            Order.objects.filter(status=Order.STATUS_PAYING)
+            .filter(Q(payingAt__lt=paying_before) | Q(payingAt__isnull=True))
+            .values_list("pk", flat=True)
+        )
+        for order_id in order_ids:
+            recover_payment(order_id)
+        self.stdout.write(self.style.SUCCESS(f"Recovered {len(order_ids)} payments"))
+
+        created_before = now - timedelta(seconds=settings.ORDER_RESERVATION_TIMEOUT)
+        order_ids = Order.objects.filter(
+            status__in=Order.UNPAID_STATUSES, createdAt__lt=created_before
+        ).values_list("pk", flat=True)
+        for order_id in order_ids:
+            release_order(order_id)
+        self.stdout.write(self.style.SUCCESS(f"Released {len(order_ids)} orders"))
@@ -0,0 +1,26 @@
+from api.response_cache import get_response_cache_stats
+from django.core.management import BaseCommand
+
+CACHED_VIEWS = [
+    "ProductDetailView",
+    "CatalogListView",
+    "CatalogFacetsView",
+    "TagListView",
+    "SaleListView",
+]
+
+
+class Command(BaseCommand):
+    """
+    Prints response cache hit and miss counters
+    """
+
+    def handle(self, *args, **options):
+        stats = get_response_cache_stats(CACHED_VIEWS)
+        self.stdout.write(f"{'view':<20}{'hits':>10}{'misses':>10}{'hit rate':>10}")
+        for view, counters in stats.items():
+            total = counters["hit"] + counters["miss"]
+            rate = counters["hit"] / total if total else 0
+            self.stdout.write(
+                f"{view:<20}{counters['hit']:>10}{counters['miss']:>10}{rate:>10.1%}"
+            )
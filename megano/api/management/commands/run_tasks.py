@@ -0,0 +1,51 @@
+import multiprocessing
+
+from api.tasks import work
+from django.core.management import BaseCommand
+from django.db import connections
+
+
+def run_worker(burst, sleep):
+    # Дочерний процесс открывает собственные соединения с базой
+    connections.close_all()
+    work(burst=burst, sleep=sleep)
+
+
+class Command(BaseCommand):
+    """
+    Runs background task workers
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes", type=int, default=1, help="Number of worker processes"
+        )
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="Exit when the queue is empty instead of waiting for new tasks",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=1,
+            help="Seconds to wait before polling an empty queue again",
+        )
+
+    def handle(self, *args, **options):
+        if options["processes"] == 1:
+            processed = work(burst=options["burst"], sleep=options["sleep"])
+            self.stdout.write(self.style.SUCCESS(f"Processed {processed} tasks"))
+            return
+        connections.close_all()
+        workers = [
+            multiprocessing.Process(
+                target=run_worker, args=(options["burst"], options["sleep"])
+            )
+            for _ in range(options["processes"])
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f"Started {len(workers)} workers")
+        for worker in workers:
+            worker.join()
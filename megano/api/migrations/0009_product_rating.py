@@ -0,0 +1,65 @@
+# Generated by Django 4.2 on 2026-10-17 17:23
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_product_rating(apps, schema_editor):
+    Product = apps.get_model("api", "Product")
+    Review = apps.get_model("api", "Review")
+
+    def review_aggregate(aggregate):
+        return Subquery(
+            Review.objects.filter(product=OuterRef("pk"))
+            .order_by()
+            .values("product")
+            .annotate(value=aggregate)
+            .values("value")
+        )
+
+    Product.objects.update(
+        reviews_count=Coalesce(
+            review_aggregate(Count("pk")), 0, output_field=IntegerField()
+        ),
+        rating_sum=Coalesce(
+            review_aggregate(Sum("rate")), 0, output_field=IntegerField()
+        ),
+        rating=review_aggregate(Avg("rate")),
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0008_remove_basket_count_remove_basket_product_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="rating",
+            field=models.FloatField(
+                blank=True, editable=False, null=True, verbose_name="Rating"
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_sum",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Rating sum"
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="reviews_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Reviews count"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="basketitem",
+            name="count",
+            field=models.IntegerField(default=1, verbose_name="Count"),
+        ),
+        migrations.RunPython(fill_product_rating, migrations.RunPython.noop),
+    ]
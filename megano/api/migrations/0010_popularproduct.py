@@ -0,0 +1,49 @@
+# Generated by Django 4.2 on 2026-10-17 17:24
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0009_product_rating"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PopularProduct",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "position",
+                    models.PositiveSmallIntegerField(
+                        unique=True, verbose_name="Position"
+                    ),
+                ),
+                ("score", models.FloatField(default=0, verbose_name="Score")),
+                ("updated", models.DateTimeField(verbose_name="Date of calculation")),
+                (
+                    "product",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="popularity",
+                        to="api.product",
+                        verbose_name="Product",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "popular product",
+                "verbose_name_plural": "popular products",
+                "ordering": ["position"],
+            },
+        ),
+    ]
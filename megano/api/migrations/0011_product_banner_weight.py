@@ -0,0 +1,21 @@
+# Generated by Django 4.2 on 2026-10-17 17:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0010_popularproduct"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="banner_weight",
+            field=models.PositiveSmallIntegerField(
+                default=1,
+                help_text="Relative chance to be shown in banners, 0 excludes the product",
+                verbose_name="Banner weight",
+            ),
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+
+def create_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS api_product_fts USING fts5("
+        "title, description, tags, specifications, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    schema_editor.execute(
+        "INSERT INTO api_product_fts "
+        "(rowid, title, description, tags, specifications) "
+        "SELECT p.id, p.title, p.description, "
+        "COALESCE((SELECT group_concat(t.name, ' ') FROM api_producttag pt "
+        "JOIN api_tag t ON t.id = pt.tag_id WHERE pt.product_id = p.id), ''), "
+        "COALESCE((SELECT group_concat(s.name || ' ' || s.value, ' ') "
+        "FROM api_specification s WHERE s.product_id = p.id), '') "
+        "FROM api_product p"
+    )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS api_product_fts")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0011_product_banner_weight"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 4.2 on 2026-10-17 17:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0012_product_fts"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["category", "price"], name="product_category_price"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(fields=["price"], name="product_price"),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["archived", "date"], name="product_archived_date"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(fields=["rating"], name="product_rating"),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(fields=["reviews_count"], name="product_reviews_count"),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("freeDelivery", True)),
+                fields=["price"],
+                name="product_free_delivery_price",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("count__gt", 0)),
+                fields=["price"],
+                name="product_available_price",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("limited_edition", True)),
+                fields=["id"],
+                name="product_limited_edition",
+            ),
+        ),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 4.2 on 2026-10-17 17:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0013_product_catalog_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="sale",
+            index=models.Index(fields=["dateFrom", "dateTo"], name="sale_dates"),
+        ),
+    ]
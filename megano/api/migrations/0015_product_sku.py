@@ -0,0 +1,24 @@
+# Generated by Django 4.2 on 2026-10-17 17:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0014_sale_dates_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="sku",
+            field=models.CharField(
+                blank=True,
+                help_text="External identifier used by product imports",
+                max_length=64,
+                null=True,
+                unique=True,
+                verbose_name="SKU",
+            ),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2 on 2026-10-17 17:39
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_basket_items(apps, schema_editor):
+    BasketItem = apps.get_model("api", "BasketItem")
+    duplicates = (
+        BasketItem.objects.values("basket", "product")
+        .annotate(items=Count("pk"), first=Min("pk"), total=Sum("count"))
+        .filter(items__gt=1)
+    )
+    for duplicate in duplicates:
+        BasketItem.objects.filter(pk=duplicate["first"]).update(
+            count=duplicate["total"]
+        )
+        BasketItem.objects.filter(
+            basket=duplicate["basket"], product=duplicate["product"]
+        ).exclude(pk=duplicate["first"]).delete()
+    BasketItem.objects.filter(count__lte=0).delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0015_product_sku"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_basket_items, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="basketitem",
+            constraint=models.UniqueConstraint(
+                fields=("basket", "product"), name="basket_item_unique_product"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="basketitem",
+            constraint=models.CheckConstraint(
+                check=models.Q(("count__gte", 0)), name="basket_item_count_gte_0"
+            ),
+        ),
+    ]
@@ -0,0 +1,173 @@
+# Generated by Django 4.2 on 2026-10-17 17:41
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("api", "0016_basketitem_constraints"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Order",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "createdAt",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Created at"),
+                ),
+                (
+                    "fullName",
+                    models.CharField(
+                        blank=True, max_length=200, verbose_name="Full name"
+                    ),
+                ),
+                (
+                    "email",
+                    models.EmailField(blank=True, max_length=100, verbose_name="Email"),
+                ),
+                (
+                    "phone",
+                    models.CharField(blank=True, max_length=20, verbose_name="Phone"),
+                ),
+                (
+                    "deliveryType",
+                    models.CharField(
+                        choices=[("ordinary", "Ordinary"), ("express", "Express")],
+                        default="ordinary",
+                        max_length=20,
+                        verbose_name="Delivery type",
+                    ),
+                ),
+                (
+                    "paymentType",
+                    models.CharField(
+                        choices=[
+                            ("online", "Online"),
+                            ("someone", "Online from someone else's account"),
+                        ],
+                        default="online",
+                        max_length=20,
+                        verbose_name="Payment type",
+                    ),
+                ),
+                (
+                    "totalCost",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=10,
+                        verbose_name="Total cost",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("created", "Created"),
+                            ("accepted", "Accepted"),
+                            ("paying", "Payment in progress"),
+                            ("paid", "Paid"),
+                        ],
+                        default="created",
+                        max_length=20,
+                        verbose_name="Status",
+                    ),
+                ),
+                (
+                    "city",
+                    models.CharField(blank=True, max_length=100, verbose_name="City"),
+                ),
+                (
+                    "address",
+                    models.CharField(
+                        blank=True, max_length=200, verbose_name="Address"
+                    ),
+                ),
+                (
+                    "paymentError",
+                    models.CharField(
+                        blank=True, max_length=200, verbose_name="Payment error"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "order",
+                "verbose_name_plural": "orders",
+                "ordering": ["-createdAt", "-pk"],
+            },
+        ),
+        migrations.CreateModel(
+            name="OrderItem",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "price",
+                    models.DecimalField(
+                        decimal_places=2, max_digits=8, verbose_name="Price"
+                    ),
+                ),
+                ("count", models.PositiveIntegerField(verbose_name="Count")),
+            ],
+            options={
+                "verbose_name": "order item",
+                "verbose_name_plural": "order items",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="product",
+            constraint=models.CheckConstraint(
+                check=models.Q(("count__gte", 0)), name="product_count_gte_0"
+            ),
+        ),
+        migrations.AddField(
+            model_name="orderitem",
+            name="order",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="items",
+                to="api.order",
+                verbose_name="Order",
+            ),
+        ),
+        migrations.AddField(
+            model_name="orderitem",
+            name="product",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="order_items",
+                to="api.product",
+                verbose_name="Product",
+            ),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="user",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="orders",
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="User",
+            ),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2 on 2026-10-17 17:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0018_task"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="categoryimage",
+            name="renditions",
+            field=models.JSONField(
+                blank=True, default=dict, editable=False, verbose_name="Renditions"
+            ),
+        ),
+        migrations.AddField(
+            model_name="productimage",
+            name="renditions",
+            field=models.JSONField(
+                blank=True, default=dict, editable=False, verbose_name="Renditions"
+            ),
+        ),
+    ]
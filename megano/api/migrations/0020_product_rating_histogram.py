@@ -0,0 +1,68 @@
+# Generated by Django 4.2 on 2026-10-17 18:06
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_rating_histogram(apps, schema_editor):
+    Product = apps.get_model("api", "Product")
+    Review = apps.get_model("api", "Review")
+    histogram = {}
+    for rate in range(1, 6):
+        reviews = (
+            Review.objects.filter(product=OuterRef("pk"))
+            .order_by()
+            .values("product")
+            .annotate(value=Count("pk", filter=Q(rate=rate)))
+            .values("value")
+        )
+        histogram[f"rating_count_{rate}"] = Coalesce(
+            Subquery(reviews), 0, output_field=IntegerField()
+        )
+    Product.objects.filter(reviews_count__gt=0).update(**histogram)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0019_image_renditions"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="rating_count_1",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Reviews rated 1"
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_count_2",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Reviews rated 2"
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_count_3",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Reviews rated 3"
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_count_4",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Reviews rated 4"
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_count_5",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Reviews rated 5"
+            ),
+        ),
+        migrations.RunPython(fill_rating_histogram, migrations.RunPython.noop),
+    ]
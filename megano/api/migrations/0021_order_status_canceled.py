@@ -0,0 +1,28 @@
+# Generated by Django 4.2 on 2026-10-17 18:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0020_product_rating_histogram"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="order",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("created", "Created"),
+                    ("accepted", "Accepted"),
+                    ("paying", "Payment in progress"),
+                    ("paid", "Paid"),
+                    ("canceled", "Canceled"),
+                ],
+                default="created",
+                max_length=20,
+                verbose_name="Status",
+            ),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2 on 2026-10-17 19:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0021_order_status_canceled"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="payingAt",
+            field=models.DateTimeField(
+                blank=True, editable=False, null=True, verbose_name="Payment started at"
+            ),
+        ),
+    ]
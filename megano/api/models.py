@@ -59,6 +59,10 @@ class CategoryImage(models.Model):
     alt = models.CharField(
         max_length=200, null=False, blank=True, verbose_name="Description"
     )
+    # Ширины сгенерированных уменьшенных копий, заполняется api.renditions
+    renditions = models.JSONField(
+        default=dict, blank=True, editable=False, verbose_name="Renditions"
+    )
 
     class Meta:
         verbose_name = "category image"
@@ -80,9 +84,21 @@ class Tag(models.Model):
         return f"{self.name}"
 
 
+# Оценки, для которых в товаре хранятся счетчики отзывов rating_count_N
+RATING_HISTOGRAM_RATES = range(1, 6)
+
+
 class Product(models.Model):
     """Модель товара"""
 
+    sku = models.CharField(
+        max_length=64,
+        unique=True,
+        null=True,
+        blank=True,
+        verbose_name="SKU",
+        help_text="External identifier used by product imports",
+    )
     title = models.CharField(
         max_length=100, null=False, blank=False, verbose_name="Name"
     )
@@ -107,6 +123,37 @@ class Product(models.Model):
         Tag, through="ProductTag", related_name="products", verbose_name="Tag"
     )
     limited_edition = models.BooleanField(default=False, verbose_name="Limited edition")
+    banner_weight = models.PositiveSmallIntegerField(
+        default=1,
+        verbose_name="Banner weight",
+        help_text="Relative chance to be shown in banners, 0 excludes the product",
+    )
+    # Денормализованные данные отзывов, обновляются сигналами модели Review
+    rating = models.FloatField(
+        null=True, blank=True, editable=False, verbose_name="Rating"
+    )
+    rating_sum = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Rating sum"
+    )
+    reviews_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Reviews count"
+    )
+    # Гистограмма оценок: количество отзывов с оценкой от 1 до 5
+    rating_count_1 = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Reviews rated 1"
+    )
+    rating_count_2 = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Reviews rated 2"
+    )
+    rating_count_3 = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Reviews rated 3"
+    )
+    rating_count_4 = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Reviews rated 4"
+    )
+    rating_count_5 = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Reviews rated 5"
+    )
 
     def __str__(self):
         return f"{self.title} (pk={self.pk})"
@@ -114,6 +161,35 @@ class Product(models.Model):
     class Meta:
         verbose_name = "product"
         verbose_name_plural = "products"
+        # Индексы под фильтры и сортировки каталога,
+        # проверяются командой explain_catalog
+        indexes = [
+            models.Index(fields=["category", "price"], name="product_category_price"),
+            models.Index(fields=["price"], name="product_price"),
+            models.Index(fields=["archived", "date"], name="product_archived_date"),
+            models.Index(fields=["rating"], name="product_rating"),
+            models.Index(fields=["reviews_count"], name="product_reviews_count"),
+            models.Index(
+                fields=["price"],
+                condition=models.Q(freeDelivery=True),
+                name="product_free_delivery_price",
+            ),
+            models.Index(
+                fields=["price"],
+                condition=models.Q(count__gt=0),
+                name="product_available_price",
+            ),
+            models.Index(
+                fields=["id"],
+                condition=models.Q(limited_edition=True),
+                name="product_limited_edition",
+            ),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(count__gte=0), name="product_count_gte_0"
+            ),
+        ]
 
 
 def product_images_directory_path(instance: "ProductImage", filename: str) -> str:
@@ -148,6 +224,10 @@ class ProductImage(models.Model):
     alt = models.CharField(
         max_length=200, null=False, blank=True, verbose_name="Description"
     )
+    # Ширины сгенерированных уменьшенных копий, заполняется api.renditions
+    renditions = models.JSONField(
+        default=dict, blank=True, editable=False, verbose_name="Renditions"
+    )
 
     class Meta:
         ordering = ["src"]
@@ -155,6 +235,25 @@ class ProductImage(models.Model):
         verbose_name_plural = "products images"
 
 
+class PopularProduct(models.Model):
+    """Модель предрассчитанного рейтинга популярных товаров"""
+
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        related_name="popularity",
+        verbose_name="Product",
+    )
+    position = models.PositiveSmallIntegerField(unique=True, verbose_name="Position")
+    score = models.FloatField(default=0, verbose_name="Score")
+    updated = models.DateTimeField(verbose_name="Date of calculation")
+
+    class Meta:
+        ordering = ["position"]
+        verbose_name = "popular product"
+        verbose_name_plural = "popular products"
+
+
 class Review(models.Model):
     """Модель отзыва на товар"""
 
@@ -279,6 +378,9 @@ class Sale(models.Model):
     class Meta:
         verbose_name = "sale"
         verbose_name_plural = "sales"
+        indexes = [
+            models.Index(fields=["dateFrom", "dateTo"], name="sale_dates"),
+        ]
 
 
 class Basket(models.Model):
@@ -306,3 +408,148 @@ class BasketItem(models.Model):
         related_name="basket_items",
     )
     count = models.IntegerField(default=1, verbose_name="Count")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["basket", "product"], name="basket_item_unique_product"
+            ),
+            models.CheckConstraint(
+                check=models.Q(count__gte=0), name="basket_item_count_gte_0"
+            ),
+        ]
+
+
+class Order(models.Model):
+    """Модель заказа"""
+
+    DELIVERY_ORDINARY = "ordinary"
+    DELIVERY_EXPRESS = "express"
+    DELIVERY_TYPES = [
+        (DELIVERY_ORDINARY, "Ordinary"),
+        (DELIVERY_EXPRESS, "Express"),
+    ]
+    PAYMENT_ONLINE = "online"
+    PAYMENT_SOMEONE = "someone"
+    PAYMENT_TYPES = [
+        (PAYMENT_ONLINE, "Online"),
+        (PAYMENT_SOMEONE, "Online from someone else's account"),
+    ]
+    STATUS_CREATED = "created"
+    STATUS_ACCEPTED = "accepted"
+    STATUS_PAYING = "paying"
+    STATUS_PAID = "paid"
+    STATUS_CANCELED = "canceled"
+    STATUSES = [
+        (STATUS_CREATED, "Created"),
+        (STATUS_ACCEPTED, "Accepted"),
+        (STATUS_PAYING, "Payment in progress"),
+        (STATUS_PAID, "Paid"),
+        (STATUS_CANCELED, "Canceled"),
+    ]
+    # Заказы, которые еще можно изменить и оплатить
+    UNPAID_STATUSES = [STATUS_CREATED, STATUS_ACCEPTED]
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="orders", verbose_name="User"
+    )
+    createdAt = models.DateTimeField(auto_now_add=True, verbose_name="Created at")
+    fullName = models.CharField(max_length=200, blank=True, verbose_name="Full name")
+    email = models.EmailField(max_length=100, blank=True, verbose_name="Email")
+    phone = models.CharField(max_length=20, blank=True, verbose_name="Phone")
+    deliveryType = models.CharField(
+        max_length=20,
+        choices=DELIVERY_TYPES,
+        default=DELIVERY_ORDINARY,
+        verbose_name="Delivery type",
+    )
+    paymentType = models.CharField(
+        max_length=20,
+        choices=PAYMENT_TYPES,
+        default=PAYMENT_ONLINE,
+        verbose_name="Payment type",
+    )
+    totalCost = models.DecimalField(
+        default=0, max_digits=10, decimal_places=2, verbose_name="Total cost"
+    )
+    status = models.CharField(
+        max_length=20, choices=STATUSES, default=STATUS_CREATED, verbose_name="Status"
+    )
+    city = models.CharField(max_length=100, blank=True, verbose_name="City")
+    address = models.CharField(max_length=200, blank=True, verbose_name="Address")
+    paymentError = models.CharField(
+        max_length=200, blank=True, verbose_name="Payment error"
+    )
+    # Время перевода в статус paying, по нему находятся прерванные оплаты
+    payingAt = models.DateTimeField(
+        null=True, blank=True, editable=False, verbose_name="Payment started at"
+    )
+
+    class Meta:
+        verbose_name = "order"
+        verbose_name_plural = "orders"
+        ordering = ["-createdAt", "-pk"]
+
+    def __str__(self):
+        return f"Order {self.pk}"
+
+
+class OrderItem(models.Model):
+    order = models.ForeignKey(
+        Order, on_delete=models.CASCADE, related_name="items", verbose_name="Order"
+    )
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.PROTECT,
+        related_name="order_items",
+        verbose_name="Product",
+    )
+    price = models.DecimalField(max_digits=8, decimal_places=2, verbose_name="Price")
+    count = models.PositiveIntegerField(verbose_name="Count")
+
+    class Meta:
+        verbose_name = "order item"
+        verbose_name_plural = "order items"
+
+
+class Task(models.Model):
+    """
+    Фоновая задача, выполняется командой run_tasks и удаляется после успеха.
+    Взятая воркером задача скрыта от других воркеров до locked_until,
+    после этого считается зависшей и выдается снова
+    """
+
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_FAILED = "failed"
+    STATUSES = [
+        (STATUS_QUEUED, "Queued"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    name = models.CharField(max_length=200, verbose_name="Name")
+    args = models.JSONField(default=list, verbose_name="Arguments")
+    status = models.CharField(
+        max_length=20, choices=STATUSES, default=STATUS_QUEUED, verbose_name="Status"
+    )
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Attempts")
+    max_attempts = models.PositiveSmallIntegerField(
+        default=5, verbose_name="Max attempts"
+    )
+    run_at = models.DateTimeField(verbose_name="Run at")
+    locked_until = models.DateTimeField(
+        null=True, blank=True, verbose_name="Locked until"
+    )
+    last_error = models.TextField(blank=True, verbose_name="Last error")
+    created = models.DateTimeField(auto_now_add=True, verbose_name="Created")
+
+    class Meta:
+        verbose_name = "task"
+        verbose_name_plural = "tasks"
+        indexes = [
+            models.Index(fields=["status", "run_at"], name="task_status_run_at"),
+        ]
+
+    def __str__(self):
+        return f"{self.name} (pk={self.pk}, {self.status})"
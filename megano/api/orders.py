@@ -0,0 +1,169 @@
+from decimal import Decimal
+
+from api.models import BasketItem, Order, OrderItem, Product
+from api.payments import PaymentError, get_payment_processor
+from api.response_cache import invalidate_response_cache
+from api.tasks import enqueue, recover_payment, release_order
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Prefetch, QuerySet, Value, When
+from django.utils import timezone
+
+CUSTOMER_FIELDS = ("fullName", "email", "phone", "city", "address")
+
+
+class OutOfStock(Exception):
+    """Товара на складе меньше, чем в заказе"""
+
+    def __init__(self, product_id: int | None):
+        super().__init__(f"Product {product_id} is out of stock")
+        self.product_id = product_id
+
+
+def get_orders(user: User) -> QuerySet:
+    """
+    Возвращает заказы пользователя с товарами.
+    Для сериализации нужно четыре запроса независимо от числа заказов
+    """
+    items = OrderItem.objects.select_related("product").prefetch_related(
+        "product__tags", "product__images"
+    )
+    return Order.objects.filter(user=user).prefetch_related(
+        Prefetch("items", queryset=items.order_by("pk"))
+    )
+
+
+def create_order(user: User, items: dict[int, int]) -> Order:
+    """
+    Создает заказ из товаров id -> количество и резервирует их на складе.
+    Остатки всех товаров уменьшаются одним условным UPDATE ... WHERE count >= n,
+    поэтому параллельные заказы не могут продать больше, чем есть на складе.
+    При нехватке любого товара транзакция откатывается и вызывается OutOfStock.
+    Заказ, не оплаченный за ORDER_RESERVATION_TIMEOUT секунд, отменяется
+    задачей release_order
+    """
+    now = timezone.now()
+    required = Case(
+        *(
+            When(pk=product_id, then=Value(count))
+            for product_id, count in items.items()
+        ),
+        output_field=IntegerField(),
+    )
+    try:
+        with transaction.atomic():
+            reserved = Product.objects.filter(
+                pk__in=items.keys(), archived=False, count__gte=required
+            ).update(count=F("count") - required)
+            if reserved < len(items):
+                raise OutOfStock(None)
+            products = Product.objects.select_related("sale").in_bulk(items.keys())
+            order = Order.objects.create(user=user)
+            order_items = [
+                OrderItem(
+                    order=order,
+                    product_id=product_id,
+                    price=get_price(products[product_id], now),
+                    count=count,
+                )
+                for product_id, count in items.items()
+            ]
+            OrderItem.objects.bulk_create(order_items)
+            order.totalCost = sum(item.price * item.count for item in order_items)
+            order.save(update_fields=["totalCost"])
+            BasketItem.objects.filter(
+                basket__user=user, product_id__in=items.keys()
+            ).delete()
+            enqueue(release_order, order.pk, delay=settings.ORDER_RESERVATION_TIMEOUT)
+    except OutOfStock:
+        raise OutOfStock(get_unavailable_product(items)) from None
+    invalidate_response_cache(
+        "catalog", *(f"product:{product_id}" for product_id in items)
+    )
+    return order
+
+
+def get_unavailable_product(items: dict[int, int]) -> int | None:
+    """Возвращает id первого товара, которого не хватает для заказа"""
+    available = dict(
+        Product.objects.filter(pk__in=items.keys(), archived=False).values_list(
+            "pk", "count"
+        )
+    )
+    for product_id, count in items.items():
+        if available.get(product_id, 0) < count:
+            return product_id
+    return None
+
+
+def get_price(product: Product, now) -> Decimal:
+    """Цена товара с учетом действующей распродажи"""
+    sale = getattr(product, "sale", None)
+    if sale is not None and sale.dateFrom <= now <= sale.dateTo:
+        return sale.salePrice
+    return product.price
+
+
+def get_delivery_cost(delivery_type: str, cost: Decimal) -> Decimal:
+    """
+    Обычная доставка бесплатна для заказов от ORDER_FREE_DELIVERY_MIN_COST,
+    экспресс-доставка оплачивается всегда
+    """
+    if delivery_type == Order.DELIVERY_EXPRESS:
+        return Decimal(settings.ORDER_EXPRESS_DELIVERY_COST)
+    if cost >= settings.ORDER_FREE_DELIVERY_MIN_COST:
+        return Decimal(0)
+    return Decimal(settings.ORDER_DELIVERY_COST)
+
+
+def confirm_order(order: Order, data: dict) -> bool:
+    """
+    Сохраняет данные покупателя и доставки, пересчитывает стоимость.
+    Заказ сохраняется условным UPDATE, поэтому отмененный release_order
+    или оплачиваемый заказ не изменяется. Возвращает False, если заказ
+    нельзя изменить
+    """
+    for field in CUSTOMER_FIELDS:
+        if field in data:
+            setattr(order, field, data[field] or "")
+    order.deliveryType = data.get("deliveryType") or order.deliveryType
+    order.paymentType = data.get("paymentType") or order.paymentType
+    cost = sum(item.price * item.count for item in order.items.all())
+    order.totalCost = cost + get_delivery_cost(order.deliveryType, cost)
+    order.status = Order.STATUS_ACCEPTED
+    order.full_clean(exclude=["user"])
+    fields = CUSTOMER_FIELDS + ("deliveryType", "paymentType", "totalCost", "status")
+    return bool(
+        Order.objects.filter(pk=order.pk, status__in=Order.UNPAID_STATUSES).update(
+            **{field: getattr(order, field) for field in fields}
+        )
+    )
+
+
+def pay_order(order: Order, payment: dict) -> bool:
+    """
+    Оплачивает подтвержденный заказ через платежный шлюз.
+    Статус переводится в paying условным UPDATE, поэтому повторный запрос
+    не спишет деньги дважды. При любой ошибке шлюза заказ возвращается
+    в статус accepted. Оплату, прерванную вместе с процессом, через
+    ORDER_PAYMENT_TIMEOUT секунд сверяет со шлюзом задача recover_payment.
+    Возвращает False, если заказ нельзя оплатить
+    """
+    with transaction.atomic():
+        started = Order.objects.filter(
+            pk=order.pk, status=Order.STATUS_ACCEPTED
+        ).update(status=Order.STATUS_PAYING, payingAt=timezone.now())
+        if not started:
+            return False
+        enqueue(recover_payment, order.pk, delay=settings.ORDER_PAYMENT_TIMEOUT)
+    order.status, order.paymentError = Order.STATUS_ACCEPTED, "Payment failed"
+    try:
+        get_payment_processor().charge(order, payment)
+    except PaymentError as error:
+        order.paymentError = str(error)
+    else:
+        order.status, order.paymentError = Order.STATUS_PAID, ""
+    finally:
+        order.save(update_fields=["status", "paymentError"])
+    return True
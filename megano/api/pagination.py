@@ -0,0 +1,264 @@
+import base64
+import hashlib
+import json
+from math import ceil
+
+from api.response_cache import get_tag_versions, normalize_query_params
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import InvalidPage, Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework import pagination
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+
+
+class CachedCountPaginator(Paginator):
+    """Пагинатор, который берет общее количество объектов из кэша"""
+
+    cache_key = None
+
+    @cached_property
+    def count(self):
+        if self.cache_key is None:
+            return self.object_list.count()
+        count = cache.get(self.cache_key)
+        if count is None:
+            count = self.object_list.count()
+            cache.set(
+                self.cache_key, count, timeout=settings.PAGINATION_COUNT_CACHE_TIMEOUT
+            )
+        return count
+
+
+class CustomPagination(pagination.PageNumberPagination):
+    """
+    Постраничная пагинация каталога.
+    При наличии параметра cursor переключается на keyset-пагинацию
+    по полю сортировки и id, стоимость которой не зависит от глубины страницы.
+    Общее количество для lastPage кэшируется по набору фильтров
+    """
+
+    page_query_param = "currentPage"
+    page_size = 20
+    cursor_query_param = "cursor"
+    # Параметры, не влияющие на количество найденных объектов
+    count_ignored_params = {"currentPage", "cursor", "sort", "sortType", "limit"}
+
+    def django_paginator_class(self, queryset, page_size):
+        paginator = CachedCountPaginator(queryset, page_size)
+        paginator.cache_key = self.count_cache_key
+        return paginator
+
+    def get_count_cache_key(self, request, view=None):
+        params = normalize_query_params(request.query_params, self.count_ignored_params)
+        # Количество сбрасывается вместе с закэшированными ответами представления
+        tags = view.get_cache_tags() if hasattr(view, "get_cache_tags") else None
+        versions = get_tag_versions(tags) if tags else []
+        digest = hashlib.md5(
+            json.dumps([request.path, params, versions]).encode("utf-8")
+        ).hexdigest()
+        return f"pagination_count:{digest}"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.count_cache_key = self.get_count_cache_key(request, view)
+        self.cursor_mode = False
+        if self.cursor_query_param in request.query_params:
+            sort = self.get_keyset_sort(queryset)
+            if sort is not None:
+                return self.paginate_keyset(queryset, request, *sort)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_keyset_sort(self, queryset):
+        """Возвращает поле сортировки и ее направление, если они подходят"""
+        ordering = queryset.query.order_by or ("pk",)
+        sort = ordering[0]
+        if not isinstance(sort, str):
+            return None
+        descending = sort.startswith("-")
+        name = sort.lstrip("-")
+        if name == "pk":
+            return "pk", "pk", descending
+        try:
+            field = queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        if not field.concrete:
+            return None
+        return field.name, field.attname, descending
+
+    def decode_cursor(self, request):
+        value = request.query_params.get(self.cursor_query_param)
+        if not value:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(value.encode("ascii")))
+        except (ValueError, TypeError):
+            raise NotFound("Invalid cursor")
+        # Курсор приходит от клиента, поэтому проверяется и его структура
+        if (
+            not isinstance(cursor, dict)
+            or not {"v", "id", "p"} <= cursor.keys()
+            or not isinstance(cursor["id"], int)
+            or not isinstance(cursor["p"], int)
+            or isinstance(cursor["v"], (dict, list))
+        ):
+            raise NotFound("Invalid cursor")
+        return cursor
+
+    def encode_cursor(self, position):
+        data = json.dumps(position, cls=DjangoJSONEncoder).encode("utf-8")
+        return base64.urlsafe_b64encode(data).decode("ascii")
+
+    def get_keyset_filter(self, name, value, pk, descending):
+        """Условие для объектов, следующих за (value, pk) в порядке сортировки"""
+        pk_lookup = "pk__lt" if descending else "pk__gt"
+        if name == "pk":
+            return Q(**{pk_lookup: pk})
+        nulls_first = connection.features.nulls_order_largest == descending
+        if value is None:
+            keyset = Q(**{f"{name}__isnull": True, pk_lookup: pk})
+            if nulls_first:
+                keyset |= Q(**{f"{name}__isnull": False})
+            return keyset
+        lookup = f"{name}__lt" if descending else f"{name}__gt"
+        keyset = Q(**{lookup: value}) | Q(**{name: value, pk_lookup: pk})
+        if not nulls_first:
+            keyset |= Q(**{f"{name}__isnull": True})
+        return keyset
+
+    def paginate_keyset(self, queryset, request, name, attname, descending):
+        items = list(self.get_keyset_page(queryset, request, name, descending))
+        return self.set_next_cursor(items, attname)
+
+    def get_keyset_page(self, queryset, request, name, descending):
+        """Запрос страницы после курсора с одним лишним объектом"""
+        self.cursor_mode = True
+        page_size = self.get_page_size(request)
+        order = ("-" if descending else "") + name
+        tie_break = "-pk" if descending else "pk"
+        queryset = queryset.order_by(
+            *((order,) if name == "pk" else (order, tie_break))
+        )
+        self.keyset_paginator = self.django_paginator_class(queryset, page_size)
+        cursor = self.decode_cursor(request)
+        self.page_number = 1
+        if cursor is not None:
+            try:
+                queryset = queryset.filter(
+                    self.get_keyset_filter(name, cursor["v"], cursor["id"], descending)
+                )
+            except (ValidationError, ValueError, TypeError):
+                # Значение курсора не подходит к полю сортировки
+                raise NotFound("Invalid cursor")
+            self.page_number = cursor["p"] + 1
+        return queryset[: page_size + 1]
+
+    def set_next_cursor(self, items, attname):
+        """Отбрасывает лишний объект и кодирует курсор следующей страницы"""
+        page_size = self.get_page_size(self.request)
+        self.next_cursor = None
+        if len(items) > page_size:
+            items = items[:page_size]
+            last = items[-1]
+            if isinstance(last, dict):
+                value, pk = last["id" if attname == "pk" else attname], last["id"]
+            else:
+                value, pk = getattr(last, attname), last.pk
+            self.next_cursor = self.encode_cursor(
+                {"v": value, "id": pk, "p": self.page_number}
+            )
+        return items
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        paginate_queryset для асинхронных представлений.
+        Количество объектов и страница загружаются асинхронным ORM
+        """
+        self.request = request
+        self.count_cache_key = await sync_to_async(self.get_count_cache_key)(
+            request, view
+        )
+        self.cursor_mode = False
+        if self.cursor_query_param in request.query_params:
+            sort = self.get_keyset_sort(queryset)
+            if sort is not None:
+                name, attname, descending = sort
+                page = self.get_keyset_page(queryset, request, name, descending)
+                items = [item async for item in page]
+                self.keyset_paginator.count = await self.aget_count(
+                    self.keyset_paginator.object_list
+                )
+                return self.set_next_cursor(items, attname)
+        paginator = self.django_paginator_class(queryset, self.get_page_size(request))
+        paginator.count = await self.aget_count(queryset)
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(
+                self.invalid_page_message.format(
+                    page_number=page_number, message=str(exc)
+                )
+            )
+        self.page.object_list = [item async for item in self.page.object_list]
+        return self.page.object_list
+
+    async def aget_count(self, queryset) -> int:
+        """CachedCountPaginator.count на асинхронном ORM"""
+        if self.count_cache_key is None:
+            return await queryset.acount()
+        count = await cache.aget(self.count_cache_key)
+        if count is None:
+            count = await queryset.acount()
+            await cache.aset(
+                self.count_cache_key,
+                count,
+                timeout=settings.PAGINATION_COUNT_CACHE_TIMEOUT,
+            )
+        return count
+
+    def get_paginated_response(self, data):
+        if self.cursor_mode:
+            return Response(
+                {
+                    "items": data,
+                    "currentPage": self.page_number,
+                    "lastPage": self.get_last_page(self.keyset_paginator.count),
+                    "nextCursor": self.next_cursor,
+                }
+            )
+        last_page = self.get_last_page(self.page.paginator.count)
+        return Response(
+            {
+                "items": data,
+                "currentPage": self.page.number,
+                "lastPage": last_page,
+            }
+        )
+
+    def get_last_page(self, count):
+        return ceil(count / self.page_size)
+
+
+class ReviewPagination(CustomPagination):
+    """
+    Курсорная пагинация отзывов от новых к старым.
+    Общее количество отзывов хранится в товаре, поэтому COUNT не выполняется
+    """
+
+    page_size = 10
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.count_cache_key = None
+        return self.paginate_keyset(queryset, request, "pk", "pk", True)
+
+    def get_paginated_response(self, data):
+        return Response({"items": data, "nextCursor": self.next_cursor})
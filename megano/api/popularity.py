@@ -0,0 +1,60 @@
+from datetime import datetime
+
+from api.models import PopularProduct, Product
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+# Время пересчета, после которого рейтинг остался пустым
+POPULAR_PRODUCTS_EMPTY_KEY = "popular_products:empty_updated"
+
+
+def refresh_popular_products() -> list[PopularProduct]:
+    """
+    Пересчитывает рейтинг популярных товаров.
+    Учитываются только товары в наличии, очки складываются из средней оценки
+    отзывов и количества добавлений в корзины
+    """
+    products = (
+        Product.objects.filter(archived=False, count__gt=0)
+        .annotate(basket_adds=Count("basket_items"))
+        .annotate(
+            score=Coalesce(F("rating"), Value(0.0))
+            * settings.POPULAR_PRODUCTS_RATING_WEIGHT
+            + F("basket_adds") * settings.POPULAR_PRODUCTS_BASKET_WEIGHT
+        )
+        .order_by("-score", "-reviews_count", "pk")
+        .values_list("pk", "score")[: settings.POPULAR_PRODUCTS_LIMIT]
+    )
+    updated = timezone.now()
+    ranking = [
+        PopularProduct(product_id=pk, position=position, score=score, updated=updated)
+        for position, (pk, score) in enumerate(products, start=1)
+    ]
+    with transaction.atomic():
+        PopularProduct.objects.all().delete()
+        PopularProduct.objects.bulk_create(ranking)
+    # У пустого рейтинга нет строк со временем пересчета, без отметки в кэше
+    # он пересчитывался бы на каждый запрос
+    if ranking:
+        cache.delete(POPULAR_PRODUCTS_EMPTY_KEY)
+    else:
+        cache.set(
+            POPULAR_PRODUCTS_EMPTY_KEY,
+            updated,
+            timeout=settings.POPULAR_PRODUCTS_REFRESH_INTERVAL,
+        )
+    return ranking
+
+
+def get_popular_products_updated() -> datetime | None:
+    """Возвращает время последнего пересчета рейтинга"""
+    updated = (
+        PopularProduct.objects.order_by().values_list("updated", flat=True).first()
+    )
+    if updated is None:
+        return cache.get(POPULAR_PRODUCTS_EMPTY_KEY)
+    return updated
@@ -0,0 +1,132 @@
+from collections import defaultdict
+
+from api.models import Product, ProductImage, Tag
+from api.renderers import FastJSONRenderer
+from api.renditions import build_rendition_urls, build_srcset, get_media_url
+from api.serializers import PRODUCT_DATE_FORMAT
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import QuerySet
+from django.utils import timezone
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.response import Response
+
+CARD_FIELDS = (
+    "id",
+    "category_id",
+    "price",
+    "count",
+    "date",
+    "title",
+    "description",
+    "freeDelivery",
+    "reviews_count",
+    "rating",
+)
+
+
+def get_card_rows(queryset: QuerySet) -> QuerySet:
+    """
+    Строки values() с полями карточек товаров.
+    Добавляет поля сортировки, которые нужны keyset-пагинации
+    """
+    fields = list(CARD_FIELDS)
+    for order in queryset.query.order_by:
+        if not isinstance(order, str) or order.lstrip("-") == "pk":
+            continue
+        try:
+            field = Product._meta.get_field(order.lstrip("-"))
+        except FieldDoesNotExist:
+            continue
+        if field.concrete and field.attname not in fields:
+            fields.append(field.attname)
+    return queryset.prefetch_related(None).values(*fields)
+
+
+def get_card_tags(product_ids: list[int]) -> QuerySet:
+    """Тэги карточек тем же запросом, что и prefetch_related("tags")"""
+    return Tag.objects.filter(products__in=product_ids).values_list(
+        "products", "id", "name"
+    )
+
+
+def get_card_images(product_ids: list[int]) -> QuerySet:
+    return ProductImage.objects.filter(product_id__in=product_ids).values_list(
+        "product_id", "src", "alt", "renditions"
+    )
+
+
+def serialize_product_cards(rows: list[dict]) -> list[dict]:
+    """
+    Карточки товаров из строк get_card_rows.
+    Результат совпадает с CatalogSerializer, но тэги и изображения
+    загружаются двумя запросами values_list без создания моделей,
+    а поля формируются без диспетчеризации полей DRF
+    """
+    product_ids = [row["id"] for row in rows]
+    if not product_ids:
+        return []
+    tags = get_card_tags(product_ids)
+    images = get_card_images(product_ids)
+    return build_product_cards(rows, tags, images)
+
+
+async def aserialize_product_cards(rows: list[dict]) -> list[dict]:
+    """serialize_product_cards на асинхронном ORM"""
+    product_ids = [row["id"] for row in rows]
+    if not product_ids:
+        return []
+    tags = [tag async for tag in get_card_tags(product_ids)]
+    images = [image async for image in get_card_images(product_ids)]
+    return build_product_cards(rows, tags, images)
+
+
+def build_product_cards(rows: list[dict], tag_rows, image_rows) -> list[dict]:
+    tags = defaultdict(list)
+    for product_id, tag_id, name in tag_rows:
+        tags[product_id].append({"id": tag_id, "name": name})
+    images = defaultdict(list)
+    for product_id, src, alt, renditions in image_rows:
+        images[product_id].append(
+            {
+                "src": get_media_url(src),
+                "srcset": build_srcset(src, renditions),
+                "renditions": build_rendition_urls(src, renditions),
+                "alt": alt,
+            }
+        )
+    current_timezone = timezone.get_current_timezone()
+    return [
+        {
+            "id": row["id"],
+            "category": row["category_id"],
+            "price": f"{row['price']:.2f}",
+            "count": row["count"],
+            "date": row["date"]
+            .astimezone(current_timezone)
+            .strftime(PRODUCT_DATE_FORMAT),
+            "title": row["title"].replace("/", "-"),
+            "description": row["description"],
+            "freeDelivery": row["freeDelivery"],
+            "images": images[row["id"]],
+            "tags": tags[row["id"]],
+            "reviews": float(row["reviews_count"]),
+            "rating": None if row["rating"] is None else float(row["rating"]),
+        }
+        for row in rows
+    ]
+
+
+class ProductCardListMixin:
+    """
+    Список карточек товаров в формате CatalogSerializer,
+    собранный serialize_product_cards и отрендеренный FastJSONRenderer
+    """
+
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+
+    def list(self, request, *args, **kwargs):
+        rows = get_card_rows(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(serialize_product_cards(page))
+        return Response(serialize_product_cards(list(rows)))
@@ -0,0 +1,132 @@
+from functools import lru_cache
+from io import BytesIO
+from pathlib import PurePosixPath
+from urllib.parse import urljoin
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.utils.encoding import filepath_to_uri
+from PIL import Image
+from pilkit.processors import ResizeToFit
+from pilkit.utils import save_image
+
+RENDITION_EXTENSIONS = {"WEBP": "webp", "JPEG": "jpg"}
+RENDITION_MIME_TYPES = {"WEBP": "image/webp", "JPEG": "image/jpeg"}
+
+
+def get_rendition_name(name: str, size: str, image_format: str) -> str:
+    """
+    Имя уменьшенной копии определяется именем исходного файла,
+    поэтому копии можно найти и пересоздать без обращения к базе
+    """
+    path = PurePosixPath(name)
+    extension = RENDITION_EXTENSIONS[image_format]
+    return f"renditions/{path.parent}/{path.stem}_{size}.{extension}"
+
+
+def get_rendition_names(name: str) -> list[str]:
+    return [
+        get_rendition_name(name, size, image_format)
+        for size in settings.IMAGE_RENDITIONS
+        for image_format in settings.IMAGE_RENDITION_FORMATS
+    ]
+
+
+def render_image(name: str) -> dict:
+    """
+    Создает уменьшенные копии изображения во всех размерах и форматах.
+    Исходный файл открывается один раз. Возвращает значение поля renditions:
+    имя исходного файла и фактические ширины копий
+    """
+    with default_storage.open(name) as file:
+        with Image.open(file) as original:
+            original.load()
+    delete = getattr(default_storage, "delete_now", default_storage.delete)
+    widths = {}
+    for size, width in settings.IMAGE_RENDITIONS.items():
+        image = ResizeToFit(width, width, upscale=False).process(original)
+        widths[size] = image.width
+        for image_format in settings.IMAGE_RENDITION_FORMATS:
+            content = BytesIO()
+            save_image(
+                image,
+                content,
+                image_format,
+                options={"quality": settings.IMAGE_RENDITION_QUALITY},
+            )
+            rendition = get_rendition_name(name, size, image_format)
+            if default_storage.exists(rendition):
+                delete(rendition)
+            default_storage.save(rendition, ContentFile(content.getvalue()))
+    return {"src": name, "widths": widths}
+
+
+@lru_cache(maxsize=65536)
+def join_media_url(base_url: str, name: str) -> str:
+    """FileSystemStorage.url без обращения к хранилищу"""
+    return urljoin(base_url, filepath_to_uri(name).lstrip("/"))
+
+
+def get_media_url(name: str) -> str:
+    """
+    Ссылка на файл из default_storage.
+    Для FileSystemStorage ссылка зависит только от base_url и имени,
+    поэтому urljoin выполняется один раз для каждого файла
+    """
+    storage = default_storage
+    if storage.__class__.url is FileSystemStorage.url and storage.base_url:
+        return join_media_url(storage.base_url, name)
+    return storage.url(name)
+
+
+def has_renditions(image) -> bool:
+    """Копии созданы для текущего файла изображения"""
+    return renditions_match(image.src.name, image.renditions)
+
+
+def renditions_match(name: str, renditions: dict) -> bool:
+    return bool(name) and renditions.get("src") == name
+
+
+def get_srcset(image) -> dict[str, str]:
+    """
+    Возвращает значения srcset для каждого формата по MIME-типу,
+    например {"image/webp": "/media/..._thumbnail.webp 200w, ..."}.
+    Одинаковые по ширине копии не повторяются
+    """
+    return build_srcset(image.src.name, image.renditions)
+
+
+def build_srcset(name: str, renditions: dict) -> dict[str, str]:
+    """get_srcset по имени файла и значению поля renditions"""
+    if not renditions_match(name, renditions):
+        return {}
+    srcset = {}
+    for image_format in settings.IMAGE_RENDITION_FORMATS:
+        candidates = {}
+        for size, width in renditions["widths"].items():
+            rendition = get_rendition_name(name, size, image_format)
+            candidates.setdefault(width, get_media_url(rendition))
+        srcset[RENDITION_MIME_TYPES[image_format]] = ", ".join(
+            f"{url} {width}w" for width, url in sorted(candidates.items())
+        )
+    return srcset
+
+
+def get_rendition_urls(image) -> dict[str, str]:
+    """
+    Ссылки на JPEG-копии по размерам, например {"thumbnail": "/media/..."}.
+    Поле src в ответах API остается ссылкой на исходный файл
+    """
+    return build_rendition_urls(image.src.name, image.renditions)
+
+
+def build_rendition_urls(name: str, renditions: dict) -> dict[str, str]:
+    """get_rendition_urls по имени файла и значению поля renditions"""
+    if not renditions_match(name, renditions):
+        return {}
+    return {
+        size: get_media_url(get_rendition_name(name, size, "JPEG"))
+        for size in renditions["widths"]
+    }
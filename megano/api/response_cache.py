@@ -0,0 +1,142 @@
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+RESPONSE_CACHE_KEY = "response:{view}:{digest}"
+RESPONSE_CACHE_TAG_KEY = "response_tag:{tag}"
+RESPONSE_CACHE_STATS_KEY = "response_stats:{view}:{result}"
+
+
+def get_response_cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def normalize_query_params(query_params, ignored=()) -> list:
+    """Приводит параметры запроса к виду, не зависящему от их порядка"""
+    return sorted(
+        (key, value)
+        for key, values in query_params.lists()
+        if key not in ignored
+        for value in values
+    )
+
+
+def get_tag_versions(tags) -> list:
+    """
+    Возвращает текущие версии тэгов кэша.
+    Смена версии тэга делает недоступными все записи, помеченные им
+    """
+    cache = get_response_cache()
+    keys = [RESPONSE_CACHE_TAG_KEY.format(tag=tag) for tag in tags]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def invalidate_response_cache(*tags) -> None:
+    """Сбрасывает закэшированные ответы, помеченные любым из тэгов"""
+    version = time.time_ns()
+    get_response_cache().set_many(
+        {RESPONSE_CACHE_TAG_KEY.format(tag=tag): version for tag in tags},
+        timeout=None,
+    )
+
+
+def count_response_cache(view: str, result: str) -> None:
+    cache = get_response_cache()
+    key = RESPONSE_CACHE_STATS_KEY.format(view=view, result=result)
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def get_response_cache_stats(views) -> dict:
+    """Возвращает счетчики попаданий и промахов кэша по представлениям"""
+    keys = {
+        (view, result): RESPONSE_CACHE_STATS_KEY.format(view=view, result=result)
+        for view in views
+        for result in ("hit", "miss")
+    }
+    values = get_response_cache().get_many(keys.values())
+    stats = {view: {"hit": 0, "miss": 0} for view in views}
+    for (view, result), key in keys.items():
+        stats[view][result] = values.get(key, 0)
+    return stats
+
+
+def build_response_cache_key(view: str, kwargs, query_params, format, tags) -> str:
+    """
+    Ключ ответа представления. Синхронные и асинхронные представления
+    с одинаковым именем класса получают общие записи кэша
+    """
+    data = [
+        sorted(kwargs.items()),
+        normalize_query_params(query_params),
+        format,
+        get_tag_versions(tags),
+    ]
+    digest = hashlib.md5(json.dumps(data, default=str).encode("utf-8")).hexdigest()
+    return RESPONSE_CACHE_KEY.format(view=view, digest=digest)
+
+
+class CachedResponseMixin:
+    """
+    Кэширует ответы GET-запросов анонимных пользователей.
+    Ключ строится из имени представления, аргументов URL, нормализованных
+    параметров запроса и версий тэгов из get_cache_tags
+    """
+
+    cache_tags = ()
+
+    def get_cache_tags(self) -> list:
+        return list(self.cache_tags)
+
+    def get_response_cache_key(self, request) -> str | None:
+        if request.method != "GET" or request.user.is_authenticated:
+            return None
+        return build_response_cache_key(
+            type(self).__name__,
+            self.kwargs,
+            request.query_params,
+            request.accepted_renderer.format,
+            self.get_cache_tags(),
+        )
+
+    def get(self, request, *args, **kwargs):
+        self.response_cache_key = self.get_response_cache_key(request)
+        if self.response_cache_key is not None:
+            cached = get_response_cache().get(self.response_cache_key)
+            if cached is not None:
+                count_response_cache(type(self).__name__, "hit")
+                content, content_type = cached
+                response = HttpResponse(content, content_type=content_type)
+                response["X-Cache"] = "HIT"
+                return response
+            count_response_cache(type(self).__name__, "miss")
+        return super().get(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        key = getattr(self, "response_cache_key", None)
+        if (
+            key is not None
+            and response.status_code == 200
+            and "X-Cache" not in response
+        ):
+            response.render()
+            get_response_cache().set(
+                key,
+                (response.content, response["Content-Type"]),
+                timeout=settings.RESPONSE_CACHE_TIMEOUT,
+            )
+            response["X-Cache"] = "MISS"
+        return response
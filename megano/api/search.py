@@ -0,0 +1,209 @@
+import re
+
+from api.models import Product, ProductTag, Specification
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, QuerySet, Value, When
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+TERM_REGEX = re.compile(r"\w+", re.UNICODE)
+
+
+def parse_terms(query: str) -> list[str]:
+    """Разбивает поисковую строку на слова"""
+    return TERM_REGEX.findall(query.lower())[:10]
+
+
+class BaseSearchBackend:
+    """
+    Базовый поисковый бэкенд товаров.
+    filter добавляет к queryset условие поиска, а при ranked=True также
+    псевдоним search_rank, по возрастанию которого результаты упорядочены
+    по релевантности
+    """
+
+    def filter(self, queryset: QuerySet, query: str, ranked=False) -> QuerySet:
+        raise NotImplementedError
+
+    def empty(self, queryset: QuerySet, ranked=False) -> QuerySet:
+        queryset = queryset.none()
+        if ranked:
+            queryset = queryset.alias(search_rank=Value(0, IntegerField()))
+        return queryset
+
+    def index_products(self, product_ids) -> None:
+        pass
+
+    def remove_products(self, product_ids) -> None:
+        pass
+
+    def rebuild(self) -> int:
+        return 0
+
+
+class DatabaseSearchBackend(BaseSearchBackend):
+    """
+    Поиск средствами ORM для баз данных без полнотекстового индекса.
+    Каждое слово ищется по вхождению в названии, описании, тэгах,
+    названиях и значениях характеристик товара — в тех же полях,
+    что индексирует SQLiteFTSSearchBackend
+    """
+
+    def filter(self, queryset, query, ranked=False):
+        terms = parse_terms(query)
+        if not terms:
+            return self.empty(queryset, ranked)
+        for term in terms:
+            queryset = queryset.filter(
+                Q(title__icontains=term)
+                | Q(description__icontains=term)
+                | Q(tags__name__icontains=term)
+                | Q(specifications__name__icontains=term)
+                | Q(specifications__value__icontains=term)
+            )
+        queryset = queryset.distinct()
+        if not ranked:
+            return queryset
+        return queryset.alias(
+            search_rank=Case(
+                When(title__icontains=terms[0], then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField(),
+            )
+        )
+
+
+class SQLiteFTSSearchBackend(BaseSearchBackend):
+    """
+    Поиск по виртуальной таблице FTS5 с ранжированием bm25.
+    Таблица создается миграцией и поддерживается сигналами моделей товара.
+    Для сортировки по релевантности FTS5 отбирает SEARCH_MAX_RESULTS лучших
+    совпадений одним запросом, ранг bm25 по каждой строке не вычисляется.
+    Остальные совпадения следуют за ними в порядке id
+    """
+
+    table = "api_product_fts"
+    # Веса колонок title, description, tags, specifications для bm25
+    weights = "10.0, 1.0, 5.0, 2.0"
+
+    def build_match(self, query: str) -> str:
+        return " ".join(f'"{term}"*' for term in parse_terms(query))
+
+    def filter(self, queryset, query, ranked=False):
+        match = self.build_match(query)
+        if not match:
+            return self.empty(queryset, ranked)
+        queryset = queryset.filter(
+            pk__in=RawSQL(
+                f"SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s",
+                (match,),
+            )
+        )
+        if not ranked:
+            return queryset
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s "
+                f"ORDER BY bm25({self.table}, {self.weights}) LIMIT %s",
+                (match, settings.SEARCH_MAX_RESULTS),
+            )
+            product_ids = [row[0] for row in cursor.fetchall()]
+        # id перечислены в порядке релевантности, поэтому позиция id в строке
+        # служит рангом без построения выражения CASE на сотни ветвей.
+        # Совпадения за пределами SEARCH_MAX_RESULTS получают одинаковый
+        # наибольший ранг и остаются в выдаче и в количестве найденных
+        ranking = ",{},".format(",".join(map(str, product_ids)))
+        return queryset.alias(
+            search_rank=RawSQL(
+                f"COALESCE(NULLIF(instr(%s, ',' || {Product._meta.db_table}.id "
+                f"|| ','), 0), %s)",
+                (ranking, len(ranking) + 1),
+                output_field=IntegerField(),
+            )
+        )
+
+    def get_documents(self, product_ids=None):
+        """Собирает тексты товаров для индекса тремя запросами"""
+        products = Product.objects.order_by()
+        tags = ProductTag.objects.order_by()
+        specifications = Specification.objects.order_by()
+        if product_ids is not None:
+            products = products.filter(pk__in=product_ids)
+            tags = tags.filter(product_id__in=product_ids)
+            specifications = specifications.filter(product_id__in=product_ids)
+        documents = {
+            pk: [title, description, [], []]
+            for pk, title, description in products.values_list(
+                "pk", "title", "description"
+            )
+        }
+        for product_id, name in tags.values_list("product_id", "tag__name"):
+            if product_id in documents:
+                documents[product_id][2].append(name)
+        for product_id, name, value in specifications.values_list(
+            "product_id", "name", "value"
+        ):
+            if product_id in documents:
+                documents[product_id][3].append(f"{name} {value}")
+        return [
+            (pk, title, description, " ".join(tags), " ".join(specifications))
+            for pk, (title, description, tags, specifications) in documents.items()
+        ]
+
+    def index_products(self, product_ids):
+        product_ids = list(product_ids)
+        documents = self.get_documents(product_ids)
+        with connection.cursor() as cursor:
+            self._delete(cursor, product_ids)
+            self._insert(cursor, documents)
+
+    def remove_products(self, product_ids):
+        with connection.cursor() as cursor:
+            self._delete(cursor, list(product_ids))
+
+    def rebuild(self, batch_size=10000):
+        """Перестраивает индекс пачками товаров, не загружая каталог целиком"""
+        product_ids = Product.objects.order_by("pk").values_list("pk", flat=True)
+        indexed = 0
+        last_id = 0
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+            while True:
+                batch = list(product_ids.filter(pk__gt=last_id)[:batch_size])
+                if not batch:
+                    break
+                documents = self.get_documents(
+                    Product.objects.filter(pk__gte=batch[0], pk__lte=batch[-1])
+                    .order_by()
+                    .values("pk")
+                )
+                self._insert(cursor, documents)
+                indexed += len(documents)
+                last_id = batch[-1]
+        return indexed
+
+    def _delete(self, cursor, product_ids):
+        cursor.executemany(
+            f"DELETE FROM {self.table} WHERE rowid = %s",
+            [(pk,) for pk in product_ids],
+        )
+
+    def _insert(self, cursor, documents):
+        cursor.executemany(
+            f"INSERT INTO {self.table} "
+            f"(rowid, title, description, tags, specifications) "
+            f"VALUES (%s, %s, %s, %s, %s)",
+            documents,
+        )
+
+
+_backend = None
+
+
+def get_search_backend() -> BaseSearchBackend:
+    """Возвращает поисковый бэкенд, заданный в settings.SEARCH_BACKEND"""
+    global _backend
+    if _backend is None:
+        _backend = import_string(settings.SEARCH_BACKEND)()
+    return _backend
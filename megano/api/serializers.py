@@ -1,9 +1,11 @@
+from api.renditions import get_media_url, get_rendition_urls, get_srcset
 from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
 from rest_framework import serializers
 from rest_framework_recursive.fields import RecursiveField
 
 from .models import (
+    RATING_HISTOGRAM_RATES,
     Category,
     CategoryImage,
     Product,
@@ -16,8 +18,12 @@ from .models import (
     Tag,
     Basket,
     BasketItem,
+    Order,
+    OrderItem,
 )
 
+PRODUCT_DATE_FORMAT = "%a %b %d %Y %H:%M:%S %Z%z (Central European Standard Time)"
+
 
 class ReviewSerializer(serializers.ModelSerializer):
     date = serializers.DateTimeField(format="%Y-%m-%d %H:%M", required=False)
@@ -53,24 +59,35 @@ class TagSerializer(serializers.ModelSerializer):
 
 class ProductImageSerializer(serializers.ModelSerializer):
     src = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
+    renditions = serializers.SerializerMethodField()
 
     class Meta:
         model = ProductImage
         fields = (
             "src",
+            "srcset",
+            "renditions",
             "alt",
         )
 
     def get_src(self, instance):
-        return instance.src.url
+        return get_media_url(instance.src.name)
+
+    def get_srcset(self, instance):
+        return get_srcset(instance)
+
+    def get_renditions(self, instance):
+        return get_rendition_urls(instance)
 
 
 class ProductSerializer(serializers.ModelSerializer):
-    date = serializers.DateTimeField(
-        format="%a %b %d %Y %H:%M:%S %Z%z (Central European Standard Time)"
-    )
+    date = serializers.DateTimeField(format=PRODUCT_DATE_FORMAT)
     rating = serializers.FloatField()
-    reviews = ReviewSerializer(many=True, read_only=True)
+    # Последние отзывы, см. ProductDetailView, остальные отдаются постранично
+    reviews = ReviewSerializer(source="latest_reviews", many=True, read_only=True)
+    reviewsCount = serializers.IntegerField(source="reviews_count", read_only=True)
+    ratingHistogram = serializers.SerializerMethodField()
     images = ProductImageSerializer(many=True, read_only=True)
     specifications = SpecificationSerializer(many=True, read_only=True)
     title = serializers.SerializerMethodField("get_title")
@@ -99,6 +116,8 @@ class ProductSerializer(serializers.ModelSerializer):
             "images",
             "tags",
             "reviews",
+            "reviewsCount",
+            "ratingHistogram",
             "specifications",
             "rating",
         )
@@ -107,6 +126,12 @@ class ProductSerializer(serializers.ModelSerializer):
         title = instance.title.replace("/", "-")
         return title
 
+    def get_ratingHistogram(self, instance):
+        return {
+            rate: getattr(instance, f"rating_count_{rate}")
+            for rate in RATING_HISTOGRAM_RATES
+        }
+
 
 class CatalogSerializer(ProductSerializer):
     rating = serializers.FloatField()
@@ -209,16 +234,26 @@ class PasswordSerializer(serializers.ModelSerializer):
 
 class CategoryImageSerializer(serializers.ModelSerializer):
     src = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
+    renditions = serializers.SerializerMethodField()
 
     class Meta:
         model = CategoryImage
         fields = (
             "src",
+            "srcset",
+            "renditions",
             "alt",
         )
 
     def get_src(self, instance):
-        return instance.src.url
+        return get_media_url(instance.src.name)
+
+    def get_srcset(self, instance):
+        return get_srcset(instance)
+
+    def get_renditions(self, instance):
+        return get_rendition_urls(instance)
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -243,7 +278,7 @@ class SaleSerializer(serializers.ModelSerializer):
         max_digits=8, decimal_places=2, source="product.price", read_only=True
     )
     title = serializers.CharField(source="product.title", read_only=True)
-    images = serializers.SerializerMethodField()
+    images = ProductImageSerializer(many=True, source="product.images", read_only=True)
 
     class Meta:
         model = Sale
@@ -257,14 +292,10 @@ class SaleSerializer(serializers.ModelSerializer):
             "images",
         )
 
-    def get_images(self, instance):
-        images = ProductImageSerializer(instance.product.images, many=True).data
-        return images
-
 
 class BasketSerializer(serializers.ModelSerializer):
     id = serializers.IntegerField(source="product.id")
-    category = serializers.IntegerField(source="product.category.id")
+    category = serializers.IntegerField(source="product.category_id")
     price = serializers.DecimalField(
         source="product.price", max_digits=8, decimal_places=2
     )
@@ -277,8 +308,8 @@ class BasketSerializer(serializers.ModelSerializer):
     freeDelivery = serializers.BooleanField(source="product.freeDelivery")
     images = ProductImageSerializer(many=True, source="product.images")
     tags = TagSerializer(many=True, source="product.tags")
-    rating = serializers.FloatField()
-    reviews = serializers.FloatField(source="reviews_count")
+    rating = serializers.FloatField(source="product.rating")
+    reviews = serializers.FloatField(source="product.reviews_count")
 
     class Meta:
         model = BasketItem
@@ -296,3 +327,63 @@ class BasketSerializer(serializers.ModelSerializer):
             "reviews",
             "rating",
         )
+
+
+class OrderItemSerializer(BasketSerializer):
+    price = serializers.DecimalField(max_digits=8, decimal_places=2)
+
+    class Meta(BasketSerializer.Meta):
+        model = OrderItem
+
+
+class OrderSerializer(serializers.ModelSerializer):
+    createdAt = serializers.DateTimeField(format="%Y-%m-%d %H:%M")
+    products = OrderItemSerializer(many=True, source="items")
+
+    class Meta:
+        model = Order
+        fields = (
+            "id",
+            "createdAt",
+            "fullName",
+            "email",
+            "phone",
+            "deliveryType",
+            "paymentType",
+            "totalCost",
+            "status",
+            "city",
+            "address",
+            "paymentError",
+            "products",
+        )
+
+
+class OrderConfirmSerializer(serializers.ModelSerializer):
+    """Данные покупателя и доставки со страницы оформления заказа"""
+
+    class Meta:
+        model = Order
+        fields = (
+            "fullName",
+            "email",
+            "phone",
+            "city",
+            "address",
+            "deliveryType",
+            "paymentType",
+        )
+        extra_kwargs = {
+            field: {"required": False, "allow_null": True, "allow_blank": True}
+            for field in fields
+        }
+
+
+class PaymentSerializer(serializers.Serializer):
+    """Данные карты, которые передаются платежному шлюзу"""
+
+    number = serializers.CharField(required=False, allow_blank=True)
+    name = serializers.CharField(required=False, allow_blank=True)
+    month = serializers.CharField(required=False, allow_blank=True)
+    year = serializers.CharField(required=False, allow_blank=True)
+    code = serializers.CharField(required=False, allow_blank=True)
@@ -0,0 +1,218 @@
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Cast
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from api.category_tree import invalidate_category_tree
+from api.models import (
+    Category,
+    CategoryImage,
+    Product,
+    ProductImage,
+    ProductTag,
+    RATING_HISTOGRAM_RATES,
+    Review,
+    Sale,
+    Specification,
+    Tag,
+)
+from api.renditions import get_rendition_names, has_renditions
+from api.response_cache import invalidate_response_cache
+from api.search import get_search_backend
+from api.tasks import enqueue, generate_renditions
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.backends.signals import connection_created
+
+
+def update_product_rating(
+    product_id: int, added_rate: int | None = None, removed_rate: int | None = None
+) -> None:
+    """
+    Атомарно учитывает добавленную и/или исключенную оценку в сумме оценок,
+    количестве отзывов, гистограмме и рейтинге товара
+    одним UPDATE без пересчета агрегатов по таблице отзывов
+    """
+    rate_delta = (added_rate or 0) - (removed_rate or 0)
+    count_delta = (added_rate is not None) - (removed_rate is not None)
+    histogram = {}
+    for rate, delta in ((added_rate, 1), (removed_rate, -1)):
+        if rate in RATING_HISTOGRAM_RATES:
+            histogram[f"rating_count_{rate}"] = F(f"rating_count_{rate}") + delta
+    reviews_count = F("reviews_count") + count_delta
+    Product.objects.filter(pk=product_id).update(
+        rating_sum=F("rating_sum") + rate_delta,
+        reviews_count=reviews_count,
+        rating=Case(
+            When(reviews_count__lte=-count_delta, then=Value(None)),
+            default=Cast(F("rating_sum") + rate_delta, FloatField()) / reviews_count,
+            output_field=FloatField(),
+        ),
+        **histogram,
+    )
+
+
+@receiver(pre_save, sender=Review)
+def remember_review_rate(sender, instance: Review, raw: bool, **kwargs) -> None:
+    """Запоминает прежние товар и оценку изменяемого отзыва"""
+    instance._previous_rate = None
+    if raw or instance.pk is None:
+        return
+    previous = (
+        Review.objects.filter(pk=instance.pk).values("product_id", "rate").first()
+    )
+    if previous is not None:
+        instance._previous_product_id = previous["product_id"]
+        instance._previous_rate = previous["rate"]
+
+
+@receiver(post_save, sender=Review)
+def add_review_rate(
+    sender, instance: Review, created: bool, raw: bool, **kwargs
+) -> None:
+    """Учитывает новый или измененный отзыв в рейтинге товара"""
+    if raw:
+        return
+    if created or instance._previous_rate is None:
+        update_product_rating(instance.product_id, added_rate=instance.rate)
+        return
+    if instance._previous_product_id != instance.product_id:
+        update_product_rating(
+            instance._previous_product_id, removed_rate=instance._previous_rate
+        )
+        update_product_rating(instance.product_id, added_rate=instance.rate)
+    elif instance._previous_rate != instance.rate:
+        update_product_rating(
+            instance.product_id,
+            added_rate=instance.rate,
+            removed_rate=instance._previous_rate,
+        )
+
+
+@receiver(post_delete, sender=Review)
+def remove_review_rate(sender, instance: Review, **kwargs) -> None:
+    """Исключает удаленный отзыв из рейтинга товара"""
+    update_product_rating(instance.product_id, removed_rate=instance.rate)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=CategoryImage)
+@receiver(post_delete, sender=CategoryImage)
+def reset_category_tree(sender, **kwargs) -> None:
+    """Сбрасывает кэш дерева категорий при изменении категорий"""
+    invalidate_category_tree()
+    if sender is Category:
+        # Фильтр каталога по категории включает ее подкатегории
+        invalidate_response_cache("catalog")
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance: Product, raw: bool, **kwargs) -> None:
+    """Обновляет товар в поисковом индексе"""
+    if not raw:
+        get_search_backend().index_products([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_from_index(sender, instance: Product, **kwargs) -> None:
+    """Удаляет товар из поискового индекса"""
+    get_search_backend().remove_products([instance.pk])
+
+
+@receiver(post_save, sender=ProductTag)
+@receiver(post_delete, sender=ProductTag)
+@receiver(post_save, sender=Specification)
+@receiver(post_delete, sender=Specification)
+def reindex_related_product(sender, instance, raw: bool = False, **kwargs) -> None:
+    """Переиндексирует товар при изменении его тэгов и характеристик"""
+    if not raw:
+        get_search_backend().index_products([instance.product_id])
+
+
+@receiver(m2m_changed, sender=Product.tags.through)
+def reindex_tagged_products(
+    sender, instance, action: str, reverse: bool, pk_set, **kwargs
+) -> None:
+    """
+    Переиндексирует товары, тэги которых изменены через product.tags.add(),
+    set(), remove(), clear() или tag.products: эти методы не отправляют
+    post_save и post_delete для ProductTag
+    """
+    if action == "pre_clear" and reverse:
+        # После очистки товары тэга уже не найти
+        instance._cleared_product_ids = list(
+            instance.products.values_list("pk", flat=True)
+        )
+        return
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        product_ids = [instance.pk]
+    elif action == "post_clear":
+        product_ids = instance.__dict__.pop("_cleared_product_ids", [])
+    else:
+        product_ids = list(pk_set)
+    if product_ids:
+        get_search_backend().index_products(product_ids)
+        invalidate_response_cache(
+            "catalog", "sales", *(f"product:{pk}" for pk in product_ids)
+        )
+
+
+@receiver(post_save, sender=Tag)
+def reindex_tag_products(sender, instance: Tag, raw: bool, **kwargs) -> None:
+    """Переиндексирует товары переименованного тэга"""
+    if not raw:
+        product_ids = instance.products.values_list("pk", flat=True)
+        get_search_backend().index_products(product_ids)
+
+
+@receiver([post_save, post_delete], sender=Product)
+def reset_product_responses(sender, instance: Product, **kwargs) -> None:
+    """Сбрасывает закэшированные ответы с данными товара"""
+    invalidate_response_cache("catalog", "sales", f"product:{instance.pk}")
+
+
+@receiver([post_save, post_delete], sender=Review)
+@receiver([post_save, post_delete], sender=ProductImage)
+@receiver([post_save, post_delete], sender=ProductTag)
+@receiver([post_save, post_delete], sender=Specification)
+def reset_related_product_responses(sender, instance, **kwargs) -> None:
+    """Сбрасывает закэшированные ответы при изменении связанных с товаром данных"""
+    invalidate_response_cache("catalog", "sales", f"product:{instance.product_id}")
+
+
+@receiver([post_save, post_delete], sender=Sale)
+def reset_sale_responses(sender, **kwargs) -> None:
+    invalidate_response_cache("sales")
+
+
+@receiver([post_save, post_delete], sender=Tag)
+def reset_tag_responses(sender, **kwargs) -> None:
+    invalidate_response_cache("tags", "catalog", "product")
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_save, sender=CategoryImage)
+def schedule_renditions(sender, instance, raw: bool, **kwargs) -> None:
+    """Ставит в очередь создание уменьшенных копий нового файла изображения"""
+    if not raw and instance.src.name and not has_renditions(instance):
+        enqueue(generate_renditions, sender._meta.label, instance.pk)
+
+
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_delete, sender=CategoryImage)
+def delete_renditions(sender, instance, **kwargs) -> None:
+    if instance.renditions.get("src"):
+        for name in get_rendition_names(instance.renditions["src"]):
+            default_storage.delete(name)
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs) -> None:
+    """Применяет settings.SQLITE_PRAGMAS к новому соединению с SQLite"""
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            for pragma, value in settings.SQLITE_PRAGMAS.items():
+                cursor.execute(f"PRAGMA {pragma} = {value}")
@@ -0,0 +1,17 @@
+from api.tasks import delete_file, enqueue
+from django.core.files.storage import FileSystemStorage
+
+
+class QueuedDeleteStorage(FileSystemStorage):
+    """
+    Файловое хранилище, которое удаляет файлы фоновой задачей.
+    Файлы удаляет django_cleanup при изменении и удалении изображений,
+    так удаление не выполняется в обработчике запроса
+    """
+
+    def delete(self, name):
+        if name:
+            enqueue(delete_file, name)
+
+    def delete_now(self, name):
+        super().delete(name)
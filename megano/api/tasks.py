@@ -0,0 +1,227 @@
+import logging
+import time
+import traceback
+from datetime import timedelta
+from typing import Callable
+
+from api.category_tree import invalidate_category_tree
+from api.models import CategoryImage, Order, OrderItem, Product, ProfileAvatar, Task
+from api.payments import get_payment_processor
+from api.renditions import get_rendition_names, render_image
+from api.response_cache import invalidate_response_cache
+from django.apps import apps
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+TASKS: dict[str, tuple[Callable, int]] = {}
+
+
+def task(max_attempts: int = 5):
+    """
+    Регистрирует функцию как фоновую задачу.
+    Аргументы задачи хранятся в JSON, поэтому передаются id, а не объекты
+    """
+
+    def register(func):
+        TASKS[func.__name__] = func, max_attempts
+        return func
+
+    return register
+
+
+def enqueue(func: Callable | str, *args, delay: float = 0) -> Task:
+    """
+    Ставит задачу в очередь.
+    Запись создается в текущей транзакции и не станет видна воркерам при откате
+    """
+    name = func if isinstance(func, str) else func.__name__
+    _, max_attempts = TASKS[name]
+    return Task.objects.create(
+        name=name,
+        args=list(args),
+        max_attempts=max_attempts,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def available(now) -> Q:
+    """Задачи, готовые к запуску, и задачи, у которых истек таймаут видимости"""
+    return Q(status=Task.STATUS_QUEUED, run_at__lte=now) | Q(
+        status=Task.STATUS_RUNNING, locked_until__lt=now
+    )
+
+
+def claim_task() -> Task | None:
+    """
+    Забирает задачу из очереди.
+    Кандидат захватывается условным UPDATE, поэтому при нескольких воркерах
+    задачу получит только один из них
+    """
+    now = timezone.now()
+    candidates = (
+        Task.objects.filter(available(now))
+        .order_by("run_at")
+        .values_list("pk", flat=True)[: settings.TASK_CLAIM_CANDIDATES]
+    )
+    locked_until = now + timedelta(seconds=settings.TASK_VISIBILITY_TIMEOUT)
+    for pk in candidates:
+        claimed = Task.objects.filter(available(now), pk=pk).update(
+            status=Task.STATUS_RUNNING,
+            locked_until=locked_until,
+            attempts=F("attempts") + 1,
+        )
+        if claimed:
+            return Task.objects.get(pk=pk)
+    return None
+
+
+def get_retry_delay(attempts: int) -> float:
+    """Экспоненциальная задержка перед повтором"""
+    delay = settings.TASK_RETRY_BACKOFF * 2 ** (attempts - 1)
+    return min(delay, settings.TASK_RETRY_BACKOFF_MAX)
+
+
+def run_task(task: Task) -> bool:
+    """
+    Выполняет задачу. Успешная задача удаляется, упавшая возвращается в очередь
+    с задержкой или помечается failed после max_attempts попыток.
+    Если таймаут видимости истек и задачу забрал другой воркер,
+    ее запись не изменяется
+    """
+    owned = Task.objects.filter(pk=task.pk, locked_until=task.locked_until)
+    func, _ = TASKS.get(task.name, (None, None))
+    try:
+        if task.attempts > task.max_attempts:
+            raise RuntimeError("Visibility timeout expired on the last attempt")
+        if func is None:
+            raise LookupError(f"Unknown task {task.name}")
+        func(*task.args)
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning("Task %s failed: %s", task, error)
+        if func is not None and task.attempts < task.max_attempts:
+            run_at = timezone.now() + timedelta(seconds=get_retry_delay(task.attempts))
+            owned.update(
+                status=Task.STATUS_QUEUED,
+                run_at=run_at,
+                locked_until=None,
+                last_error=error,
+            )
+        else:
+            owned.update(status=Task.STATUS_FAILED, last_error=error)
+        return False
+    owned.delete()
+    return True
+
+
+def work(burst: bool = False, sleep: float = 1) -> int:
+    """
+    Цикл воркера. В режиме burst завершается, когда очередь пуста.
+    Возвращает число выполненных задач
+    """
+    processed = 0
+    while True:
+        claimed = claim_task()
+        if claimed is None:
+            if burst:
+                return processed
+            time.sleep(sleep)
+            continue
+        run_task(claimed)
+        processed += 1
+
+
+@task(max_attempts=3)
+def process_avatar(avatar_id: int, upload_name: str) -> None:
+    """
+    Уменьшает загруженную аватарку процессорами поля ProfileAvatar.src
+    и удаляет исходный файл
+    """
+    avatar = ProfileAvatar.objects.select_related("profile").get(pk=avatar_id)
+    with default_storage.open(upload_name) as upload:
+        avatar.src.save(upload_name.rsplit("/", 1)[-1], File(upload), save=False)
+    avatar.save(update_fields=["src"])
+    default_storage.delete_now(upload_name)
+
+
+@task()
+def delete_file(name: str) -> None:
+    """Удаляет файл из хранилища, см. api.storage.QueuedDeleteStorage"""
+    default_storage.delete_now(name)
+
+
+@task(max_attempts=3)
+def generate_renditions(model_label: str, image_id: int) -> None:
+    """
+    Создает уменьшенные копии изображения товара или категории
+    и удаляет копии предыдущего файла
+    """
+    model = apps.get_model(model_label)
+    image = model.objects.get(pk=image_id)
+    previous = image.renditions.get("src")
+    renditions = render_image(image.src.name)
+    model.objects.filter(pk=image_id, src=image.src.name).update(renditions=renditions)
+    if previous and previous != image.src.name:
+        for name in get_rendition_names(previous):
+            default_storage.delete(name)
+    if model is CategoryImage:
+        invalidate_category_tree()
+    else:
+        invalidate_response_cache("catalog", "sales", f"product:{image.product_id}")
+
+
+@task()
+def recover_payment(order_id: int) -> None:
+    """
+    Сверяет со шлюзом оплату, которая не завершилась за ORDER_PAYMENT_TIMEOUT,
+    например из-за остановки процесса во время списания. Оплаченный заказ
+    получает статус paid, остальные возвращаются в accepted, и их резерв
+    снимается по обычному таймауту release_order
+    """
+    started_before = timezone.now() - timedelta(seconds=settings.ORDER_PAYMENT_TIMEOUT)
+    stuck = Order.objects.filter(pk=order_id, status=Order.STATUS_PAYING).filter(
+        Q(payingAt__lte=started_before) | Q(payingAt__isnull=True)
+    )
+    order = stuck.first()
+    if order is None:
+        return
+    if get_payment_processor().is_charged(order):
+        stuck.update(status=Order.STATUS_PAID, paymentError="")
+        return
+    if stuck.update(status=Order.STATUS_ACCEPTED, paymentError="Payment interrupted"):
+        reserved_until = order.createdAt + timedelta(
+            seconds=settings.ORDER_RESERVATION_TIMEOUT
+        )
+        delay = (reserved_until - timezone.now()).total_seconds()
+        enqueue(release_order, order_id, delay=max(delay, 0))
+
+
+@task()
+def release_order(order_id: int) -> None:
+    """
+    Отменяет неоплаченный заказ и возвращает зарезервированные товары на склад.
+    Статус меняется условным UPDATE, поэтому остатки не возвращаются дважды,
+    а заказ, оплата которого уже началась, не отменяется
+    """
+    with transaction.atomic():
+        canceled = Order.objects.filter(
+            pk=order_id, status__in=Order.UNPAID_STATUSES
+        ).update(status=Order.STATUS_CANCELED)
+        if not canceled:
+            return
+        items = list(
+            OrderItem.objects.filter(order_id=order_id).values_list(
+                "product_id", "count"
+            )
+        )
+        for product_id, count in items:
+            Product.objects.filter(pk=product_id).update(count=F("count") + count)
+    invalidate_response_cache(
+        "catalog", *(f"product:{product_id}" for product_id, _ in items)
+    )
@@ -1,3 +1,2212 @@
-from django.test import TestCase
+import base64
+import gzip
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from api import async_views, payments
+from api.models import (
+    Basket,
+    BasketItem,
+    Category,
+    CategoryImage,
+    Order,
+    OrderItem,
+    Product,
+    ProductImage,
+    ProductTag,
+    Profile,
+    ProfileAvatar,
+    RATING_HISTOGRAM_RATES,
+    Review,
+    Sale,
+    Specification,
+    Tag,
+    Task,
+)
+from api.banners import BannerPool
+from api.category_tree import category_tree
+from api.popularity import refresh_popular_products
+from api.product_cards import get_card_rows, serialize_product_cards
+from api.renderers import FastJSONRenderer
+from api.renditions import get_rendition_names
+from api.response_cache import invalidate_response_cache
+from api.search import DatabaseSearchBackend, get_search_backend
+from api.serializers import (
+    CatalogSerializer,
+    CategorySerializer,
+    ProductImageSerializer,
+)
+from api.tasks import claim_task, enqueue, run_task, task, work
+from api.urls import urlpatterns
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import caches
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import (
+    Client,
+    RequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.http import HttpResponse
+from django.urls import resolve, reverse
+from django.utils import timezone
+from megano.metrics import PROMETHEUS_CONTENT_TYPE, MetricsMiddleware, registry
+from megano.staticfiles import (
+    AsyncStaticFilesApplication,
+    StaticFilesApplication,
+    compress_file,
+)
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+
+
+def clear_caches():
+    for cache in caches.all():
+        cache.clear()
+
+
+class SaleListViewTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title="Sales", slug="sales")
+        now = timezone.now()
+        cls.active_sales = []
+        for index in range(45):
+            product = Product.objects.create(
+                title=f"Product {index}", price=1000, count=1, category=category
+            )
+            ProductImage.objects.bulk_create(
+                [
+                    ProductImage(product=product, src=f"products/{index}/1.jpg"),
+                    ProductImage(product=product, src=f"products/{index}/2.jpg"),
+                ]
+            )
+            if index < 40:
+                date_from, date_to = now - timedelta(days=1), now + timedelta(days=1)
+            else:
+                date_from, date_to = now - timedelta(days=3), now - timedelta(days=2)
+            sale = Sale.objects.create(
+                product=product, salePrice=500, dateFrom=date_from, dateTo=date_to
+            )
+            if index < 40:
+                cls.active_sales.append(sale)
+
+    def setUp(self):
+        clear_caches()
+
+    def test_only_active_sales(self):
+        response = self.client.get(reverse("api:sales"), {"currentPage": 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["lastPage"], 2)
+        self.assertEqual(
+            [item["id"] for item in response.data["items"]],
+            [sale.product_id for sale in self.active_sales[20:]],
+        )
+        self.assertEqual(len(response.data["items"][0]["images"]), 2)
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        # count, sales with products, product images
+        with self.assertNumQueries(3):
+            self.client.get(reverse("api:sales"), {"currentPage": 1})
+        Sale.objects.filter(pk__in=[sale.pk for sale in self.active_sales[5:]]).delete()
+        clear_caches()
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("api:sales"), {"currentPage": 1})
+        self.assertEqual(len(response.data["items"]), 5)
+
+
+class PopularProductsTestCase(TestCase):
+    def setUp(self):
+        clear_caches()
+
+    def test_empty_ranking_is_not_refreshed_on_every_request(self):
+        self.client.get(reverse("api:popular_products"))
+        # время пересчета и товары, без повторного пересчета
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("api:popular_products"))
+        self.assertEqual(response.data, [])
+        self.assertIn("Expires", response)
+
+    def test_ranking_uses_average_rate(self):
+        category = Category.objects.create(title="Popular", slug="popular")
+        many_reviews, best_rated, in_baskets = [
+            Product.objects.create(title=title, price=10, count=1, category=category)
+            for title in ("Many reviews", "Best rated", "In baskets")
+        ]
+        users = [
+            User.objects.create_user(username=f"user{index}") for index in range(10)
+        ]
+        for user in users:
+            Review.objects.create(
+                user=user, product=many_reviews, author="A", email="a@a.a", rate=3
+            )
+        Review.objects.create(
+            user=users[0], product=best_rated, author="A", email="a@a.a", rate=5
+        )
+        Review.objects.create(
+            user=users[0], product=in_baskets, author="A", email="a@a.a", rate=3
+        )
+        for user in users:
+            basket = Basket.objects.create(user=user)
+            BasketItem.objects.create(basket=basket, product=in_baskets, count=1)
+        ranking = refresh_popular_products()
+        self.assertEqual(
+            [(item.product_id, item.score) for item in ranking],
+            [(best_rated.pk, 5.0), (in_baskets.pk, 4.0), (many_reviews.pk, 3.0)],
+        )
+
+
+class BannerPoolTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title="Banners", slug="banners")
+        cls.light, cls.heavy, cls.hidden, cls.archived, cls.sold_out = [
+            Product.objects.create(
+                title=f"Product {index}",
+                price=10,
+                count=count,
+                archived=archived,
+                banner_weight=weight,
+                category=category,
+            )
+            for index, (weight, count, archived) in enumerate(
+                [
+                    (1, 1, False),
+                    (9, 1, False),
+                    (0, 1, False),
+                    (5, 1, True),
+                    (5, 0, False),
+                ]
+            )
+        ]
+
+    def setUp(self):
+        self.pool = BannerPool()
+        random.seed(0)
+
+    def sample_ids(self):
+        return {pk for _ in range(200) for pk in self.pool.sample(2)}
+
+    def test_only_eligible_products(self):
+        self.assertEqual(self.sample_ids(), {self.light.pk, self.heavy.pk})
+
+    def test_sample_follows_weights(self):
+        self.pool.refresh()
+        with self.assertNumQueries(0):
+            draws = [self.pool.sample(1)[0] for _ in range(2000)]
+        self.assertAlmostEqual(draws.count(self.heavy.pk) / len(draws), 0.9, delta=0.03)
+
+    def test_sample_has_distinct_products(self):
+        samples = [self.pool.sample(2) for _ in range(200)]
+        self.assertTrue(all(len(sample) == len(set(sample)) for sample in samples))
+        self.assertIn(2, {len(sample) for sample in samples})
+
+    def test_refreshes_after_invalidate(self):
+        self.pool.refresh()
+        self.light.banner_weight = 0
+        self.light.save()
+        self.assertEqual(self.sample_ids(), {self.light.pk, self.heavy.pk})
+        self.pool.invalidate()
+        self.assertEqual(self.sample_ids(), {self.heavy.pk})
+
+
+class CategoryTreeTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.laptops = Category.objects.create(title="Laptops", slug="laptops")
+        cls.gaming = Category.objects.create(
+            title="Gaming", slug="gaming", parent=cls.laptops
+        )
+        cls.ultra = Category.objects.create(
+            title="Ultra", slug="ultra", parent=cls.gaming
+        )
+        cls.phones = Category.objects.create(title="Phones", slug="phones")
+        cls.laptop = Product.objects.create(
+            title="Laptop", price=10, count=1, category=cls.ultra
+        )
+        cls.phone = Product.objects.create(
+            title="Phone", price=10, count=1, category=cls.phones
+        )
+
+    def setUp(self):
+        clear_caches()
+        category_tree.invalidate()
+
+    def test_descendants(self):
+        self.assertEqual(
+            category_tree.get_descendant_ids(self.laptops.pk),
+            [self.laptops.pk, self.gaming.pk, self.ultra.pk],
+        )
+        self.assertEqual(
+            category_tree.get_descendant_ids(self.gaming.pk),
+            [self.gaming.pk, self.ultra.pk],
+        )
+        self.assertEqual(
+            category_tree.get_descendant_ids(self.ultra.pk), [self.ultra.pk]
+        )
+        self.assertEqual(
+            category_tree.get_descendant_ids(self.phones.pk), [self.phones.pk]
+        )
+        self.assertEqual(category_tree.get_descendant_ids(0), [])
+
+    def test_lookups_do_not_query_database(self):
+        # дерево загружается одним запросом
+        with self.assertNumQueries(1):
+            category_tree.get_descendant_ids(self.laptops.pk)
+        with self.assertNumQueries(0):
+            for category in (self.laptops, self.gaming, self.ultra, self.phones):
+                category_tree.get_descendant_ids(category.pk)
+
+    def test_tree_changes_are_picked_up(self):
+        category_tree.get_descendant_ids(self.laptops.pk)
+        child = Category.objects.create(title="Mini", slug="mini", parent=self.phones)
+        self.assertEqual(
+            category_tree.get_descendant_ids(self.phones.pk),
+            [self.phones.pk, child.pk],
+        )
+        gaming = Category.objects.get(pk=self.gaming.pk)
+        gaming.parent = self.phones
+        gaming.save()
+        self.assertEqual(
+            category_tree.get_descendant_ids(self.laptops.pk), [self.laptops.pk]
+        )
+        self.assertEqual(
+            set(category_tree.get_descendant_ids(self.phones.pk)),
+            {self.phones.pk, child.pk, self.gaming.pk, self.ultra.pk},
+        )
+
+    def test_catalog_filters_by_subtree(self):
+        for category, products in (
+            (self.laptops, [self.laptop]),
+            (self.ultra, [self.laptop]),
+            (self.phones, [self.phone]),
+        ):
+            response = self.client.get(
+                reverse("api:catalog"), {"category": category.pk}
+            )
+            self.assertEqual(
+                [item["id"] for item in response.data["items"]],
+                [product.pk for product in products],
+            )
+        response = self.client.get(reverse("api:catalog"), {"category": 0})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["items"], [])
+
+
+class CategoryListViewTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.laptops = Category.objects.create(title="Laptops", slug="laptops")
+        cls.gaming = Category.objects.create(
+            title="Gaming", slug="gaming", parent=cls.laptops
+        )
+        Category.objects.create(title="Phones", slug="phones")
+        cls.image = CategoryImage.objects.create(
+            category=cls.laptops, src="categories/laptops.jpg", alt="Laptops"
+        )
+
+    def setUp(self):
+        clear_caches()
+
+    def test_matches_category_serializer(self):
+        response = self.client.get(reverse("api:categories"))
+        categories = Category.objects.filter(parent=None).order_by("tree_id")
+        self.assertEqual(
+            json.loads(response.content),
+            json.loads(
+                JSONRenderer().render(CategorySerializer(categories, many=True).data)
+            ),
+        )
+
+    def test_conditional_requests(self):
+        response = self.client.get(reverse("api:categories"))
+        etag, last_modified = response["ETag"], response["Last-Modified"]
+        # версия и JSON дерева берутся из кэша
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                reverse("api:categories"), HTTP_IF_NONE_MATCH=etag
+            )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response["ETag"], etag)
+        response = self.client.get(
+            reverse("api:categories"), HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(
+            reverse("api:categories"), HTTP_IF_NONE_MATCH='"stale"'
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_changes_reset_etag(self):
+        etag = self.client.get(reverse("api:categories"))["ETag"]
+
+        def rename_category():
+            self.gaming.title = "Gaming laptops"
+            self.gaming.save()
+
+        def change_image():
+            self.image.alt = "All laptops"
+            self.image.save()
+
+        def add_category():
+            Category.objects.create(title="Tablets", slug="tablets")
+
+        for change in (rename_category, change_image, add_category):
+            change()
+            response = self.client.get(
+                reverse("api:categories"), HTTP_IF_NONE_MATCH=etag
+            )
+            self.assertEqual(response.status_code, 200, change.__name__)
+            self.assertNotEqual(response["ETag"], etag)
+            etag = response["ETag"]
+        tree = json.loads(response.content)
+        self.assertEqual(
+            [category["title"] for category in tree], ["Laptops", "Phones", "Tablets"]
+        )
+        self.assertEqual(tree[0]["image"]["alt"], "All laptops")
+        self.assertEqual(tree[0]["subcategories"][0]["title"], "Gaming laptops")
+
+
+class CatalogIndexesTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_catalog(products=200, reviews_per_product=2, images_per_product=1)
+
+    def setUp(self):
+        clear_caches()
+
+    def test_catalog_queries_use_indexes(self):
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        stdout = io.StringIO()
+        call_command("explain_catalog", stdout=stdout)
+        output = stdout.getvalue()
+        self.assertNotIn("FULL SCAN", output, output)
+        self.assertIn("0 of 10 catalog queries use a full scan", output)
+
+    def test_sort_by_reviews_does_not_duplicate_products(self):
+        response = self.client.get(
+            reverse("api:catalog"), {"sort": "reviews", "sortType": "dec"}
+        )
+        product_ids = [item["id"] for item in response.data["items"]]
+        self.assertEqual(len(product_ids), len(set(product_ids)))
+        counts = [item["reviews"] for item in response.data["items"]]
+        self.assertEqual(counts, sorted(counts, reverse=True))
+
+
+class ResponseCacheTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title="Cache", slug="cache")
+        cls.products = [
+            Product.objects.create(
+                title=f"Product {index}", price=100, count=1, category=category
+            )
+            for index in range(2)
+        ]
+        now = timezone.now()
+        cls.sale = Sale.objects.create(
+            product=cls.products[0],
+            salePrice=50,
+            dateFrom=now - timedelta(days=1),
+            dateTo=now + timedelta(days=1),
+        )
+        cls.user = User.objects.create_user(username="cached", password="password")
+
+    def setUp(self):
+        clear_caches()
+
+    def get(self, name, params=None, **kwargs):
+        return self.client.get(reverse(f"api:{name}", kwargs=kwargs), params)
+
+    def test_anonymous_responses_are_cached(self):
+        first = self.get("catalog", {"sort": "price", "sortType": "inc"})
+        self.assertEqual(first["X-Cache"], "MISS")
+        with self.assertNumQueries(0):
+            second = self.get("catalog", {"sortType": "inc", "sort": "price"})
+        self.assertEqual(second["X-Cache"], "HIT")
+        self.assertEqual(second.content, first.content)
+        self.client.force_login(self.user)
+        response = self.get("catalog", {"sort": "price", "sortType": "inc"})
+        self.assertNotIn("X-Cache", response)
+
+    def test_errors_are_not_cached(self):
+        self.assertEqual(self.get("product_details", pk=0).status_code, 404)
+        response = self.get("product_details", pk=0)
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn("X-Cache", response)
+
+    def test_tag_invalidation_resets_only_tagged_responses(self):
+        for name in ("catalog", "sales", "tags"):
+            self.get(name)
+        invalidate_response_cache("sales")
+        self.assertEqual(self.get("catalog")["X-Cache"], "HIT")
+        self.assertEqual(self.get("tags")["X-Cache"], "HIT")
+        self.assertEqual(self.get("sales")["X-Cache"], "MISS")
+        self.assertEqual(self.get("sales")["X-Cache"], "HIT")
+
+    def test_product_changes_reset_its_details_only(self):
+        first, second = self.products
+        for product in self.products:
+            self.get("product_details", pk=product.pk)
+        first.price = 120
+        first.save()
+        response = self.get("product_details", pk=first.pk)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["price"], "120.00")
+        self.assertEqual(self.get("product_details", pk=second.pk)["X-Cache"], "HIT")
+
+    def test_sales_follow_sale_and_product_changes(self):
+        self.assertEqual(self.get("sales")["X-Cache"], "MISS")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get("sales")["X-Cache"], "HIT")
+        now = timezone.now()
+        Sale.objects.create(
+            product=self.products[1],
+            salePrice=70,
+            dateFrom=now - timedelta(days=1),
+            dateTo=now + timedelta(days=1),
+        )
+        response = self.get("sales")
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(len(response.data["items"]), 2)
+        self.products[0].title = "Renamed"
+        self.products[0].save()
+        response = self.get("sales")
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["items"][0]["title"], "Renamed")
+        self.sale.delete()
+        response = self.get("sales")
+        self.assertEqual(
+            [item["id"] for item in response.data["items"]], [self.products[1].pk]
+        )
+
+
+class SearchTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title="Laptops", slug="laptops")
+        cls.products = [
+            Product.objects.create(
+                title=f"Laptop {index}",
+                description="laptop " * (5 - index),
+                price=1000,
+                category=category,
+            )
+            for index in range(5)
+        ]
+        cls.tag = Tag.objects.create(name="Waterproof")
+
+    def setUp(self):
+        clear_caches()
+
+    def search(self, query, backend=None):
+        backend = backend or get_search_backend()
+        return set(
+            backend.filter(Product.objects.all(), query).values_list("pk", flat=True)
+        )
+
+    def test_tags_changed_through_many_to_many_are_indexed(self):
+        product = self.products[0]
+        product.tags.add(self.tag)
+        self.assertEqual(self.search("waterproof"), {product.pk})
+        self.tag.products.set(self.products[1:3])
+        self.assertEqual(
+            self.search("waterproof"), {self.products[1].pk, self.products[2].pk}
+        )
+        self.tag.products.clear()
+        self.assertEqual(self.search("waterproof"), set())
+
+    def test_backends_search_the_same_fields(self):
+        product = self.products[1]
+        Specification.objects.create(product=product, name="Diagonal", value="15")
+        for backend in (get_search_backend(), DatabaseSearchBackend()):
+            with self.subTest(backend=type(backend).__name__):
+                self.assertEqual(self.search("diagonal", backend), {product.pk})
+
+    @override_settings(SEARCH_MAX_RESULTS=2)
+    def test_ranked_search_keeps_matches_past_the_limit(self):
+        response = self.client.get(reverse("api:catalog"), {"search": "laptop"})
+        product_ids = [item["id"] for item in response.data["items"]]
+        self.assertEqual(sorted(product_ids), sorted(p.pk for p in self.products))
+        self.assertEqual(product_ids[2:], sorted(product_ids[2:]))
+
+
+class CreateProductsCommandTestCase(TestCase):
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        media_root = self.directory / "media"
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        Image.new("RGB", (10, 10), "white").save(self.directory / "1.jpg")
+        Image.new("RGB", (10, 10), "black").save(self.directory / "2.jpg")
+        Category.objects.create(title="Laptops", slug="laptops")
+
+    def run_import(self, items, suffix=".json"):
+        path = self.directory / f"products{suffix}"
+        if suffix == ".json":
+            path.write_text(json.dumps(items))
+        else:
+            path.write_text("\n".join(json.dumps(item) for item in items))
+        call_command("create_products", str(path), batch_size=2, stdout=io.StringIO())
+
+    def test_upsert_by_sku(self):
+        items = [
+            {
+                "sku": f"SKU-{index}",
+                "title": f"Imported {index}",
+                "price": 10.5,
+                "count": 3,
+                "specifications": [{"name": "Weight", "value": "1 kg"}],
+                "images": [{"src": "1.jpg", "alt": "front"}],
+            }
+            for index in range(5)
+        ]
+        self.run_import(items)
+        items[0]["title"] = "Renamed"
+        items[0]["images"] = [{"src": "2.jpg"}]
+        self.run_import(items, suffix=".jsonl")
+
+        self.assertEqual(Product.objects.count(), 5)
+        product = Product.objects.get(sku="SKU-0")
+        self.assertEqual(product.title, "Renamed")
+        self.assertEqual(product.specifications.count(), 1)
+        self.assertEqual(
+            [image.src.name for image in product.images.all()],
+            [f"products/product_{product.pk}/images/2.jpg"],
+        )
+        self.assertTrue(Path(product.images.get().src.path).exists())
+        self.assertFalse((self.directory / "products.jsonl.checkpoint").exists())
+
+    def test_feed_without_sku_keeps_date_and_queues_renditions(self):
+        items = [
+            {
+                "title": "Legacy laptop",
+                "price": 100,
+                "count": 1,
+                "date": 1600000000,
+                "images": [{"src": "1.jpg", "alt": "front"}],
+            }
+        ]
+        self.run_import(items)
+        items[0]["price"] = 90
+        self.run_import(items)
+
+        product = Product.objects.get()
+        self.assertIsNone(product.sku)
+        self.assertEqual(product.price, 90)
+        self.assertEqual(product.date.timestamp(), 1600000000)
+        self.assertEqual(
+            list(Task.objects.values_list("name", "args")),
+            [("generate_renditions", ["api.ProductImage", product.images.get().pk])],
+        )
+
+    def test_reimport_query_count_does_not_depend_on_deleted_rows(self):
+        query_counts = []
+        for specifications in (1, 10):
+            items = [
+                {
+                    "sku": f"SKU-{index}",
+                    "title": f"Imported {index}",
+                    "price": 10,
+                    "count": 1,
+                    "specifications": [
+                        {"name": f"Spec {number}", "value": "1"}
+                        for number in range(specifications)
+                    ],
+                    "images": [{"src": "1.jpg"}, {"src": "2.jpg"}],
+                }
+                for index in range(2)
+            ]
+            self.run_import(items)
+            for item in items:
+                item["specifications"] = [{"name": "Weight", "value": "1 kg"}]
+                item["images"] = [{"src": "1.jpg"}]
+            Task.objects.all().delete()
+            with CaptureQueriesContext(connection) as context:
+                self.run_import(items)
+            query_counts.append(len(context))
+            self.assertEqual(Specification.objects.count(), 2)
+            self.assertEqual(ProductImage.objects.count(), 2)
+            self.assertEqual(
+                sorted(args[0] for args in Task.objects.values_list("args", flat=True)),
+                [
+                    f"products/product_{pk}/images/2.jpg"
+                    for pk in Product.objects.order_by("pk").values_list(
+                        "pk", flat=True
+                    )
+                ],
+            )
+        self.assertEqual(query_counts[0], query_counts[1])
+
+
+class GenerateCatalogCommandTestCase(TestCase):
+    def test_repeated_runs_do_not_collide(self):
+        options = {"categories": 12, "products": 20, "tags": 5, "users": 3}
+        for _ in range(2):
+            call_command("generate_catalog", stdout=io.StringIO(), **options)
+        slugs = list(Category.objects.values_list("slug", flat=True))
+        self.assertEqual(len(slugs), 24)
+        self.assertEqual(len(set(slugs)), 24)
+        self.assertEqual(Product.objects.count(), 40)
+
+
+class BasketViewTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title="Basket", slug="basket")
+        cls.products = Product.objects.bulk_create(
+            [
+                Product(title=f"Product {index}", price=10, count=5, category=category)
+                for index in range(30)
+            ]
+        )
+        cls.user = User.objects.create_user(username="buyer", password="password")
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def change(self, method, product, count):
+        return getattr(self.client, method)(
+            reverse("api:basket"),
+            {"id": product.pk, "count": count},
+            content_type="application/json",
+        )
+
+    def test_add_merges_counts(self):
+        self.change("post", self.products[0], 2)
+        response = self.change("post", self.products[0], 3)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(item["id"], item["count"]) for item in response.data],
+            [(self.products[0].pk, 5)],
+        )
+        self.assertEqual(BasketItem.objects.count(), 1)
+
+    def test_remove_clamps_at_zero(self):
+        self.change("post", self.products[0], 2)
+        response = self.change("delete", self.products[0], 1)
+        self.assertEqual(response.data[0]["count"], 1)
+        response = self.change("delete", self.products[0], 5)
+        self.assertEqual(response.data, [])
+        self.assertFalse(BasketItem.objects.exists())
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.change("post", self.products[0], 0).status_code, 400)
+        missing = Product(pk=self.products[-1].pk + 1)
+        self.assertEqual(self.change("post", missing, 1).status_code, 404)
+
+    def test_query_count_does_not_depend_on_basket_size(self):
+        self.change("post", self.products[0], 1)
+        # user, basket, upsert, items with products, tags, images
+        with self.assertNumQueries(6):
+            self.change("post", self.products[1], 1)
+        for product in self.products[2:]:
+            self.change("post", product, 1)
+        with self.assertNumQueries(6):
+            response = self.change("post", self.products[0], 1)
+        self.assertEqual(len(response.data), 30)
+
+
+class SessionBasketTestCase(BasketViewTestCase):
+    def setUp(self):
+        pass
+
+    def sign_in(self):
+        return self.client.post(
+            reverse("api:sign-in"),
+            json.dumps({"username": "buyer", "password": "password"}),
+            content_type="application/x-www-form-urlencoded",
+        )
+
+    def test_add_merges_counts(self):
+        self.change("post", self.products[0], 2)
+        response = self.change("post", self.products[0], 3)
+        self.assertEqual(
+            [(item["id"], item["count"]) for item in response.data],
+            [(self.products[0].pk, 5)],
+        )
+        self.assertFalse(BasketItem.objects.exists())
+
+    def test_remove_clamps_at_zero(self):
+        self.change("post", self.products[0], 2)
+        response = self.change("delete", self.products[0], 5)
+        self.assertEqual(response.data, [])
+        self.assertEqual(self.client.get(reverse("api:basket")).data, [])
+
+    def test_query_count_does_not_depend_on_basket_size(self):
+        for product in self.products:
+            self.change("post", product, 1)
+        # products, tags, images
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("api:basket"))
+        self.assertEqual(len(response.data), 30)
+
+    def test_changes_do_not_query_sessions(self):
+        self.change("post", self.products[1], 1)
+        # товары, тэги и изображения корзины, без записи сессии
+        with self.assertNumQueries(3):
+            self.change("post", self.products[0], 2)
+        with self.assertNumQueries(3):
+            response = self.change("delete", self.products[0], 2)
+        self.assertEqual(
+            [(item["id"], item["count"]) for item in response.data],
+            [(self.products[1].pk, 1)],
+        )
+        with self.assertNumQueries(0):
+            response = self.change("delete", self.products[1], 1)
+        self.assertEqual(response.data, [])
+
+    def test_merge_on_sign_in(self):
+        basket = Basket.objects.create(user=self.user)
+        BasketItem.objects.create(basket=basket, product=self.products[0], count=1)
+        self.change("post", self.products[0], 2)
+        self.change("post", self.products[1], 1)
+        self.sign_in()
+        response = self.client.get(reverse("api:basket"))
+        self.assertEqual(
+            [(item["id"], item["count"]) for item in response.data],
+            [(self.products[0].pk, 3), (self.products[1].pk, 1)],
+        )
+
+
+class ProductRatingTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title="Rating", slug="rating")
+        cls.product, cls.other_product = [
+            Product.objects.create(title=title, price=100, count=1, category=category)
+            for title in ("Product", "Other product")
+        ]
+        cls.user = User.objects.create_user(username="rater", password="password")
+
+    def create_review(self, rate, product=None):
+        return Review.objects.create(
+            user=self.user,
+            product=product or self.product,
+            author="Author",
+            email="rater@example.com",
+            rate=rate,
+        )
+
+    def get_rating(self, product=None):
+        return (
+            Product.objects.filter(pk=(product or self.product).pk)
+            .values_list("rating", "rating_sum", "reviews_count")
+            .get()
+        )
+
+    def test_rating_follows_created_reviews(self):
+        self.assertEqual(self.get_rating(), (None, 0, 0))
+        self.create_review(5)
+        self.create_review(2)
+        self.assertEqual(self.get_rating(), (3.5, 7, 2))
+
+    def test_rating_follows_edited_review(self):
+        self.create_review(5)
+        review = self.create_review(2)
+        review.rate = 4
+        # прежняя оценка, отзыв и один UPDATE товара
+        with self.assertNumQueries(3):
+            review.save()
+        self.assertEqual(self.get_rating(), (4.5, 9, 2))
+        review.text = "edited"
+        review.save()
+        self.assertEqual(self.get_rating(), (4.5, 9, 2))
+
+    def test_rating_follows_review_moved_to_other_product(self):
+        self.create_review(5)
+        review = self.create_review(2)
+        review.product = self.other_product
+        review.save()
+        self.assertEqual(self.get_rating(), (5.0, 5, 1))
+        self.assertEqual(self.get_rating(self.other_product), (2.0, 2, 1))
+
+    def test_rating_follows_deleted_reviews(self):
+        first = self.create_review(5)
+        second = self.create_review(2)
+        first.delete()
+        self.assertEqual(self.get_rating(), (2.0, 2, 1))
+        second.delete()
+        self.assertEqual(self.get_rating(), (None, 0, 0))
+
+
+class ProductReviewsTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title="Reviews", slug="reviews")
+        cls.product = Product.objects.create(
+            title="Product", price=100, count=1, category=category
+        )
+        cls.user = User.objects.create_user(username="reviewer", password="password")
+        cls.reviews = [
+            Review.objects.create(
+                user=cls.user,
+                product=cls.product,
+                author=f"Author {index}",
+                email="reviewer@example.com",
+                rate=index % 5 + 1,
+            )
+            for index in range(23)
+        ]
+
+    def setUp(self):
+        clear_caches()
+
+    def get_histogram(self):
+        product = Product.objects.get(pk=self.product.pk)
+        return [getattr(product, f"rating_count_{rate}") for rate in range(1, 6)]
+
+    def test_histogram_follows_reviews(self):
+        self.assertEqual(self.get_histogram(), [5, 5, 5, 4, 4])
+        review = self.reviews[0]
+        review.rate = 5
+        review.save()
+        self.assertEqual(self.get_histogram(), [4, 5, 5, 4, 5])
+        review.delete()
+        self.assertEqual(self.get_histogram(), [4, 5, 5, 4, 4])
+
+    @override_settings(PRODUCT_LATEST_REVIEWS=3)
+    def test_details_embed_latest_reviews(self):
+        url = reverse("api:product_details", kwargs={"pk": self.product.pk})
+        with self.assertNumQueries(5):
+            response = self.client.get(url)
+        self.assertEqual(
+            [review["author"] for review in response.data["reviews"]],
+            ["Author 22", "Author 21", "Author 20"],
+        )
+        self.assertEqual(response.data["reviewsCount"], 23)
+        self.assertEqual(
+            response.data["ratingHistogram"], {1: 5, 2: 5, 3: 5, 4: 4, 5: 4}
+        )
+
+    def test_reviews_cursor_pagination(self):
+        url = reverse("api:review_create", kwargs={"product_id": self.product.pk})
+        authors = []
+        params = {}
+        while True:
+            with self.assertNumQueries(1):
+                response = self.client.get(url, params)
+            authors += [review["author"] for review in response.data["items"]]
+            if response.data["nextCursor"] is None:
+                break
+            params = {"cursor": response.data["nextCursor"]}
+        self.assertEqual(authors, [f"Author {index}" for index in range(22, -1, -1)])
+
+    def test_new_review_resets_cached_pages(self):
+        url = reverse("api:review_create", kwargs={"product_id": self.product.pk})
+        self.client.get(url)
+        self.client.force_login(self.user)
+        response = self.client.post(
+            url,
+            {"author": "New", "email": "new@example.com", "text": "ok", "rate": 5},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.client.logout()
+        response = self.client.get(url)
+        self.assertEqual(response.data["items"][0]["author"], "New")
+
+
+class CatalogFacetsTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title="Facets", slug="facets")
+        cls.tags = Tag.objects.bulk_create([Tag(name="red"), Tag(name="blue")])
+        cls.products = Product.objects.bulk_create(
+            [
+                Product(title="A", price=100, count=1, category=category),
+                Product(
+                    title="B", price=200, count=0, freeDelivery=True, category=category
+                ),
+                Product(
+                    title="C", price=300, count=5, freeDelivery=True, category=category
+                ),
+            ]
+        )
+        ProductTag.objects.bulk_create(
+            [
+                ProductTag(product=cls.products[0], tag=cls.tags[0]),
+                ProductTag(product=cls.products[1], tag=cls.tags[0]),
+                ProductTag(product=cls.products[2], tag=cls.tags[1]),
+            ]
+        )
+
+    def setUp(self):
+        clear_caches()
+
+    def test_category_changes_reset_cached_catalog(self):
+        category = Category.objects.get(slug="facets")
+        params = {"category": category.pk}
+        self.client.get(reverse("api:catalog"), params)
+        Category.objects.create(title="Child", slug="child", parent=category)
+        response = self.client.get(reverse("api:catalog"), params)
+        self.assertEqual(response["X-Cache"], "MISS")
+
+    def get_facets(self, **params):
+        return self.client.get(reverse("api:catalog_facets"), params).data
+
+    def test_facets_ignore_own_filter(self):
+        facets = self.get_facets(
+            **{"filter[freeDelivery]": "true", "filter[maxPrice]": 250}
+        )
+        self.assertEqual(facets["total"], 1)
+        self.assertEqual(facets["price"], {"min": "200.00", "max": "300.00"})
+        self.assertEqual(facets["freeDelivery"], 1)
+        self.assertEqual(facets["available"], 0)
+        self.assertEqual(
+            facets["tags"], [{"id": self.tags[0].pk, "name": "red", "count": 1}]
+        )
+
+        facets = self.get_facets(**{"tags[]": [self.tags[0].pk]})
+        self.assertEqual(facets["total"], 2)
+        self.assertEqual(
+            [tag["count"] for tag in facets["tags"]],
+            [2, 1],
+        )
+
+    def test_facets_are_cached_until_products_change(self):
+        self.get_facets(sort="price")
+        with self.assertNumQueries(0):
+            self.get_facets(sort="rating", currentPage=2)
+        self.products[0].freeDelivery = True
+        self.products[0].save()
+        self.assertEqual(self.get_facets()["freeDelivery"], 3)
+
+
+class BrokenPaymentProcessor(payments.BasePaymentProcessor):
+    def charge(self, order, payment):
+        raise ConnectionError("Gateway is unavailable")
+
+    def is_charged(self, order):
+        return True
+
+
+class OrderTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title="Orders", slug="orders")
+        cls.products = Product.objects.bulk_create(
+            [
+                Product(title="Laptop", price=1500, count=3, category=category),
+                Product(title="Mouse", price=100, count=1, category=category),
+            ]
+        )
+        now = timezone.now()
+        Sale.objects.create(
+            product=cls.products[0],
+            salePrice=1200,
+            dateFrom=now - timedelta(days=1),
+            dateTo=now + timedelta(days=1),
+        )
+        cls.user = User.objects.create_user(username="buyer", password="password")
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def create_order(self, *items):
+        return self.client.post(
+            reverse("api:orders"),
+            [{"id": product.pk, "count": count} for product, count in items],
+            content_type="application/json",
+        )
+
+    def test_create_order_reserves_stock(self):
+        basket = Basket.objects.create(user=self.user)
+        BasketItem.objects.create(basket=basket, product=self.products[0], count=2)
+        response = self.create_order((self.products[0], 2), (self.products[1], 1))
+        self.assertEqual(response.status_code, 200)
+        order = Order.objects.get(pk=response.data["orderId"])
+        self.assertEqual(order.totalCost, 2500)
+        self.assertEqual(
+            list(Product.objects.order_by("pk").values_list("count", flat=True)),
+            [1, 0],
+        )
+        self.assertFalse(BasketItem.objects.exists())
+
+        response = self.client.get(reverse("api:orders"))
+        self.assertEqual(response.data[0]["products"][0]["price"], "1200.00")
+
+    def test_out_of_stock_rolls_back(self):
+        response = self.create_order((self.products[0], 1), (self.products[1], 2))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data["productId"], self.products[1].pk)
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].count, 3)
+        self.assertFalse(Order.objects.exists())
+
+    def test_confirm_and_pay(self):
+        order_id = self.create_order((self.products[1], 1)).data["orderId"]
+        path = reverse("api:order_details", kwargs={"pk": order_id})
+        response = self.client.post(
+            path,
+            {"fullName": "Buyer", "city": "Moscow", "deliveryType": "express"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        order = self.client.get(path).data
+        self.assertEqual((order["status"], order["totalCost"]), ("accepted", "600.00"))
+
+        payment = reverse("api:payment", kwargs={"pk": order_id})
+        response = self.client.post(
+            payment, {"number": "12345679"}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 402)
+        self.assertTrue(response.data["paymentError"])
+        response = self.client.post(
+            payment, {"number": "12345678"}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Order.objects.get(pk=order_id).status, Order.STATUS_PAID)
+        response = self.client.post(
+            payment, {"number": "12345678"}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 409)
+
+    def test_frontend_order_path(self):
+        order_id = self.create_order((self.products[1], 1)).data["orderId"]
+        path = reverse("api:order", kwargs={"pk": order_id})
+        self.assertEqual(path, f"/api/order/{order_id}")
+        response = self.client.post(
+            path, {"fullName": "Buyer"}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(path).data["status"], "accepted")
+
+    @override_settings(PAYMENT_PROCESSOR="api.tests.BrokenPaymentProcessor")
+    def test_unexpected_payment_error_resets_status(self):
+        payments._processor = None
+        self.addCleanup(setattr, payments, "_processor", None)
+        order_id = self.create_order((self.products[1], 1)).data["orderId"]
+        Order.objects.filter(pk=order_id).update(status=Order.STATUS_ACCEPTED)
+        payment = reverse("api:payment", kwargs={"pk": order_id})
+        with self.assertRaises(ConnectionError):
+            self.client.post(payment, {}, content_type="application/json")
+        self.assertEqual(Order.objects.get(pk=order_id).status, Order.STATUS_ACCEPTED)
+
+    @override_settings(ORDER_RESERVATION_TIMEOUT=0)
+    def test_unpaid_orders_release_stock(self):
+        order_id = self.create_order((self.products[0], 2)).data["orderId"]
+        task = Task.objects.get(name="release_order")
+        self.assertEqual(task.args, [order_id])
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].count, 1)
+
+        for _ in range(2):
+            call_command("release_stale_orders", stdout=io.StringIO())
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].count, 3)
+        self.assertEqual(Order.objects.get(pk=order_id).status, Order.STATUS_CANCELED)
+        path = reverse("api:order_details", kwargs={"pk": order_id})
+        response = self.client.post(
+            path, {"fullName": "Buyer"}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 409)
+
+    def test_invalid_bodies_are_rejected(self):
+        order_id = self.create_order((self.products[1], 1)).data["orderId"]
+        path = reverse("api:order_details", kwargs={"pk": order_id})
+        payment = reverse("api:payment", kwargs={"pk": order_id})
+        for url, data in (
+            (path, ["Buyer"]),
+            (path, {"deliveryType": "teleport"}),
+            (path, {"email": "not an email"}),
+            (payment, ["12345678"]),
+        ):
+            with self.subTest(url=url, data=data):
+                response = self.client.post(url, data, content_type="application/json")
+                self.assertEqual(response.status_code, 400)
+        order = Order.objects.get(pk=order_id)
+        self.assertEqual((order.status, order.email), (Order.STATUS_CREATED, ""))
+
+    def start_interrupted_payment(self):
+        order_id = self.create_order((self.products[1], 1)).data["orderId"]
+        Order.objects.filter(pk=order_id).update(status=Order.STATUS_ACCEPTED)
+        payment = reverse("api:payment", kwargs={"pk": order_id})
+        processor = payments.get_payment_processor()
+        with mock.patch.object(processor, "charge", side_effect=SystemExit):
+            with self.assertRaises(SystemExit):
+                self.client.post(
+                    payment, {"number": "12345678"}, content_type="application/json"
+                )
+        # процесс остановлен во время списания и не вернул заказ в accepted
+        Order.objects.filter(pk=order_id).update(
+            status=Order.STATUS_PAYING,
+            payingAt=timezone.now() - timedelta(hours=1),
+        )
+        return order_id, payment
+
+    def test_interrupted_payment_is_recovered(self):
+        order_id, payment = self.start_interrupted_payment()
+        task = Task.objects.get(name="recover_payment")
+        self.assertEqual(task.args, [order_id])
+        run_task(task)
+        order = Order.objects.get(pk=order_id)
+        self.assertEqual(order.status, Order.STATUS_ACCEPTED)
+        self.assertEqual(order.paymentError, "Payment interrupted")
+        self.assertEqual(Task.objects.filter(name="release_order").count(), 2)
+        response = self.client.post(
+            payment, {"number": "12345678"}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(
+        PAYMENT_PROCESSOR="api.tests.BrokenPaymentProcessor",
+        ORDER_RESERVATION_TIMEOUT=0,
+    )
+    def test_stale_payments_are_reconciled_with_gateway(self):
+        payments._processor = None
+        self.addCleanup(setattr, payments, "_processor", None)
+        order_id, _ = self.start_interrupted_payment()
+        call_command("release_stale_orders", stdout=io.StringIO())
+        order = Order.objects.get(pk=order_id)
+        self.assertEqual(order.status, Order.STATUS_PAID)
+        self.products[1].refresh_from_db()
+        self.assertEqual(self.products[1].count, 0)
+
+    def test_finished_payment_is_not_recovered(self):
+        order_id = self.create_order((self.products[1], 1)).data["orderId"]
+        Order.objects.filter(pk=order_id).update(status=Order.STATUS_ACCEPTED)
+        self.client.post(
+            reverse("api:payment", kwargs={"pk": order_id}),
+            {"number": "12345678"},
+            content_type="application/json",
+        )
+        run_task(Task.objects.get(name="recover_payment"))
+        self.assertEqual(Order.objects.get(pk=order_id).status, Order.STATUS_PAID)
+
+    def test_other_users_orders_are_hidden(self):
+        order_id = self.create_order((self.products[1], 1)).data["orderId"]
+        self.client.force_login(User.objects.create_user(username="other"))
+        path = reverse("api:order_details", kwargs={"pk": order_id})
+        self.assertEqual(self.client.get(path).status_code, 404)
+        self.assertEqual(self.client.get(reverse("api:orders")).data, [])
+
+
+class AsyncReadViewsTestCase(TestCase):
+    """Асинхронные представления отвечают так же, как синхронные"""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_catalog(products=60)
+        cls.product = Product.objects.order_by("pk").first()
+        cls.category = Category.objects.filter(parent__isnull=True).first()
+
+    def setUp(self):
+        clear_caches()
+        self.factory = RequestFactory()
+
+    def async_get(self, view, path, params=None, **kwargs):
+        request = self.factory.get(path, params)
+        request.user = AnonymousUser()
+        return async_to_sync(view.as_view())(request, **kwargs)
+
+    def test_responses_match_sync_views(self):
+        product = {"pk": self.product.pk}
+        cases = [
+            ("catalog", async_views.CatalogListView, {}, {}),
+            ("catalog", async_views.CatalogListView, {}, {"currentPage": 2}),
+            (
+                "catalog",
+                async_views.CatalogListView,
+                {},
+                {"category": self.category.pk, "sort": "price", "sortType": "dec"},
+            ),
+            (
+                "catalog",
+                async_views.CatalogListView,
+                {},
+                {"cursor": "", "sort": "rating"},
+            ),
+            ("product_details", async_views.ProductDetailView, product, {}),
+            ("categories", async_views.CategoryListView, {}, {}),
+            ("tags", async_views.TagListView, {}, {}),
+            ("sales", async_views.SaleListView, {}, {"currentPage": 1}),
+        ]
+        for name, view, kwargs, params in cases:
+            with self.subTest(name=name, params=params):
+                path = reverse(f"api:{name}", kwargs=kwargs)
+                clear_caches()
+                expected = self.client.get(path, params)
+                clear_caches()
+                response = self.async_get(view, path, params, **kwargs)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.content, expected.content)
+                self.assertEqual(response["Content-Type"], expected["Content-Type"])
+
+    def test_banners_match_sync_view(self):
+        path = reverse("api:banners")
+        random.seed(0)
+        expected = self.client.get(path)
+        random.seed(0)
+        response = self.async_get(async_views.BannerListView, path)
+        self.assertEqual(json.loads(response.content), json.loads(expected.content))
+
+    def test_response_cache_is_shared_with_sync_views(self):
+        path = reverse("api:catalog")
+        self.assertEqual(self.client.get(path)["X-Cache"], "MISS")
+        response = self.async_get(async_views.CatalogListView, path)
+        self.assertEqual(response["X-Cache"], "HIT")
+        self.assertEqual(response.content, self.client.get(path).content)
+
+    def test_not_found(self):
+        path = reverse("api:product_details", kwargs={"pk": 0})
+        response = self.async_get(async_views.ProductDetailView, path, pk=0)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.content, self.client.get(path).content)
+        path = reverse("api:catalog")
+        response = self.async_get(
+            async_views.CatalogListView, path, {"currentPage": 100}
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class CheckoutConcurrencyTestCase(TransactionTestCase):
+    """
+    Запускает сотни одновременных заказов на товар с ограниченным остатком
+    и проверяет, что продано ровно столько, сколько было на складе
+    """
+
+    checkouts = 200
+    stock = 25
+
+    def setUp(self):
+        category = Category.objects.create(title="Stress", slug="stress")
+        self.product = Product.objects.create(
+            title="Limited", price=10, count=self.stock, category=category
+        )
+        self.clients = []
+        for index in range(self.checkouts):
+            client = Client()
+            client.force_login(User.objects.create_user(username=f"buyer{index}"))
+            self.clients.append(client)
+
+    def checkout(self, client, start):
+        start.wait()
+        try:
+            return client.post(
+                reverse("api:orders"),
+                [{"id": self.product.pk, "count": 1}],
+                content_type="application/json",
+            ).status_code
+        finally:
+            connection.close()
+
+    def test_no_oversell(self):
+        start = threading.Barrier(self.checkouts)
+        with ThreadPoolExecutor(self.checkouts) as pool:
+            results = list(
+                pool.map(lambda client: self.checkout(client, start), self.clients)
+            )
+        self.assertEqual(results.count(200), self.stock)
+        self.assertEqual(results.count(409), self.checkouts - self.stock)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.count, 0)
+        self.assertEqual(Order.objects.count(), self.stock)
+
+
+FLAKY_CALLS = []
+
+
+@task(max_attempts=2)
+def flaky_task(value):
+    FLAKY_CALLS.append(value)
+    raise ValueError(value)
+
+
+@override_settings(TASK_RETRY_BACKOFF=10, TASK_VISIBILITY_TIMEOUT=60)
+class TaskQueueTestCase(TestCase):
+    def setUp(self):
+        FLAKY_CALLS.clear()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_retry_with_backoff_then_fail(self):
+        queued = enqueue(flaky_task, 1)
+        with self.assertLogs("api.tasks", "WARNING"):
+            self.assertFalse(run_task(claim_task()))
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), (Task.STATUS_QUEUED, 1))
+        self.assertAlmostEqual(
+            (queued.run_at - timezone.now()).total_seconds(), 10, delta=2
+        )
+        self.assertIsNone(claim_task())
+
+        Task.objects.update(run_at=timezone.now())
+        with self.assertLogs("api.tasks", "WARNING"):
+            self.assertFalse(run_task(claim_task()))
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), (Task.STATUS_FAILED, 2))
+        self.assertIn("ValueError", queued.last_error)
+        self.assertEqual(FLAKY_CALLS, [1, 1])
+
+    def test_visibility_timeout(self):
+        queued = enqueue(flaky_task, 1)
+        claimed = claim_task()
+        self.assertIsNone(claim_task())
+        Task.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        reclaimed = claim_task()
+        self.assertEqual((reclaimed.pk, reclaimed.attempts), (queued.pk, 2))
+        # Первый воркер больше не владеет задачей и не меняет ее запись
+        with self.assertLogs("api.tasks", "WARNING"):
+            run_task(claimed)
+        reclaimed.refresh_from_db()
+        self.assertEqual(reclaimed.status, Task.STATUS_RUNNING)
+
+    def test_avatar_is_processed_in_background(self):
+        user = User.objects.create_user(username="buyer", password="password")
+        profile = Profile.objects.create(user=user)
+        ProfileAvatar.objects.create(profile=profile)
+        self.client.force_login(user)
+
+        def upload(color):
+            image = io.BytesIO()
+            Image.new("RGB", (600, 400), color).save(image, "JPEG")
+            self.client.post(
+                reverse("api:avatar"),
+                {"avatar": SimpleUploadedFile("a.jpg", image.getvalue())},
+            )
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(work(burst=True), 1)
+            avatar = ProfileAvatar.objects.get(profile=profile)
+            with Image.open(avatar.src.path) as processed:
+                self.assertLessEqual(max(processed.size), 291)
+            return Path(avatar.src.path)
+
+        first = upload("white")
+        second = upload("black")
+        self.assertTrue(first.exists())
+        # Старая аватарка удаляется следующей задачей
+        self.assertEqual(work(burst=True), 1)
+        self.assertFalse(first.exists())
+        self.assertTrue(second.exists())
+        self.assertEqual(list(second.parent.glob("uploads/*")), [])
+
+
+class RenditionTestCase(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        category = Category.objects.create(title="Images", slug="images")
+        self.product = Product.objects.create(
+            title="Product", price=1, count=1, category=category
+        )
+
+    def upload(self):
+        image = io.BytesIO()
+        Image.new("RGB", (1600, 800), "white").save(image, "JPEG")
+        product_image = ProductImage(product=self.product)
+        product_image.src.save(
+            "photo.jpg", SimpleUploadedFile("photo.jpg", image.getvalue())
+        )
+        return product_image
+
+    def test_renditions_are_generated_in_background(self):
+        product_image = self.upload()
+        self.assertEqual(ProductImageSerializer(product_image).data["srcset"], {})
+        self.assertEqual(work(burst=True), 1)
+
+        product_image.refresh_from_db()
+        self.assertEqual(
+            product_image.renditions["widths"],
+            {"thumbnail": 200, "medium": 500, "large": 1000},
+        )
+        data = ProductImageSerializer(product_image).data
+        self.assertEqual(data["src"], product_image.src.url)
+        self.assertTrue(data["renditions"]["large"].endswith("photo_large.jpg"))
+        self.assertEqual(set(data["srcset"]), {"image/webp", "image/jpeg"})
+        self.assertIn("photo_thumbnail.webp 200w", data["srcset"]["image/webp"])
+        names = get_rendition_names(product_image.src.name)
+        for name in names:
+            self.assertTrue(default_storage.exists(name), name)
+        with Image.open(default_storage.path(names[0])) as thumbnail:
+            self.assertEqual((thumbnail.format, thumbnail.size), ("WEBP", (200, 100)))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product_image.delete()
+        work(burst=True)
+        for name in names:
+            self.assertFalse(default_storage.exists(name), name)
+
+
+class GenerateRenditionsCommandTestCase(TransactionTestCase):
+    """Команда закрывает соединения перед запуском процессов"""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        category = Category.objects.create(title="Images", slug="images")
+        product = Product.objects.create(
+            title="Product", price=1, count=1, category=category
+        )
+        self.images = []
+        for _ in range(3):
+            image = io.BytesIO()
+            Image.new("RGB", (1600, 800), "white").save(image, "JPEG")
+            product_image = ProductImage(product=product)
+            product_image.src.save(
+                "photo.jpg", SimpleUploadedFile("photo.jpg", image.getvalue())
+            )
+            self.images.append(product_image)
+
+    def test_renders_in_batches(self):
+        output = io.StringIO()
+        call_command("generate_renditions", processes=1, batch_size=2, stdout=output)
+        self.assertIn("products images: 3 of 3", output.getvalue())
+        for image in self.images:
+            image.refresh_from_db()
+            self.assertEqual(image.renditions["src"], image.src.name)
+        card = serialize_product_cards(get_card_rows(Product.objects.all()))[0]
+        self.assertEqual(card["images"][0]["src"], self.images[0].src.url)
+        self.assertEqual(
+            set(card["images"][0]["renditions"]), {"thumbnail", "medium", "large"}
+        )
+
+
+class StaticFilesApplicationTestCase(TestCase):
+    def setUp(self):
+        static_root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, static_root, ignore_errors=True)
+        settings = override_settings(STATIC_ROOT=static_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.path = static_root / "app.css"
+        self.path.write_text("body { color: black; }\n" * 100)
+        compress_file(self.path)
+        self.application = StaticFilesApplication(self.fallback)
+
+    @staticmethod
+    def fallback(environ, start_response):
+        start_response("404 Not Found", [])
+        return [b"django"]
+
+    def request(self, path, **headers):
+        environ = {"REQUEST_METHOD": "GET", "PATH_INFO": path, **headers}
+        response = {}
+
+        def start_response(status, response_headers):
+            response["status"] = status
+            response["headers"] = dict(response_headers)
+
+        response["body"] = b"".join(self.application(environ, start_response))
+        return response
+
+    def test_compressed_variant(self):
+        response = self.request("/static/app.css", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["status"], "200 OK")
+        self.assertEqual(response["headers"]["Content-Encoding"], "gzip")
+        self.assertEqual(response["headers"]["Vary"], "Accept-Encoding")
+        self.assertEqual(gzip.decompress(response["body"]), self.path.read_bytes())
+
+        response = self.request("/static/app.css")
+        self.assertNotIn("Content-Encoding", response["headers"])
+        self.assertEqual(response["body"], self.path.read_bytes())
+
+    def test_encoding_quality_values(self):
+        response = self.request(
+            "/static/app.css", HTTP_ACCEPT_ENCODING="gzip;q=0.5, br;q=1"
+        )
+        self.assertEqual(response["headers"]["Content-Encoding"], "br")
+        response = self.request("/static/app.css", HTTP_ACCEPT_ENCODING="br;q=0, gzip")
+        self.assertEqual(response["headers"]["Content-Encoding"], "gzip")
+        response = self.request(
+            "/static/app.css", HTTP_ACCEPT_ENCODING="gzip;q=0, br;q=0.0, *"
+        )
+        self.assertNotIn("Content-Encoding", response["headers"])
+        self.assertEqual(response["body"], self.path.read_bytes())
+
+    def test_asgi(self):
+        async def fallback(scope, receive, send):
+            await send({"type": "http.response.start", "status": 404, "headers": []})
+            await send({"type": "http.response.body", "body": b"django"})
+
+        application = AsyncStaticFilesApplication(fallback)
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        def request(path, headers):
+            messages.clear()
+            scope = {"type": "http", "method": "GET", "path": path, "headers": headers}
+            async_to_sync(application)(scope, None, send)
+            return messages[0], b"".join(message["body"] for message in messages[1:])
+
+        start, body = request("/static/app.css", [(b"accept-encoding", b"gzip")])
+        self.assertEqual(start["status"], 200)
+        self.assertIn((b"content-encoding", b"gzip"), start["headers"])
+        self.assertEqual(gzip.decompress(body), self.path.read_bytes())
+        start, body = request("/static/missing.css", [])
+        self.assertEqual((start["status"], body), (404, b"django"))
+
+    def test_conditional_request(self):
+        etag = self.request("/static/app.css")["headers"]["ETag"]
+        response = self.request("/static/app.css", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response["status"], "304 Not Modified")
+        self.assertEqual(response["body"], b"")
+
+    def test_etag_per_encoding(self):
+        etags = {}
+        for encoding in ("gzip", "br", "identity"):
+            response = self.request("/static/app.css", HTTP_ACCEPT_ENCODING=encoding)
+            etags[encoding] = response["headers"]["ETag"]
+        self.assertEqual(len(set(etags.values())), 3)
+
+        for encoding, etag in etags.items():
+            for other in etags:
+                response = self.request(
+                    "/static/app.css",
+                    HTTP_ACCEPT_ENCODING=other,
+                    HTTP_IF_NONE_MATCH=etag,
+                )
+                status = "304 Not Modified" if other == encoding else "200 OK"
+                self.assertEqual(response["status"], status, (encoding, other))
+
+    def test_missing_files_fall_through(self):
+        for path in ("/static/missing.css", "/static/../manage.py"):
+            self.assertEqual(self.request(path)["body"], b"django")
+
+
+class MetricsTestCase(TestCase):
+    def setUp(self):
+        clear_caches()
+        metrics_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, metrics_dir, ignore_errors=True)
+        settings = override_settings(METRICS_DIR=metrics_dir, METRICS_TOKEN="secret")
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.metrics_dir = metrics_dir
+        registry.reset()
+        Tag.objects.create(name="Sale")
+
+    def get_metrics(self):
+        response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], PROMETHEUS_CONTENT_TYPE)
+        return response.content.decode().splitlines()
+
+    def test_requires_token_or_staff(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer wrong")
+        self.assertEqual(response.status_code, 403)
+        admin = User.objects.create_user(username="admin", is_staff=True)
+        self.client.force_login(admin)
+        self.assertEqual(self.client.get("/metrics").status_code, 200)
+
+    def test_records_requests_by_route(self):
+        tags = self.client.get(reverse("api:tags"))
+        self.client.get(reverse("api:tags"))
+        self.client.get(reverse("api:product_details", kwargs={"pk": 0}))
+        self.client.get("/missing/route")
+        lines = self.get_metrics()
+        labels = 'route="api:tags",method="GET"'
+        self.assertIn(f'megano_http_requests_total{{{labels},status="200"}} 2', lines)
+        self.assertIn(
+            'megano_http_requests_total{route="api:product_details",method="GET",'
+            'status="404"} 1',
+            lines,
+        )
+        self.assertIn(
+            f'megano_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 2',
+            lines,
+        )
+        self.assertIn(
+            f"megano_http_response_size_bytes_sum{{{labels}}} "
+            f"{len(tags.content) * 2}",
+            lines,
+        )
+        self.assertIn(f"megano_http_db_queries_total{{{labels}}} 1", lines)
+        self.assertFalse([line for line in lines if "missing" in line])
+
+    def test_sums_metrics_of_worker_processes(self):
+        self.client.get(reverse("api:tags"))
+        labels = [["route", "api:tags"], ["method", "GET"], ["status", "200"]]
+        (self.metrics_dir / "1.json").write_text(
+            json.dumps(
+                {
+                    "counters": [["megano_http_requests_total", labels, 5]],
+                    "histograms": [],
+                }
+            )
+        )
+        self.assertIn(
+            'megano_http_requests_total{route="api:tags",method="GET",status="200"} 6',
+            self.get_metrics(),
+        )
+        self.assertTrue(list(self.metrics_dir.glob("*.json")))
+
+    def test_stale_worker_files_are_removed(self):
+        stale = self.metrics_dir / "2.json"
+        stale.write_text(json.dumps({"counters": [], "histograms": []}))
+        os.utime(stale, (0, 0))
+        self.get_metrics()
+        self.assertFalse(stale.exists())
+
+    def test_requests_do_not_write_files(self):
+        self.client.get(reverse("api:tags"))
+        self.get_metrics()
+        path = self.metrics_dir / f"{os.getpid()}.json"
+        self.assertFalse(path.exists())
+        registry.flush()
+        self.assertTrue(path.exists())
+        registry.close()
+        self.assertFalse(path.exists())
+
+    def test_async_middleware(self):
+        async def get_response(request):
+            await Tag.objects.acount()
+            return HttpResponse(b"tags")
+
+        request = RequestFactory().get(reverse("api:tags"))
+        request.resolver_match = resolve(reverse("api:tags"))
+        middleware = MetricsMiddleware(get_response)
+        response = async_to_sync(middleware)(request)
+        self.assertEqual(response.content, b"tags")
+        self.assertIn(
+            'megano_http_db_queries_total{route="api:tags",method="GET"} 1',
+            self.get_metrics(),
+        )
+
+
+class SQLitePragmasTestCase(TestCase):
+    def test_pragmas_are_applied(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("SQLite only")
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            self.assertEqual(cursor.fetchone()[0], "wal")
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], 20000)
+
+
+def create_catalog(products=2000, reviews_per_product=3, images_per_product=2):
+    """
+    Создает каталог для тестов производительности: три уровня категорий,
+    тэги, товары с изображениями, характеристиками, отзывами и распродажами
+    """
+    user = User.objects.create_user(username="reviewer", password="reviewer")
+    categories = []
+    for root_index in range(4):
+        root = Category.objects.create(
+            title=f"Root {root_index}", slug=f"r{root_index}"
+        )
+        for child_index in range(3):
+            child = Category.objects.create(
+                title=f"Child {root_index}.{child_index}",
+                slug=f"c{root_index}{child_index}",
+                parent=root,
+            )
+            for leaf_index in range(2):
+                categories.append(
+                    Category.objects.create(
+                        title=f"Leaf {root_index}.{child_index}.{leaf_index}",
+                        slug=f"l{root_index}{child_index}{leaf_index}",
+                        parent=child,
+                    )
+                )
+    tags = Tag.objects.bulk_create([Tag(name=f"tag {index}") for index in range(20)])
+    rates = [(index % 5) + 1 for index in range(reviews_per_product)]
+    Product.objects.bulk_create(
+        [
+            Product(
+                title=f"Product {index}",
+                description=f"Description of product {index}",
+                price=100 + index,
+                count=index % 7,
+                category=categories[index % len(categories)],
+                freeDelivery=index % 2 == 0,
+                limited_edition=index % 50 == 0,
+                rating=sum(rates) / len(rates) if rates else None,
+                rating_sum=sum(rates),
+                reviews_count=len(rates),
+                **{
+                    f"rating_count_{rate}": rates.count(rate)
+                    for rate in RATING_HISTOGRAM_RATES
+                },
+            )
+            for index in range(products)
+        ]
+    )
+    product_ids = list(Product.objects.values_list("pk", flat=True))
+    ProductImage.objects.bulk_create(
+        [
+            ProductImage(product_id=pk, src=f"products/product_{pk}/images/{index}.jpg")
+            for pk in product_ids
+            for index in range(images_per_product)
+        ]
+    )
+    Specification.objects.bulk_create(
+        [
+            Specification(product_id=pk, name="Weight", value=f"{pk % 10} kg")
+            for pk in product_ids
+        ]
+    )
+    ProductTag.objects.bulk_create(
+        [ProductTag(product_id=pk, tag=tags[pk % len(tags)]) for pk in product_ids]
+    )
+    Review.objects.bulk_create(
+        [
+            Review(
+                user=user,
+                product_id=pk,
+                author="Reviewer",
+                email="reviewer@example.com",
+                text="Review text",
+                rate=rate,
+            )
+            for pk in product_ids
+            for rate in rates
+        ]
+    )
+    now = timezone.now()
+    Sale.objects.bulk_create(
+        [
+            Sale(
+                product_id=pk,
+                salePrice=50,
+                dateFrom=now - timedelta(days=1),
+                dateTo=now + timedelta(days=1),
+            )
+            for pk in product_ids[::10]
+        ]
+    )
+    get_search_backend().rebuild()
+    return product_ids
+
+
+class ProductCardsTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_catalog(products=60)
+        Product.objects.filter(pk__in=Product.objects.order_by("pk")[:5]).update(
+            title="Phone 6/128", rating=None, reviews_count=0
+        )
+        image = ProductImage.objects.order_by("pk").first()
+        image.renditions = {
+            "src": image.src.name,
+            "widths": {"thumbnail": 200, "medium": 500, "large": 640},
+        }
+        image.save()
+        Product.objects.create(
+            title="Bare\u2028product",
+            price=Decimal("10.50"),
+            category=Category.objects.first(),
+        )
+
+    def setUp(self):
+        clear_caches()
+
+    def test_cards_match_catalog_serializer(self):
+        products = Product.objects.prefetch_related("tags", "images")
+        for sort in ("pk", "-price", "rating", "-date", "title"):
+            with self.subTest(sort=sort):
+                queryset = products.order_by(sort, "pk")
+                expected = JSONRenderer().render(
+                    CatalogSerializer(queryset, many=True).data
+                )
+                with self.assertNumQueries(3):
+                    rows = list(get_card_rows(queryset))
+                    cards = serialize_product_cards(rows)
+                self.assertEqual(FastJSONRenderer().render(cards), expected)
+
+    def test_catalog_cursor_pages(self):
+        params = {"filter[minPrice]": 0, "filter[maxPrice]": 1000, "sort": "price"}
+        params["cursor"] = ""
+        product_ids = []
+        while params["cursor"] is not None:
+            response = self.client.get(reverse("api:catalog"), params)
+            product_ids += [item["id"] for item in response.data["items"]]
+            params["cursor"] = response.data["nextCursor"]
+        expected = Product.objects.order_by("price", "pk").values_list("pk", flat=True)
+        self.assertEqual(product_ids, list(expected))
+
+    def get_cursor_pages(self, params):
+        params = {**params, "cursor": ""}
+        product_ids = []
+        pages = []
+        while params["cursor"] is not None:
+            response = self.client.get(reverse("api:catalog"), params)
+            self.assertEqual(response.status_code, 200)
+            product_ids += [item["id"] for item in response.data["items"]]
+            pages.append(response.data["currentPage"])
+            params["cursor"] = response.data["nextCursor"]
+        return product_ids, pages
+
+    def test_cursor_pages_with_null_sort_values(self):
+        self.assertEqual(Product.objects.filter(rating=None).count(), 6)
+        for sort_type, order in (
+            ("inc", ("rating", "pk")),
+            ("dec", ("-rating", "-pk")),
+        ):
+            with self.subTest(sort_type=sort_type):
+                product_ids, pages = self.get_cursor_pages(
+                    {"sort": "rating", "sortType": sort_type}
+                )
+                expected = Product.objects.order_by(*order).values_list("pk", flat=True)
+                self.assertEqual(product_ids, list(expected))
+                self.assertEqual(pages, [1, 2, 3, 4])
+
+    def test_tampered_cursor_keeps_keyset_position(self):
+        product = Product.objects.order_by("price", "pk")[10]
+        cursor = base64.urlsafe_b64encode(
+            json.dumps({"v": str(product.price), "id": product.pk, "p": 7}).encode()
+        ).decode()
+        response = self.client.get(
+            reverse("api:catalog"), {"sort": "price", "cursor": cursor}
+        )
+        expected = Product.objects.order_by("price", "pk").values_list("pk", flat=True)
+        self.assertEqual(
+            [item["id"] for item in response.data["items"]], list(expected[11:31])
+        )
+        # номер страницы берется из курсора и не влияет на выборку
+        self.assertEqual(response.data["currentPage"], 8)
+
+    def test_invalid_cursor_is_not_found(self):
+        cursors = [
+            "not base64!",
+            "[1, 2]",
+            '{"v": 1}',
+            '{"v": 1, "id": "1", "p": 0}',
+            '{"v": [1], "id": 1, "p": 0}',
+            '{"v": "cheap", "id": 1, "p": 0}',
+            '{"v": null, "id": null, "p": 0}',
+            '"cursor"',
+        ]
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                encoded = base64.urlsafe_b64encode(cursor.encode()).decode()
+                response = self.client.get(
+                    reverse("api:catalog"),
+                    {"sort": "price", "cursor": cursor if "!" in cursor else encoded},
+                )
+                self.assertEqual(response.status_code, 404)
+
+    def test_renderer_falls_back_to_json_renderer(self):
+        data = {
+            "date": timezone.now(),
+            "price": Decimal("1.50"),
+            "histogram": {1: 2},
+            "text": "line\u2028separator",
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class EndpointPerformanceTestCase(TestCase):
+    """
+    Проверяет число запросов и время ответа каждого маршрута api
+    на каталоге из нескольких тысяч товаров.
+    Бюджеты хранятся в performance_budgets.json
+    """
+
+    budgets = json.loads(
+        (Path(__file__).parent / "performance_budgets.json").read_text()
+    )
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        media_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        cls.enterClassContext(override_settings(MEDIA_ROOT=media_root))
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product_ids = create_catalog()
+        cls.product_id = cls.product_ids[0]
+        cls.user = User.objects.create_user(username="buyer", password="password")
+        profile = Profile.objects.create(user=cls.user, fullName="Buyer")
+        ProfileAvatar.objects.create(profile=profile)
+        basket = Basket.objects.create(user=cls.user)
+        BasketItem.objects.bulk_create(
+            [
+                BasketItem(basket=basket, product_id=pk, count=2)
+                for pk in cls.product_ids[1:11]
+            ]
+        )
+        cls.order = Order.objects.create(
+            user=cls.user, status=Order.STATUS_ACCEPTED, totalCost=1000
+        )
+        OrderItem.objects.bulk_create(
+            [
+                OrderItem(order=cls.order, product_id=pk, price=100, count=1)
+                for pk in cls.product_ids[1:11]
+            ]
+        )
+
+    def setUp(self):
+        clear_caches()
+
+    def login(self):
+        self.client.force_login(self.user)
+
+    def assertWithinBudget(self, name, method, path, *args, **kwargs):
+        budget = self.budgets[name]
+        clear_caches()
+        with CaptureQueriesContext(connection) as context:
+            started = time.perf_counter()
+            response = getattr(self.client, method)(path, *args, **kwargs)
+            elapsed = (time.perf_counter() - started) * 1000
+        self.assertLess(response.status_code, 400, response.content[:500])
+        queries = "\n".join(query["sql"] for query in context.captured_queries)
+        self.assertLessEqual(
+            len(context),
+            budget["queries"],
+            f"{name}: {len(context)} queries exceed budget of {budget['queries']}\n"
+            f"{queries}",
+        )
+        self.assertLessEqual(
+            elapsed,
+            budget["ms"],
+            f"{name}: {elapsed:.0f} ms exceed budget of {budget['ms']} ms",
+        )
+        return response
+
+    def test_every_route_has_budget(self):
+        routes = {pattern.name for pattern in urlpatterns}
+        self.assertEqual(routes, set(self.budgets))
+
+    def test_sign_in(self):
+        data = json.dumps({"username": "buyer", "password": "password"})
+        self.assertWithinBudget(
+            "sign-in",
+            "post",
+            reverse("api:sign-in"),
+            data,
+            content_type="application/x-www-form-urlencoded",
+        )
+
+    def test_sign_up(self):
+        data = json.dumps({"name": "New", "username": "new", "password": "password"})
+        self.assertWithinBudget(
+            "sign-up",
+            "post",
+            reverse("api:sign-up"),
+            data,
+            content_type="application/x-www-form-urlencoded",
+        )
+
+    # LogoutView отвечает шаблоном админки со статикой, а manifest
+    # для хэшированных имен без DEBUG создается только collectstatic
+    @override_settings(
+        STORAGES={
+            "default": {"BACKEND": "api.storage.QueuedDeleteStorage"},
+            "staticfiles": {
+                "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"
+            },
+        }
+    )
+    def test_sign_out(self):
+        self.login()
+        self.assertWithinBudget("sign-out", "post", reverse("api:sign-out"))
+
+    def test_categories(self):
+        response = self.assertWithinBudget(
+            "categories", "get", reverse("api:categories")
+        )
+        self.assertEqual(len(response.json()), 4)
+
+    def test_catalog(self):
+        params = {
+            "filter[name]": "",
+            "filter[minPrice]": 0,
+            "filter[maxPrice]": 50000,
+            "filter[freeDelivery]": "true",
+            "filter[available]": "true",
+            "currentPage": 5,
+            "category": Category.objects.filter(parent=None).first().pk,
+            "sort": "rating",
+            "sortType": "dec",
+        }
+        response = self.assertWithinBudget(
+            "catalog", "get", reverse("api:catalog"), params
+        )
+        self.assertEqual(len(response.data["items"]), 20)
+
+    def test_catalog_facets(self):
+        params = {
+            "filter[minPrice]": 0,
+            "filter[maxPrice]": 50000,
+            "filter[available]": "true",
+            "category": Category.objects.filter(parent=None).first().pk,
+            "tags[]": [Tag.objects.first().pk],
+        }
+        response = self.assertWithinBudget(
+            "catalog_facets", "get", reverse("api:catalog_facets"), params
+        )
+        self.assertGreater(response.data["total"], 0)
+
+    def test_popular_products(self):
+        self.assertWithinBudget(
+            "popular_products", "get", reverse("api:popular_products")
+        )
+
+    def test_limited_products(self):
+        self.assertWithinBudget(
+            "limited_products", "get", reverse("api:limited_products")
+        )
+
+    def test_sales(self):
+        self.assertWithinBudget("sales", "get", reverse("api:sales"))
+
+    def test_banners(self):
+        self.assertWithinBudget("banners", "get", reverse("api:banners"))
+
+    def test_basket(self):
+        self.login()
+        response = self.assertWithinBudget("basket", "get", reverse("api:basket"))
+        self.assertEqual(len(response.data), 10)
+        self.assertWithinBudget(
+            "basket",
+            "post",
+            reverse("api:basket"),
+            {"id": self.product_ids[20], "count": 1},
+            content_type="application/json",
+        )
+        self.assertWithinBudget(
+            "basket",
+            "delete",
+            reverse("api:basket"),
+            {"id": self.product_ids[1], "count": 1},
+            content_type="application/json",
+        )
+
+    def test_profile(self):
+        self.login()
+        self.assertWithinBudget("profile", "get", reverse("api:profile"))
+        self.assertWithinBudget(
+            "profile",
+            "post",
+            reverse("api:profile"),
+            {"fullName": "Buyer Name", "email": "buyer@example.com"},
+            content_type="application/json",
+        )
+
+    def test_avatar(self):
+        self.login()
+        image = io.BytesIO()
+        Image.new("RGB", (600, 400), "white").save(image, "JPEG")
+        avatar = SimpleUploadedFile("avatar.jpg", image.getvalue(), "image/jpeg")
+        self.assertWithinBudget(
+            "avatar", "post", reverse("api:avatar"), {"avatar": avatar}
+        )
+
+    def test_password(self):
+        self.login()
+        self.assertWithinBudget(
+            "password",
+            "post",
+            reverse("api:password"),
+            {"currentPassword": "password", "newPassword": "new-password"},
+            content_type="application/json",
+        )
+
+    def test_tags(self):
+        self.assertWithinBudget("tags", "get", reverse("api:tags"))
+
+    def test_product_details(self):
+        response = self.assertWithinBudget(
+            "product_details",
+            "get",
+            reverse("api:product_details", kwargs={"pk": self.product_id}),
+        )
+        self.assertEqual(response.data["id"], self.product_id)
+
+    def test_reviews(self):
+        response = self.assertWithinBudget(
+            "review_create",
+            "get",
+            reverse("api:review_create", kwargs={"product_id": self.product_id}),
+        )
+        self.assertEqual(len(response.data["items"]), 3)
+
+    def test_review_create(self):
+        self.login()
+        self.assertWithinBudget(
+            "review_create",
+            "post",
+            reverse("api:review_create", kwargs={"product_id": self.product_id}),
+            {"author": "Buyer", "email": "buyer@example.com", "text": "ok", "rate": 5},
+            content_type="application/json",
+        )
+
+    def test_orders(self):
+        self.login()
+        response = self.assertWithinBudget("orders", "get", reverse("api:orders"))
+        self.assertEqual(len(response.data[0]["products"]), 10)
+        available = Product.objects.filter(count__gt=0).values_list("pk", flat=True)
+        items = [{"id": pk, "count": 1} for pk in available[:10]]
+        self.assertWithinBudget(
+            "orders",
+            "post",
+            reverse("api:orders"),
+            items,
+            content_type="application/json",
+        )
+
+    def test_order_details(self):
+        self.login()
+        path = reverse("api:order_details", kwargs={"pk": self.order.pk})
+        self.assertWithinBudget("order_details", "get", path)
+        self.assertWithinBudget(
+            "order_details",
+            "post",
+            path,
+            {"fullName": "Buyer", "city": "Moscow", "address": "Red square 1"},
+            content_type="application/json",
+        )
+
+    def test_order(self):
+        self.login()
+        path = reverse("api:order", kwargs={"pk": self.order.pk})
+        response = self.assertWithinBudget("order", "get", path)
+        self.assertEqual(len(response.data["products"]), 10)
+        self.assertWithinBudget(
+            "order",
+            "post",
+            path,
+            {"fullName": "Buyer", "city": "Moscow", "address": "Red square 1"},
+            content_type="application/json",
+        )
+
+    def test_payment(self):
+        self.login()
+        self.assertWithinBudget(
+            "payment",
+            "post",
+            reverse("api:payment", kwargs={"pk": self.order.pk}),
+            {"number": "12345678", "name": "Buyer", "code": "123"},
+            content_type="application/json",
+        )
@@ -1,59 +1,69 @@
+from api import async_views, views
 from api.views import (
     AvatarUpdateView,
-    BannerListView,
-    CatalogListView,
-    CategoryListView,
+    CatalogFacetsView,
     LimitedProductsListView,
     PasswordUpdateView,
     PopularProductsListView,
-    ProductDetailView,
     ProfileView,
-    ReviewCreateView,
-    SaleListView,
+    ReviewListCreateView,
     SignInView,
     SignUpView,
-    TagListView,
     BasketViewSet,
+    OrderDetailView,
+    OrderListView,
+    PaymentView,
 )
+from django.conf import settings
 from django.contrib.auth.views import LogoutView
 from django.urls import path
 
 app_name = "api"
 
+# Read-only endpoints under ASGI are served by async views with the same responses
+read_views = async_views if settings.ASYNC_READ_VIEWS else views
+
 urlpatterns = [
     # auth
     path("sign-in", SignInView.as_view(), name="sign-in"),
     path("sign-up", SignUpView.as_view(), name="sign-up"),
     path("sign-out", LogoutView.as_view(), name="sign-out"),
     # catalog
-    path("categories", CategoryListView.as_view(), name="categories"),
-    path("catalog", CatalogListView.as_view(), name="catalog"),
+    path("categories", read_views.CategoryListView.as_view(), name="categories"),
+    path("catalog", read_views.CatalogListView.as_view(), name="catalog"),
+    path("catalog/facets", CatalogFacetsView.as_view(), name="catalog_facets"),
     path(
         "products/popular", PopularProductsListView.as_view(), name="popular_products"
     ),
     path(
         "products/limited", LimitedProductsListView.as_view(), name="limited_products"
     ),
-    path("sales", SaleListView.as_view(), name="sales"),
-    path("banners", BannerListView.as_view(), name="banners"),
+    path("sales", read_views.SaleListView.as_view(), name="sales"),
+    path("banners", read_views.BannerListView.as_view(), name="banners"),
     # basket
     path("basket", BasketViewSet.as_view(), name="basket"),
     # order
-    # path("orders", , name="orders"),
-    # path("orders/<int:pk>", , name="order_details"),
+    path("orders", OrderListView.as_view(), name="orders"),
+    path("orders/<int:pk>", OrderDetailView.as_view(), name="order_details"),
+    # order-detail.js requests the order and confirms it at /api/order/<pk>
+    path("order/<int:pk>", OrderDetailView.as_view(), name="order"),
     # payment
-    # path("payment", , name="payment"),
+    path("payment/<int:pk>", PaymentView.as_view(), name="payment"),
     # profile
     path("profile", ProfileView.as_view(), name="profile"),
     path("profile/avatar", AvatarUpdateView.as_view(), name="avatar"),
     path("profile/password", PasswordUpdateView.as_view(), name="password"),
     # tags
-    path("tags", TagListView.as_view(), name="tags"),
+    path("tags", read_views.TagListView.as_view(), name="tags"),
     # product
-    path("product/<int:pk>", ProductDetailView.as_view(), name="product_details"),
+    path(
+        "product/<int:pk>",
+        read_views.ProductDetailView.as_view(),
+        name="product_details",
+    ),
     path(
         "product/<int:product_id>/reviews",
-        ReviewCreateView.as_view(),
+        ReviewListCreateView.as_view(),
         name="review_create",
     ),
 ]
@@ -1,11 +1,8 @@
 import json
-import random
-from math import ceil
 
 from rest_framework.viewsets import ModelViewSet
 
 from api.models import (
-    Category,
     Product,
     Profile,
     ProfileAvatar,
@@ -13,11 +10,12 @@ from api.models import (
     Sale,
     Tag,
     Basket,
-    BasketItem,
+    Order,
+    avatar_directory_path,
 )
+from api.orders import OutOfStock, confirm_order, create_order, get_orders, pay_order
 from api.serializers import (
     CatalogSerializer,
-    CategorySerializer,
     LoginSerializer,
     PasswordSerializer,
     ProductSerializer,
@@ -27,64 +25,97 @@ from api.serializers import (
     TagSerializer,
     UserSerializer,
     BasketSerializer,
+    OrderSerializer,
+    OrderConfirmSerializer,
+    PaymentSerializer,
 )
+from api.banners import banner_pool
+from api.basket import (
+    add_to_basket,
+    add_to_session_basket,
+    get_basket_items,
+    get_session_basket_items,
+    merge_session_basket,
+    remove_from_basket,
+    remove_from_session_basket,
+)
+from api.catalog import get_catalog_facets, get_catalog_queryset
+from api.category_tree import get_category_tree_json
+from api.pagination import CustomPagination, ReviewPagination
+from api.popularity import get_popular_products_updated, refresh_popular_products
+from api.product_cards import ProductCardListMixin
+from api.response_cache import CachedResponseMixin
+from api.tasks import enqueue, process_avatar
+from django.conf import settings
 from django.contrib.auth import authenticate, login
 from django.contrib.auth.hashers import check_password, make_password
-from django.db.models import Avg, Count, F
-from rest_framework import pagination, status
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework import status
 from rest_framework.generics import (
-    CreateAPIView,
     ListAPIView,
+    ListCreateAPIView,
     RetrieveAPIView,
     UpdateAPIView,
 )
 from rest_framework.mixins import UpdateModelMixin
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 
-class CustomPagination(pagination.PageNumberPagination):
-    page_query_param = "currentPage"
-    page_size = 20
+class ProductDetailView(CachedResponseMixin, RetrieveAPIView):
+    """
+    Товар с последними отзывами и гистограммой оценок.
+    Собирается за пять запросов независимо от числа отзывов
+    """
 
-    def get_paginated_response(self, data):
-        last_page = ceil(self.page.paginator.count / self.page_size)
-        return Response(
-            {
-                "items": data,
-                "currentPage": self.page.number,
-                "lastPage": last_page,
-            }
-        )
+    queryset = Product.objects.prefetch_related("tags", "images", "specifications")
+    serializer_class = ProductSerializer
 
+    def get_object(self):
+        product = super().get_object()
+        product.latest_reviews = list(
+            product.reviews.order_by("-pk")[: settings.PRODUCT_LATEST_REVIEWS]
+        )
+        return product
 
-class ProductDetailView(RetrieveAPIView):
-    queryset = Product.objects.annotate(rating=Avg("reviews__rate")).prefetch_related(
-        "tags"
-    )
-    serializer_class = ProductSerializer
+    def get_cache_tags(self):
+        return ["product", f"product:{self.kwargs['pk']}"]
 
 
-class PopularProductsListView(ListAPIView):
-    queryset = (
-        Product.objects.annotate(
-            rating=Avg("reviews__rate"), reviews_count=Count("reviews")
-        )
-        .prefetch_related("tags")
-        .order_by("-rating")[:8]
+class PopularProductsListView(ProductCardListMixin, ListAPIView):
+    queryset = Product.objects.filter(popularity__isnull=False).order_by(
+        "popularity__position"
     )
     serializer_class = CatalogSerializer
     pagination_class = None
 
+    def get_queryset(self):
+        self.updated = get_popular_products_updated()
+        if self.updated is None:
+            ranking = refresh_popular_products()
+            self.updated = ranking[0].updated if ranking else None
+        return super().get_queryset().prefetch_related("tags", "images")
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if self.updated is not None:
+            response["Last-Modified"] = http_date(self.updated.timestamp())
+            response["Expires"] = http_date(
+                self.updated.timestamp() + settings.POPULAR_PRODUCTS_REFRESH_INTERVAL
+            )
+        return response
 
-class LimitedProductsListView(ListAPIView):
-    queryset = (
-        Product.objects.annotate(
-            rating=Avg("reviews__rate"), reviews_count=Count("reviews")
-        )
-        .prefetch_related("tags")
-        .filter(limited_edition=True)
+
+class LimitedProductsListView(ProductCardListMixin, ListAPIView):
+    queryset = Product.objects.prefetch_related("tags", "images").filter(
+        limited_edition=True
     )
     serializer_class = CatalogSerializer
     pagination_class = None
@@ -95,73 +126,45 @@ class BannerListView(ListAPIView):
     pagination_class = None
 
     def get_queryset(self):
-        product_ids = list(Product.objects.values_list("id", flat=True))
-        random_product_ids = random.sample(product_ids, min(len(product_ids), 3))
-        queryset = (
-            Product.objects.annotate(
-                rating=Avg("reviews__rate"), reviews_count=Count("reviews")
-            )
-            .filter(id__in=random_product_ids)
-            .prefetch_related("specifications", "images", "tags")
+        random_product_ids = banner_pool.sample(settings.BANNERS_COUNT)
+        queryset = Product.objects.filter(id__in=random_product_ids).prefetch_related(
+            "images", "tags"
         )
         return queryset
 
 
-class CatalogListView(ListAPIView):
+class CatalogListView(CachedResponseMixin, ProductCardListMixin, ListAPIView):
     serializer_class = CatalogSerializer
     pagination_class = CustomPagination
+    cache_tags = ["catalog"]
 
     def get_queryset(self):
-        queryset = Product.objects.annotate(
-            rating=Avg("reviews__rate"), reviews_count=Count("reviews")
-        ).prefetch_related("specifications", "tags", "images")
-
-        query_params = self.request.query_params
-
-        categories = []
-
-        def get_all_subcategories(category):
-            categories.append(category.id)
-            children = category.get_children()
-            if children is None:
-                return
-            list(map(get_all_subcategories, children))
-
-        if query_params.get("category") is not None:
-            category = Category.objects.get(id=int(query_params.get("category")))
-            get_all_subcategories(category)
-            queryset = queryset.filter(category__in=categories)
-        if query_params.get("tags[]") is not None:
-            queryset = queryset.filter(
-                tags__in=map(int, query_params.getlist("tags[]"))
-            )
-        if query_params.get("filter[freeDelivery]") == "true":
-            queryset = queryset.filter(freeDelivery=True)
-        if query_params.get("filter[available]") == "true":
-            queryset = queryset.exclude(count=0)
-        if query_params.get("sortType") == "dec":
-            sort = "-" + query_params.get("sort")
-        else:
-            sort = query_params.get("sort")
+        return get_catalog_queryset(self.request.query_params)
 
-        queryset = queryset.filter(
-            title__icontains=query_params.get("filter[name]"),
-            price__range=[
-                int(query_params.get("filter[minPrice]")),
-                int(query_params.get("filter[maxPrice]")),
-            ],
-        ).order_by(sort)
 
-        return queryset
+class CatalogFacetsView(APIView):
+    """
+    Фасеты каталога для текущего набора фильтров:
+    диапазон цен, количество товаров по тэгам, с бесплатной доставкой и в наличии
+    """
+
+    def get(self, request):
+        return Response(get_catalog_facets(request.query_params))
 
 
-class ReviewCreateView(CreateAPIView):
+class ReviewListCreateView(CachedResponseMixin, ListCreateAPIView):
+    """Отзывы о товаре от новых к старым с курсорной пагинацией"""
+
     serializer_class = ReviewSerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = ReviewPagination
 
     def get_queryset(self):
         product_id = self.kwargs.get("product_id")
-        return Review.objects.filter(product_id=product_id).all()
+        return Review.objects.filter(product_id=product_id).order_by("-pk")
+
+    def get_cache_tags(self):
+        return ["product", f"product:{self.kwargs['product_id']}"]
 
     def perform_create(self, serializer):
         serializer.save(
@@ -208,8 +211,12 @@ class ProfileView(RetrieveAPIView, UpdateModelMixin):
 class AvatarUpdateView(APIView):
     def post(self, request):
         avatar = self.request.user.profile.avatar
-        avatar.src = request.FILES["avatar"]
-        avatar.save(update_fields=["src"])
+        upload = request.FILES["avatar"]
+        # Уменьшение и удаление старой аватарки выполняет фоновая задача
+        upload_name = default_storage.save(
+            avatar_directory_path(avatar, f"uploads/{upload.name}"), upload
+        )
+        enqueue(process_avatar, avatar.pk, upload_name)
         return Response(status=status.HTTP_200_OK)
 
 
@@ -231,6 +238,7 @@ def user_login(request, data):
     user = authenticate(request, username=data["username"], password=data["password"])
     if user is not None:
         login(request, user)
+        merge_session_basket(request.session, user)
         print(f"User {data['username']} login")
     else:
         print(f"User with {data} not exist")
@@ -248,24 +256,39 @@ def get_or_create_profile_and_avatar(user):
     return profile
 
 
-class TagListView(ListAPIView):
+class TagListView(CachedResponseMixin, ListAPIView):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
+    cache_tags = ["tags"]
 
 
-class CategoryListView(ListAPIView):
-    queryset = Category.objects.root_nodes()
-    serializer_class = CategorySerializer
-    pagination_class = None
+class CategoryListView(APIView):
+    def get(self, request):
+        content, etag, last_modified = get_category_tree_json()
+        response = get_conditional_response(
+            request, etag=etag, last_modified=int(last_modified)
+        )
+        if response is None:
+            response = HttpResponse(content, content_type="application/json")
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        return response
 
 
-class SaleListView(ListAPIView):
-    queryset = Sale.objects.select_related("product").prefetch_related(
-        "product__images"
+class SaleListView(CachedResponseMixin, ListAPIView):
+    queryset = (
+        Sale.objects.select_related("product")
+        .prefetch_related("product__images")
+        .order_by("pk")
     )
     serializer_class = SaleSerializer
     pagination_class = CustomPagination
+    cache_tags = ["sales"]
+
+    def get_queryset(self):
+        now = timezone.now()
+        return super().get_queryset().filter(dateFrom__lte=now, dateTo__gte=now)
 
 
 class BasketViewSet(ListAPIView):
@@ -273,44 +296,118 @@ class BasketViewSet(ListAPIView):
     pagination_class = None
 
     def get_queryset(self):
-        user = self.request.user
+        if not self.request.user.is_authenticated:
+            return get_session_basket_items(self.request.session)
+        self.basket, _ = Basket.objects.get_or_create(user=self.request.user)
+        return get_basket_items(self.basket)
+
+    def get_item_data(self):
         try:
-            self.basket = user.basket
-        except Basket.DoesNotExist:
-            self.basket = Basket.objects.create(user=user)
-
-        queryset = self.basket.basket_items.annotate(
-            rating=Avg("product__reviews__rate"),
-            reviews_count=Count("product__reviews"),
-        ).prefetch_related(
-            "product__reviews",
-            "product__tags",
-            "product__images",
-            "product__category",
-        )
-        return queryset
+            product_id = int(self.request.data["id"])
+            count = int(self.request.data.get("count", 1))
+        except (KeyError, TypeError, ValueError):
+            return None
+        if count < 1:
+            return None
+        return product_id, count
 
     def post(self, *args, **kwargs):
-        data = self.request.data
-        queryset = self.get_queryset()
-        basket_item = queryset.filter(product_id=data.get("id"))
-        if not basket_item.exists():
-            product = Product.objects.get(id=data.get("id"))
-            BasketItem.objects.create(basket=self.basket, product=product)
+        item_data = self.get_item_data()
+        if item_data is None:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        if self.request.user.is_authenticated:
             queryset = self.get_queryset()
+            if not add_to_basket(self.basket, *item_data):
+                return Response(status=status.HTTP_404_NOT_FOUND)
         else:
-            basket_item.update(count=F('count') + data["count"])
+            add_to_session_basket(self.request.session, *item_data)
+            queryset = self.get_queryset()
+            product_id, _ = item_data
+            if product_id not in (item.product_id for item in queryset):
+                return Response(status=status.HTTP_404_NOT_FOUND)
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     def delete(self, *args, **kwargs):
-        data = self.request.data
-        queryset = self.get_queryset()
-        basket_item = queryset.filter(product_id=data.get("id"))
-        basket_item_for_delete = queryset.filter(product_id=data.get("id"), count=data["count"])
-        if basket_item_for_delete.exists():
-            basket_item_for_delete.delete()
+        item_data = self.get_item_data()
+        if item_data is None:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        if self.request.user.is_authenticated:
+            queryset = self.get_queryset()
+            remove_from_basket(self.basket, *item_data)
         else:
-            basket_item.update(count=F('count') - data["count"])
+            remove_from_session_basket(self.request.session, *item_data)
+            queryset = self.get_queryset()
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class OrderListView(ListAPIView):
+    serializer_class = OrderSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = None
+
+    def get_queryset(self):
+        return get_orders(self.request.user)
+
+    def post(self, request):
+        items = {}
+        try:
+            for item in request.data:
+                product_id, count = int(item["id"]), int(item["count"])
+                if count < 1:
+                    raise ValueError(count)
+                items[product_id] = items.get(product_id, 0) + count
+        except (KeyError, TypeError, ValueError):
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        if not items:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        try:
+            order = create_order(request.user, items)
+        except OutOfStock as error:
+            return Response(
+                {"error": str(error), "productId": error.product_id},
+                status=status.HTTP_409_CONFLICT,
+            )
+        return Response({"orderId": order.pk}, status=status.HTTP_200_OK)
+
+
+class OrderDetailView(RetrieveAPIView):
+    serializer_class = OrderSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return get_orders(self.request.user)
+
+    def post(self, request, pk):
+        order = self.get_object()
+        if order.status not in Order.UNPAID_STATUSES:
+            return Response(status=status.HTTP_409_CONFLICT)
+        serializer = OrderConfirmSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            confirmed = confirm_order(order, serializer.validated_data)
+        except ValidationError as error:
+            return Response(error.message_dict, status=status.HTTP_400_BAD_REQUEST)
+        if not confirmed:
+            return Response(status=status.HTTP_409_CONFLICT)
+        return Response({"orderId": order.pk}, status=status.HTTP_200_OK)
+
+
+class PaymentView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, pk):
+        order = get_object_or_404(Order, pk=pk, user=request.user)
+        serializer = PaymentSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        if not pay_order(order, serializer.validated_data):
+            return Response(status=status.HTTP_409_CONFLICT)
+        if order.status != Order.STATUS_PAID:
+            return Response(
+                {"paymentError": order.paymentError},
+                status=status.HTTP_402_PAYMENT_REQUIRED,
+            )
+        return Response(status=status.HTTP_200_OK)
@@ -11,6 +11,11 @@ import os
 
 from django.core.asgi import get_asgi_application
 
+from megano.staticfiles import AsyncStaticFilesApplication
+
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "megano.settings")
+# Read-only API endpoints are served by async views, see api.async_views
+if not os.environ.get("DJANGO_ASYNC_READ_VIEWS"):
+    os.environ["DJANGO_ASYNC_READ_VIEWS"] = "1"
 
-application = get_asgi_application()
+application = AsyncStaticFilesApplication(get_asgi_application())
@@ -0,0 +1,19 @@
+import socket
+from functools import cache
+
+from django.conf import settings
+
+
+@cache
+def get_internal_ips() -> frozenset[str]:
+    """
+    Адреса, для которых показывается debug toolbar.
+    В docker запросы приходят с адреса шлюза сети контейнера (x.x.x.1)
+    """
+    _, _, ips = socket.gethostbyname_ex(socket.gethostname())
+    gateways = [ip[: ip.rfind(".")] + ".1" for ip in ips]
+    return frozenset(gateways + settings.INTERNAL_IPS)
+
+
+def show_toolbar(request) -> bool:
+    return settings.DEBUG and request.META.get("REMOTE_ADDR") in get_internal_ips()
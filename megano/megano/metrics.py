@@ -0,0 +1,382 @@
+import atexit
+import hmac
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Метрики: имя -> тип, описание и имя настройки с границами корзин гистограммы
+METRICS = {
+    "megano_http_requests_total": (
+        "counter",
+        "Requests by route, method and status code",
+        None,
+    ),
+    "megano_http_request_duration_seconds": (
+        "histogram",
+        "Request latency",
+        "METRICS_LATENCY_BUCKETS",
+    ),
+    "megano_http_response_size_bytes": (
+        "histogram",
+        "Response body size",
+        "METRICS_SIZE_BUCKETS",
+    ),
+    "megano_http_db_queries_total": (
+        "counter",
+        "Database queries executed by requests",
+        None,
+    ),
+    "megano_http_db_query_duration_seconds_total": (
+        "counter",
+        "Time spent in database queries",
+        None,
+    ),
+}
+
+
+class QueryTimer:
+    """Число и время запросов к базе данных за время обработки запроса"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+
+# Счетчик текущего запроса. Контекст копируется в потоки sync_to_async,
+# поэтому запросы асинхронных представлений учитываются так же, как синхронных
+current_queries: ContextVar[QueryTimer | None] = ContextVar(
+    "current_queries", default=None
+)
+
+
+def time_query(execute, sql, params, many, context):
+    """Обертка из connection.execute_wrappers, считающая запросы к базе данных"""
+    queries = current_queries.get()
+    if queries is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        queries.count += 1
+        queries.duration += time.perf_counter() - started
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs) -> None:
+    """
+    Подключает time_query к соединению один раз на все время его жизни.
+    Соединения принадлежат потокам, а запросы асинхронного представления
+    выполняются не в потоке middleware, поэтому обертка не ставится
+    через with connection.execute_wrapper() вокруг каждого запроса
+    """
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+class MetricsRegistry:
+    """
+    Метрики запросов в памяти процесса.
+    Фоновый поток раз в METRICS_FLUSH_INTERVAL секунд записывает снимок
+    в файл процесса в METRICS_DIR, а /metrics суммирует файлы всех процессов,
+    поэтому запросы не ждут записи на диск, а воркеры gunicorn
+    не конкурируют за запись. Файл удаляется при выходе процесса,
+    файлы, не обновлявшиеся METRICS_STALE_FLUSHES интервалов, считаются
+    файлами завершившихся процессов и удаляются при сборе метрик
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.pid = os.getpid()
+        self.counters = {}
+        self.histograms = {}
+        # Поток не переживает fork, в дочернем процессе запускается новый
+        self.flusher = None
+        self.closed = False
+
+    def start_flusher(self) -> None:
+        self.flusher = threading.Thread(
+            target=self.run_flusher, name="metrics-flush", daemon=True
+        )
+        self.flusher.start()
+
+    def run_flusher(self) -> None:
+        while self.flusher is threading.current_thread():
+            time.sleep(settings.METRICS_FLUSH_INTERVAL)
+            if self.flusher is not threading.current_thread():
+                break
+            try:
+                self.flush()
+            except OSError:
+                continue
+
+    def get_buckets(self, name: str) -> list:
+        return getattr(settings, METRICS[name][2])
+
+    def observe(self, route, method, status, duration, size, queries) -> None:
+        labels = (("route", route), ("method", method))
+        with self._lock:
+            # После fork воркер не должен повторно учитывать данные родителя
+            if self.pid != os.getpid():
+                self.reset()
+            if self.flusher is None:
+                self.start_flusher()
+            self.inc("megano_http_requests_total", labels + (("status", status),))
+            self.inc("megano_http_db_queries_total", labels, queries.count)
+            self.inc(
+                "megano_http_db_query_duration_seconds_total", labels, queries.duration
+            )
+            self.observe_histogram(
+                "megano_http_request_duration_seconds", labels, duration
+            )
+            if size is not None:
+                self.observe_histogram("megano_http_response_size_bytes", labels, size)
+
+    def inc(self, name, labels, value=1) -> None:
+        key = name, labels
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe_histogram(self, name, labels, value) -> None:
+        key = name, labels
+        buckets = self.get_buckets(name)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            # Счетчики корзин (последняя — +Inf), сумма и количество
+            histogram = self.histograms[key] = [[0] * (len(buckets) + 1), 0, 0]
+        histogram[0][bisect_left(buckets, value)] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "counters": [
+                    [name, list(labels), value]
+                    for (name, labels), value in self.counters.items()
+                ],
+                "histograms": [
+                    [name, list(labels), list(histogram[0]), histogram[1], histogram[2]]
+                    for (name, labels), histogram in self.histograms.items()
+                ],
+            }
+
+    def get_path(self) -> Path | None:
+        if not settings.METRICS_DIR:
+            return None
+        return Path(settings.METRICS_DIR) / f"{os.getpid()}.json"
+
+    def flush(self) -> None:
+        """Атомарно заменяет файл процесса его текущим снимком"""
+        path = self.get_path()
+        if path is None:
+            return
+        with self._flush_lock:
+            if self.closed:
+                return
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, temporary = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "w") as file:
+                json.dump(self.snapshot(), file)
+            os.replace(temporary, path)
+
+    def close(self) -> None:
+        """Удаляет файл процесса при выходе, см. atexit ниже"""
+        path = self.get_path()
+        with self._flush_lock:
+            self.closed = True
+            if path is not None:
+                path.unlink(missing_ok=True)
+
+    def collect(self) -> list[dict]:
+        """
+        Снимки всех процессов: текущего из памяти, остальных из файлов.
+        Устаревшие файлы завершившихся процессов удаляются
+        """
+        snapshots = [self.snapshot()]
+        path = self.get_path()
+        if path is None or not path.parent.is_dir():
+            return snapshots
+        stale_before = time.time() - (
+            settings.METRICS_FLUSH_INTERVAL * settings.METRICS_STALE_FLUSHES
+        )
+        for other in path.parent.glob("*.json"):
+            if other == path:
+                continue
+            try:
+                if other.stat().st_mtime < stale_before:
+                    other.unlink(missing_ok=True)
+                    continue
+                snapshots.append(json.loads(other.read_text()))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+
+registry = MetricsRegistry()
+atexit.register(registry.close)
+
+
+def merge_snapshots(snapshots) -> tuple[dict, dict]:
+    """
+    Суммирует снимки процессов. Гистограммы, записанные с другими
+    границами корзин, пропускаются
+    """
+    counters, histograms = {}, {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot["counters"]:
+            key = name, tuple(map(tuple, labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, counts, total, count in snapshot["histograms"]:
+            if (
+                name not in METRICS
+                or len(counts) != len(registry.get_buckets(name)) + 1
+            ):
+                continue
+            key = name, tuple(map(tuple, labels))
+            merged = histograms.setdefault(key, [[0] * len(counts), 0, 0])
+            merged[0] = [a + b for a, b in zip(merged[0], counts)]
+            merged[1] += total
+            merged[2] += count
+    return counters, histograms
+
+
+def escape_label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels) -> str:
+    return (
+        "{"
+        + ",".join(f'{name}="{escape_label_value(value)}"' for name, value in labels)
+        + "}"
+    )
+
+
+def format_value(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_metrics(snapshots) -> str:
+    """Метрики всех процессов в текстовом формате Prometheus"""
+    counters, histograms = merge_snapshots(snapshots)
+    lines = []
+    for name, (metric_type, description, _) in METRICS.items():
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        if metric_type == "counter":
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+            continue
+        bounds = [format_value(float(bound)) for bound in registry.get_buckets(name)]
+        for (metric, labels), (counts, total, count) in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, bucket in zip(bounds + ["+Inf"], counts):
+                cumulative += bucket
+                bucket_labels = format_labels(labels + (("le", bound),))
+                lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{name}_sum{format_labels(labels)} {format_value(total)}")
+            lines.append(f"{name}_count{format_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """
+    Записывает время ответа, размер ответа, код статуса, число и время
+    запросов к базе данных по маршрутам.
+    Маршрут — имя URL вида api:catalog, запросы без маршрута не учитываются.
+    Работает в синхронном и асинхронном режиме, поэтому подключается первым
+    в MIDDLEWARE и учитывает время остальных middleware
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        # Соединения, открытые до загрузки middleware
+        for connection in connections.all(initialized_only=True):
+            install_query_timer(None, connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        queries = QueryTimer()
+        token = current_queries.set(queries)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_queries.reset(token)
+        self.record(request, response, time.perf_counter() - started, queries)
+        return response
+
+    async def __acall__(self, request):
+        queries = QueryTimer()
+        token = current_queries.set(queries)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_queries.reset(token)
+        self.record(request, response, time.perf_counter() - started, queries)
+        return response
+
+    @staticmethod
+    def record(request, response, duration, queries) -> None:
+        match = getattr(request, "resolver_match", None)
+        if match is None:
+            return
+        if response.streaming:
+            size = response.get("Content-Length")
+            size = None if size is None else int(size)
+        else:
+            size = len(response.content)
+        registry.observe(
+            match.view_name,
+            request.method,
+            str(response.status_code),
+            duration,
+            size,
+            queries,
+        )
+
+
+def metrics(request):
+    """
+    Метрики в формате Prometheus.
+    Доступны с заголовком Authorization: Bearer METRICS_TOKEN
+    и администраторам сайта
+    """
+    authorization = request.META.get("HTTP_AUTHORIZATION", "")
+    token = settings.METRICS_TOKEN
+    allowed = bool(token) and hmac.compare_digest(
+        authorization.encode(), f"Bearer {token}".encode()
+    )
+    if not allowed and not request.user.is_staff:
+        return HttpResponse(status=403)
+    return HttpResponse(
+        render_metrics(registry.collect()), content_type=PROMETHEUS_CONTENT_TYPE
+    )
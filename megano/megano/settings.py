@@ -9,14 +9,15 @@ https://docs.djangoproject.com/en/4.2/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
+
 import os
+import tempfile
 from os import getenv
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 DATABASE_DIR = BASE_DIR / "database"
-DATABASE_DIR.mkdir(exist_ok=True)
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/4.2/howto/deployment/checklist/
@@ -28,8 +29,7 @@ SECRET_KEY = getenv(
 )
 
 # SECURITY WARNING: don't run with debug turned on in production!
-# DEBUG = getenv("DJANGO_DEBUG", "0") == "1"
-DEBUG = True
+DEBUG = getenv("DJANGO_DEBUG", "0") == "1"
 
 ALLOWED_HOSTS = [
     "127.0.0.1",
@@ -38,14 +38,13 @@ ALLOWED_HOSTS = [
     "DJANGO_ALLOWED_HOSTS", ""
 ).split(",")
 
-if DEBUG:
-    import socket
-
-    hostname, _, ips = socket.gethostbyname_ex(socket.gethostname())
-    INTERNAL_IPS = [ip[: ip.rfind(".")] + ".1" for ip in ips] + [
-        "127.0.0.1",
-        "10.0.2.2",
-    ]
+# The docker gateway address is resolved on the first request, not at import,
+# see megano.debug
+INTERNAL_IPS = [
+    "127.0.0.1",
+    "10.0.2.2",
+]
+DEBUG_TOOLBAR_CONFIG = {"SHOW_TOOLBAR_CALLBACK": "megano.debug.show_toolbar"}
 
 # Application definition
 
@@ -56,7 +55,6 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
-    "debug_toolbar",
     "rest_framework",
     "django_filters",
     "frontend",
@@ -69,6 +67,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "megano.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -76,9 +75,12 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
-    "debug_toolbar.middleware.DebugToolbarMiddleware",
 ]
 
+if DEBUG:
+    INSTALLED_APPS.append("debug_toolbar")
+    MIDDLEWARE.append("debug_toolbar.middleware.DebugToolbarMiddleware")
+
 ROOT_URLCONF = "megano.urls"
 
 TEMPLATES = [
@@ -103,13 +105,91 @@ WSGI_APPLICATION = "megano.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-DATABASES = {
-    "default": {
+DATABASE_BACKENDS = {
+    "sqlite": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": DATABASE_DIR / "db.sqlite3",
+        # A file database lets concurrency tests open independent connections
+        "TEST": {"NAME": DATABASE_DIR / "test_db.sqlite3"},
+    },
+    # Requires the psycopg package
+    "postgresql": {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": getenv("POSTGRES_DB") or "megano",
+        "USER": getenv("POSTGRES_USER") or "megano",
+        "PASSWORD": getenv("POSTGRES_PASSWORD", ""),
+        "HOST": getenv("POSTGRES_HOST") or "localhost",
+        "PORT": getenv("POSTGRES_PORT") or "5432",
+    },
+}
+
+DATABASE_BACKEND = getenv("DATABASE_BACKEND") or "sqlite"
+
+DATABASES = {
+    "default": {
+        **DATABASE_BACKENDS[DATABASE_BACKEND],
+        # Without DEBUG workers keep connections open between requests
+        "CONN_MAX_AGE": int(
+            getenv("DATABASE_CONN_MAX_AGE") or ("0" if DEBUG else "600")
+        ),
+        "CONN_HEALTH_CHECKS": not DEBUG,
     }
 }
 
+# Applied to every new SQLite connection, see api.signals.configure_sqlite.
+# WAL lets readers work while a writer holds the lock
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 20000,
+    "cache_size": -64000,
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+RESPONSE_CACHE_BACKENDS = {
+    "locmem": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "responses",
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+    "file": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / "cache" / "responses",
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+}
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "responses": RESPONSE_CACHE_BACKENDS[getenv("RESPONSE_CACHE_BACKEND") or "file"],
+}
+
+# Cached responses for anonymous catalog requests, see api.response_cache.
+# Cache tag versions are invalidated by signals in the worker handling the write,
+# so the backend must be shared by all workers: with locmem other workers
+# serve stale responses for up to RESPONSE_CACHE_TIMEOUT seconds
+
+RESPONSE_CACHE_ALIAS = "responses"
+RESPONSE_CACHE_TIMEOUT = int(getenv("RESPONSE_CACHE_TIMEOUT", "300"))
+
+
+# Sessions
+# Anonymous baskets are kept in the session, see api.basket. Signed cookies
+# keep basket changes from writing to the database on every request.
+# The cookie is signed with SECRET_KEY, and a copied cookie stays valid after
+# logout until SESSION_COOKIE_AGE
+
+SESSION_ENGINE = (
+    getenv("SESSION_ENGINE") or "django.contrib.sessions.backends.signed_cookies"
+)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -135,6 +215,75 @@ REST_FRAMEWORK = {
     "DEFAULT_FILTER_BACKENDS": ["django_filters.rest_framework.DjangoFilterBackend"],
 }
 
+# Popular products ranking, refreshed by the refresh_popular_products command
+
+POPULAR_PRODUCTS_LIMIT = 8
+POPULAR_PRODUCTS_REFRESH_INTERVAL = int(
+    getenv("POPULAR_PRODUCTS_REFRESH_INTERVAL", "600")
+)
+# Score: average review rate plus basket adds, ten adds weigh one rating point
+POPULAR_PRODUCTS_RATING_WEIGHT = 1
+POPULAR_PRODUCTS_BASKET_WEIGHT = 0.1
+
+# Banners, sampled from an in-process pool of banner-eligible products
+
+BANNERS_COUNT = 3
+BANNER_POOL_REFRESH_INTERVAL = int(getenv("BANNER_POOL_REFRESH_INTERVAL", "300"))
+
+# Category tree cached in process memory, see api.category_tree
+
+CATEGORY_TREE_CACHE_TIMEOUT = int(getenv("CATEGORY_TREE_CACHE_TIMEOUT", "300"))
+
+# Products search, api.search.DatabaseSearchBackend works with any database
+# and is the default outside SQLite, where the FTS5 index is not available
+
+SEARCH_BACKEND = getenv("SEARCH_BACKEND") or (
+    "api.search.SQLiteFTSSearchBackend"
+    if DATABASE_BACKEND == "sqlite"
+    else "api.search.DatabaseSearchBackend"
+)
+# Matches ranked by relevance, the rest of the matches follow them ordered by id
+SEARCH_MAX_RESULTS = int(getenv("SEARCH_MAX_RESULTS", "500"))
+
+# Cached total count used for lastPage in paginated lists
+
+PAGINATION_COUNT_CACHE_TIMEOUT = int(getenv("PAGINATION_COUNT_CACHE_TIMEOUT", "60"))
+
+# Read-only endpoints served by async views from api.async_views,
+# enabled by default in asgi.py
+
+ASYNC_READ_VIEWS = getenv("DJANGO_ASYNC_READ_VIEWS", "0") == "1"
+
+# Number of latest reviews embedded in the product details,
+# the rest are loaded page by page from /api/product/<pk>/reviews
+
+PRODUCT_LATEST_REVIEWS = 5
+
+# Orders and payments, api.payments.FakePaymentProcessor accepts test cards only
+
+PAYMENT_PROCESSOR = getenv("PAYMENT_PROCESSOR", "api.payments.FakePaymentProcessor")
+ORDER_DELIVERY_COST = 200
+ORDER_EXPRESS_DELIVERY_COST = 500
+ORDER_FREE_DELIVERY_MIN_COST = 2000
+# Seconds before an unpaid order is canceled and its products return to stock
+ORDER_RESERVATION_TIMEOUT = int(getenv("ORDER_RESERVATION_TIMEOUT", "3600"))
+# Seconds after which a payment that has not finished is reconciled with the
+# payment processor, see api.tasks.recover_payment
+ORDER_PAYMENT_TIMEOUT = int(getenv("ORDER_PAYMENT_TIMEOUT", "900"))
+
+# Product and category image renditions: name -> maximum width and height
+
+IMAGE_RENDITIONS = {"thumbnail": 200, "medium": 500, "large": 1000}
+IMAGE_RENDITION_FORMATS = ["WEBP", "JPEG"]
+IMAGE_RENDITION_QUALITY = 80
+
+# Background tasks, executed by the run_tasks command
+
+TASK_VISIBILITY_TIMEOUT = int(getenv("TASK_VISIBILITY_TIMEOUT", "300"))
+TASK_RETRY_BACKOFF = 5
+TASK_RETRY_BACKOFF_MAX = 3600
+TASK_CLAIM_CANDIDATES = 10
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
 
@@ -156,6 +305,37 @@ STATIC_ROOT = BASE_DIR / "static"
 MEDIA_URL = "media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Media files are deleted by a background task, see api.storage.
+# Without DEBUG collectstatic writes content-hashed files with gzip/brotli variants
+STORAGES = {
+    "default": {"BACKEND": "api.storage.QueuedDeleteStorage"},
+    "staticfiles": {
+        "BACKEND": (
+            "django.contrib.staticfiles.storage.StaticFilesStorage"
+            if DEBUG
+            else "megano.staticfiles.CompressedManifestStaticFilesStorage"
+        )
+    },
+}
+
+# Static and media files are served by megano.staticfiles.StaticFilesApplication
+# in front of Django, see wsgi.py
+STATIC_CACHE_MAX_AGE = 60 * 60 * 24 * 365
+MEDIA_CACHE_MAX_AGE = int(getenv("MEDIA_CACHE_MAX_AGE", str(60 * 60 * 24)))
+
+# Request metrics in Prometheus format on /metrics, see megano.metrics.
+# Every worker process writes its metrics to its own file in METRICS_DIR,
+# /metrics sums them, so the directory is shared by the workers of one server
+
+METRICS_DIR = getenv("METRICS_DIR") or Path(tempfile.gettempdir()) / "megano-metrics"
+METRICS_TOKEN = getenv("METRICS_TOKEN", "")
+METRICS_FLUSH_INTERVAL = int(getenv("METRICS_FLUSH_INTERVAL", "10"))
+# Files of workers that stopped without removing them are dropped
+# after this many flush intervals without updates
+METRICS_STALE_FLUSHES = 3
+METRICS_LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+METRICS_SIZE_BUCKETS = [256, 1024, 4096, 16384, 65536, 262144, 1048576]
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
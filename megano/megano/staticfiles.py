@@ -0,0 +1,300 @@
+import asyncio
+import gzip
+import mimetypes
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from http import HTTPStatus
+from pathlib import Path
+
+import brotli
+from django.conf import settings
+from django.contrib.staticfiles.storage import (
+    ManifestStaticFilesStorage,
+    staticfiles_storage,
+)
+from django.core.exceptions import SuspiciousFileOperation
+from django.utils._os import safe_join
+
+COMPRESSIBLE_EXTENSIONS = {
+    ".css",
+    ".js",
+    ".json",
+    ".map",
+    ".svg",
+    ".txt",
+    ".html",
+    ".xml",
+    ".ico",
+    ".ttf",
+    ".otf",
+    ".eot",
+}
+# Сжатие маленьких файлов не окупает лишний заголовок Vary
+MIN_COMPRESS_SIZE = 256
+# Варианты в порядке предпочтения: кодировка и расширение файла
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+BLOCK_SIZE = 64 * 1024
+
+
+def compress_file(path: Path) -> list[Path]:
+    """
+    Создает рядом с файлом сжатые варианты .gz и .br.
+    Вариант сохраняется, только если он меньше исходного файла
+    """
+    if path.suffix not in COMPRESSIBLE_EXTENSIONS:
+        return []
+    content = path.read_bytes()
+    if len(content) < MIN_COMPRESS_SIZE:
+        return []
+    variants = [
+        (".gz", gzip.compress(content, compresslevel=9, mtime=0)),
+        (".br", brotli.compress(content)),
+    ]
+    written = []
+    for extension, compressed in variants:
+        if len(compressed) < len(content):
+            variant = path.with_name(path.name + extension)
+            variant.write_bytes(compressed)
+            written.append(variant)
+    return written
+
+
+def parse_accept_encoding(header: str) -> dict[str, float]:
+    """Кодировки из заголовка Accept-Encoding и их веса q"""
+    encodings = {}
+    for item in header.split(","):
+        encoding, *params = item.split(";")
+        encoding = encoding.strip().lower()
+        if not encoding:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        encodings[encoding] = quality
+    return encodings
+
+
+def get_accepted_encodings(header: str) -> list[tuple[str, str]]:
+    """
+    Варианты из ENCODINGS, которые принимает клиент, по убыванию веса q.
+    Кодировки с q=0 исключаются, * задает вес неперечисленных кодировок
+    """
+    encodings = parse_accept_encoding(header)
+    default = encodings.get("*", 0.0)
+    accepted = [
+        (encodings.get(encoding, default), encoding, extension)
+        for encoding, extension in ENCODINGS
+    ]
+    # Сортировка устойчивая, при равных весах сохраняется порядок ENCODINGS
+    accepted.sort(key=lambda variant: -variant[0])
+    return [
+        (encoding, extension)
+        for quality, encoding, extension in accepted
+        if quality > 0
+    ]
+
+
+def read_blocks(file):
+    with file:
+        while block := file.read(BLOCK_SIZE):
+            yield block
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Статика с хэшем содержимого в имени и заранее сжатыми вариантами,
+    которые создаются во время collectstatic
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        processed = set()
+        for name, hashed_name, processed_file in super().post_process(
+            paths, dry_run, **options
+        ):
+            if isinstance(hashed_name, str):
+                processed.add(hashed_name)
+            yield name, hashed_name, processed_file
+        if not dry_run:
+            for hashed_name in processed:
+                compress_file(Path(self.path(hashed_name)))
+
+
+class StaticFiles:
+    """
+    Поиск статики и медиафайлов и заголовки ответа, общие для WSGI и ASGI.
+    Выбирает сжатый вариант по Accept-Encoding, ставит заголовки кэширования
+    и отвечает 304 на условные запросы. Если файла нет, запрос передается
+    приложению
+    """
+
+    def __init__(self, application):
+        self.application = application
+        # Имена с хэшем содержимого не меняются, их можно кэшировать навсегда
+        self.hashed_files = set(
+            getattr(staticfiles_storage, "hashed_files", {}).values()
+        )
+        self.prefixes = [
+            ("/" + url.lstrip("/"), str(root))
+            for url, root in [
+                (settings.STATIC_URL, settings.STATIC_ROOT),
+                (settings.MEDIA_URL, settings.MEDIA_ROOT),
+            ]
+            if url and root
+        ]
+
+    def get_cache_control(self, name: str) -> str:
+        if name in self.hashed_files:
+            return f"public, max-age={settings.STATIC_CACHE_MAX_AGE}, immutable"
+        return f"public, max-age={settings.MEDIA_CACHE_MAX_AGE}"
+
+    def get_response(self, path: str, request_headers: dict):
+        """
+        Код ответа, заголовки и путь к отдаваемому файлу (None для 304).
+        request_headers — заголовки запроса с именами в нижнем регистре.
+        Возвращает None, если запрос не относится к статике или файла нет
+        """
+        for url, root in self.prefixes:
+            if path.startswith(url):
+                response = self.find(root, path[len(url) :], request_headers)
+                if response is not None:
+                    return response
+        return None
+
+    def find(self, root, name, request_headers):
+        try:
+            path = safe_join(root, name)
+        except SuspiciousFileOperation:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if not os.path.isfile(path) or os.path.basename(path).startswith("."):
+            return None
+
+        content_type, _ = mimetypes.guess_type(path)
+        headers = [
+            ("Content-Type", content_type or "application/octet-stream"),
+            ("Cache-Control", self.get_cache_control(name)),
+            ("Last-Modified", formatdate(stat.st_mtime, usegmt=True)),
+        ]
+        if Path(path).suffix in COMPRESSIBLE_EXTENSIONS:
+            headers.append(("Vary", "Accept-Encoding"))
+
+        mtime = stat.st_mtime
+        accepted = request_headers.get("accept-encoding", "")
+        for encoding, extension in get_accepted_encodings(accepted):
+            if os.path.isfile(path + extension):
+                path = path + extension
+                stat = os.stat(path)
+                break
+        else:
+            encoding = None
+        # ETag строится по отдаваемому варианту: сжатые и исходный файл
+        # отличаются побайтно, и кэши не должны подменять их друг другом
+        etag = f"{stat.st_size:x}-{int(stat.st_mtime):x}"
+        etag = f'"{etag}-{encoding}"' if encoding else f'"{etag}"'
+        headers.append(("ETag", etag))
+
+        if self.not_modified(request_headers, etag, mtime):
+            return HTTPStatus.NOT_MODIFIED, headers, None
+        if encoding:
+            headers.append(("Content-Encoding", encoding))
+        headers.append(("Content-Length", str(stat.st_size)))
+        return HTTPStatus.OK, headers, path
+
+    @staticmethod
+    def not_modified(request_headers, etag, mtime) -> bool:
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match is not None:
+            return etag in [value.strip() for value in if_none_match.split(",")]
+        if_modified_since = request_headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(mtime) <= since
+        return False
+
+
+class StaticFilesApplication(StaticFiles):
+    """
+    WSGI-слой, который отдает статику и медиафайлы до Django.
+    Файл передается через wsgi.file_wrapper, который в gunicorn
+    использует sendfile
+    """
+
+    REQUEST_HEADERS = ["accept-encoding", "if-none-match", "if-modified-since"]
+
+    def __call__(self, environ, start_response):
+        method = environ["REQUEST_METHOD"]
+        if method not in ("GET", "HEAD"):
+            return self.application(environ, start_response)
+        request_headers = {}
+        for name in self.REQUEST_HEADERS:
+            value = environ.get("HTTP_" + name.upper().replace("-", "_"))
+            if value is not None:
+                request_headers[name] = value
+        response = self.get_response(environ.get("PATH_INFO", ""), request_headers)
+        if response is None:
+            return self.application(environ, start_response)
+        status, headers, path = response
+        start_response(f"{status.value} {status.phrase}", headers)
+        if path is None or method == "HEAD":
+            return []
+        file = open(path, "rb")
+        file_wrapper = environ.get("wsgi.file_wrapper")
+        if file_wrapper is not None:
+            return file_wrapper(file, BLOCK_SIZE)
+        return read_blocks(file)
+
+
+class AsyncStaticFilesApplication(StaticFiles):
+    """
+    ASGI-слой, который отдает статику и медиафайлы до Django.
+    Файл читается блоками в потоке, чтобы не блокировать цикл событий
+    """
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            return await self.application(scope, receive, send)
+        request_headers = {
+            name.decode("latin-1").lower(): value.decode("latin-1")
+            for name, value in scope["headers"]
+        }
+        response = self.get_response(scope["path"], request_headers)
+        if response is None:
+            return await self.application(scope, receive, send)
+        status, headers, path = response
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status.value,
+                "headers": [
+                    (name.lower().encode("latin-1"), value.encode("latin-1"))
+                    for name, value in headers
+                ],
+            }
+        )
+        if path is None or scope["method"] == "HEAD":
+            await send({"type": "http.response.body", "body": b""})
+            return
+        with open(path, "rb") as file:
+            while True:
+                block = await asyncio.to_thread(file.read, BLOCK_SIZE)
+                more_body = len(block) == BLOCK_SIZE
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": block,
+                        "more_body": more_body,
+                    }
+                )
+                if not more_body:
+                    break
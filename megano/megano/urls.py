@@ -18,11 +18,13 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
+from megano.metrics import metrics
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("", include("frontend.urls")),
     path("api/", include("api.urls")),
+    path("metrics", metrics, name="metrics"),
 ]
 
 if settings.DEBUG:
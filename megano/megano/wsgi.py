@@ -11,6 +11,8 @@ import os
 
 from django.core.wsgi import get_wsgi_application
 
+from megano.staticfiles import StaticFilesApplication
+
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "megano.settings")
 
-application = get_wsgi_application()
+application = StaticFilesApplication(get_wsgi_application())